@@ -3,24 +3,183 @@
 API FastAPI pour la veille technologique utilisant l'API OpenAI + outil Web Search.
 """
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import FastAPI, HTTPException, Header, Query, Request, Response, WebSocket
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field
+from typing import Callable, Literal, Optional, List
+from contextlib import asynccontextmanager
+import asyncio
 import json
 import os
+import time
 from datetime import datetime
 from pathlib import Path
-from openai import OpenAI
 import uuid
 
+import catalog
+import compaction
+import dedup
+import export
+import http_cache
+import live
+import metrics
+import routing
+import search_index
+import segments
+import sources
+import storage
+import webhooks
+from cache import ResultCache, request_key
+from context_compaction import compact_previous_responses
+from fanout import FANOUT_MAX_WIDTH, run_fanout
+from rate_limiter import scheduler
+from jobs import JOB_DEADLINE_S, Job, JobQueue, QueueFullError, STATUS_COMPLETED, STATUS_TIMED_OUT
+from openai_client import (
+    FOLLOWUP_INSTRUCTION,
+    close_client,
+    extract_citations,
+    extract_output_text,
+    get_client,
+    is_previous_response_missing,
+    stream_response,
+)
+
+
+# Durées du démarrage, exposées dans /health et par `python api.py --profile-startup`
+startup_report = {"lifespan_s": None, "warmup": {"status": "pending", "steps": {}}}
+
+
+# Index reconstruits au premier démarrage, dans cet ordre
+WARMUP_INDEXES = {
+    "catalog": catalog,
+    "sources": sources,
+    "search_index": search_index,
+    "dedup": dedup,
+}
+
+
+def _empty_indexes() -> List[str]:
+    return [name for name, module in WARMUP_INDEXES.items() if module.is_empty()]
+
+
+def _warming_up(index: str) -> bool:
+    """Vrai tant que `index` peut encore manquer des recherches existantes (préparation en cours)."""
+    warmup = startup_report["warmup"]
+    return warmup["status"] == "pending" or index in warmup.get("indexing", ())
+
+
+async def _warm_up():
+    """
+    Préparation différée, lancée une fois le port ouvert : indexation des
+    recherches existantes au premier démarrage et import du SDK OpenAI.
+
+    Les requêtes sont servies pendant ce temps. Les index sont complétés par
+    fusion (rien n'est supprimé) : une recherche terminée et indexée pendant
+    la reconstruction est conservée. Les lectures concernées signalent
+    `warming_up` tant que leur index est incomplet (`indexing`).
+    """
+    warmup = startup_report["warmup"]
+    started = time.perf_counter()
+
+    async def step(name: str, func: Callable):
+        step_started = time.perf_counter()
+        await asyncio.to_thread(func)
+        warmup["steps"][name] = round(time.perf_counter() - step_started, 3)
+
+    rebuilds = {
+        "catalog": lambda: catalog.rebuild(OUTPUT_DIR, merge=True),
+        "sources": lambda: sources.rebuild(OUTPUT_DIR, merge=True),
+        "search_index": lambda: search_index.rebuild(OUTPUT_DIR, merge=True),
+        "dedup": dedup.rebuild,
+    }
+    try:
+        warmup["indexing"] = await asyncio.to_thread(_empty_indexes)
+        warmup["status"] = "running"
+        for name in list(warmup["indexing"]):
+            # Premier démarrage sur un dossier existant : indexer les recherches déjà stockées
+            if name == "catalog" or not catalog.is_empty():
+                await step(name, rebuilds[name])
+            warmup["indexing"].remove(name)
+        if API_KEY:
+            # SDK importé et client construit dans un thread
+            client_started = time.perf_counter()
+            await get_client()
+            warmup["steps"]["openai_client"] = round(time.perf_counter() - client_started, 3)
+        warmup["status"] = "done"
+    except Exception as e:
+        warmup["status"] = "failed"
+        warmup["error"] = str(e)
+        warmup["indexing"] = []
+    warmup["duration_s"] = round(time.perf_counter() - started, 3)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Démarre les workers au lancement et les arrête à l'extinction.
+
+    Seul le strict nécessaire est fait avant d'accepter des requêtes ; le
+    reste (index, client OpenAI) est préparé en tâche de fond par `_warm_up`.
+    """
+    started = time.perf_counter()
+    OUTPUT_DIR.mkdir(exist_ok=True)
+    await job_queue.start()
+    await webhooks.dispatcher.start()
+    await live.hub.start()
+    warmup_task = asyncio.create_task(_warm_up())
+    compaction_task = (
+        asyncio.create_task(_compaction_loop()) if compaction.COMPACTION_INTERVAL_S > 0 else None
+    )
+    startup_report["lifespan_s"] = round(time.perf_counter() - started, 3)
+    yield
+    warmup_task.cancel()
+    if compaction_task is not None:
+        compaction_task.cancel()
+    await job_queue.stop()
+    await webhooks.dispatcher.stop()
+    await live.hub.stop()
+    await close_client()
+
+
+async def _run_compaction(dry_run: bool = False) -> dict:
+    """Passe de compaction hors de la boucle d'événements ; invalide le cache des recherches supprimées."""
+    report = await asyncio.to_thread(compaction.compact, None, dry_run)
+    if not dry_run:
+        for research_id in report["deleted"]:
+            result_cache.invalidate(research_id)
+            live.hub.emit(live.EVENT_DELETED, research_id)
+    return report
+
+
+async def _compaction_loop():
+    """Compaction périodique (COMPACTION_INTERVAL), sans interrompre le service."""
+    while True:
+        await asyncio.sleep(compaction.COMPACTION_INTERVAL_S)
+        try:
+            report = await _run_compaction()
+            print(
+                f"[INFO] Compaction : {len(report['deleted'])} supprimées, {report['packed']} compactées, "
+                f"{report['reclaimed_bytes']} octets récupérés"
+            )
+        except compaction.CompactionBusyError:
+            pass
+        except Exception as e:
+            print(f"[ERREUR] Compaction : {e}")
+
+
 app = FastAPI(
     title="AI News Paper API",
     description="API de veille technologique automatisée avec OpenAI",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+
+app.add_middleware(http_cache.CompressionMiddleware)
+# Ajouté en dernier : mesure aussi le temps de compression
+app.add_middleware(metrics.RequestTimingMiddleware, histogram=metrics.http_request_seconds)
+
 # Servir les fichiers statiques si le dossier existe
 static_dir = Path("static")
 if static_dir.exists():
@@ -28,12 +187,12 @@ if static_dir.exists():
 
 # Configuration
 API_KEY = os.getenv("OPENAI_API_KEY")
-OUTPUT_DIR = Path("outputs")
-OUTPUT_DIR.mkdir(exist_ok=True)
+OUTPUT_DIR = storage.OUTPUT_DIR
 
 MODEL = os.getenv("OPENAI_MODEL", "gpt-5")
 VERBOSITY = os.getenv("OPENAI_VERBOSITY", "medium")
 REASONING_EFFORT = os.getenv("OPENAI_REASONING_EFFORT", "medium")
+SEARCH_CONTEXT_SIZE = os.getenv("OPENAI_SEARCH_CONTEXT_SIZE", "high")
 
 
 class ResearchRequest(BaseModel):
@@ -43,6 +202,34 @@ class ResearchRequest(BaseModel):
     model: Optional[str] = None
     verbosity: Optional[str] = None
     reasoning_effort: Optional[str] = None
+    search_context_size: Optional[Literal["low", "medium", "high"]] = None
+    # Objectif de latence : les paramètres non fournis sont choisis par routing.py
+    mode: Optional[Literal["fast", "deep"]] = None
+    max_latency_s: Optional[float] = Field(None, gt=0)
+    stream: bool = False
+    cache: Literal["use", "bypass"] = "use"
+    # Échéance en secondes depuis la soumission (défaut serveur : RESEARCH_DEADLINE)
+    deadline_s: Optional[float] = Field(None, gt=0, le=86400)
+    # Recherche en éventail : nombre maximal de sous-thèmes recherchés en parallèle
+    fanout: Optional[int] = Field(None, ge=2, le=FANOUT_MAX_WIDTH)
+    # Notification de fin (POST signé HMAC-SHA256 si un secret est fourni)
+    callback_url: Optional[str] = Field(None, pattern=r"^https?://")
+    callback_secret: Optional[str] = None
+    # Retirer du rapport les paragraphes déjà publiés dans une recherche récente
+    strip_duplicates: bool = False
+
+
+class FollowupRequest(BaseModel):
+    """Modèle de requête pour la suite d'une recherche (paramètres par défaut : ceux de la recherche parente)"""
+    model: Optional[str] = None
+    verbosity: Optional[str] = None
+    reasoning_effort: Optional[str] = None
+    stream: bool = False
+    cache: Literal["use", "bypass"] = "use"
+    deadline_s: Optional[float] = Field(None, gt=0, le=86400)
+    callback_url: Optional[str] = Field(None, pattern=r"^https?://")
+    callback_secret: Optional[str] = None
+    strip_duplicates: bool = False
 
 
 class ResearchResponse(BaseModel):
@@ -54,58 +241,138 @@ class ResearchResponse(BaseModel):
     metadata_file: Optional[str] = None
 
 
-def perform_research(
-    subject: str,
-    previous_responses: List[str],
-    research_id: str,
-    model: str = MODEL,
-    verbosity: str = VERBOSITY,
-    reasoning_effort: str = REASONING_EFFORT
-) -> dict:
-    """
-    Effectue la recherche et sauvegarde les résultats.
-    """
-    if not API_KEY:
-        raise ValueError("OPENAI_API_KEY non définie dans les variables d'environnement")
-    
-    client = OpenAI(api_key=API_KEY)
-    
-    # Préparer le sujet JSON
+def _relay_stream_event(event, publish: Callable[[str, dict], None]):
+    """Traduit un événement du streaming Responses en événement SSE simplifié."""
+    if event.type == "response.created":
+        publish("response", {"response_id": event.response.id})
+    elif event.type == "response.output_text.delta":
+        publish("delta", {"text": event.delta})
+    elif event.type.startswith("response.web_search_call."):
+        publish("web_search", {
+            "item_id": event.item_id,
+            "status": event.type.rsplit(".", 1)[-1]
+        })
+    elif event.type == "response.output_item.done" and event.item.type == "web_search_call":
+        action = getattr(event.item, "action", None)
+        publish("web_search", {
+            "item_id": event.item.id,
+            "status": "done",
+            "query": getattr(action, "query", None)
+        })
+    elif event.type == "response.output_text.annotation.added":
+        annotation = event.annotation if isinstance(event.annotation, dict) else event.annotation.model_dump()
+        if annotation.get("type") == "url_citation":
+            publish("citation", {"url": annotation.get("url"), "title": annotation.get("title")})
+
+
+DEVELOPER_INSTRUCTION = (
+    "Tu es un assistant de veille technologique expert. Ta mission est de faire une recherche "
+    "approfondie et structurée sur un sujet donné, en utilisant l'outil Web Search pour trouver "
+    "des informations fiables, récentes et pertinentes.\n\n"
+    "Fait des recherches sur les nouvelles avancées, les plus récentes possible.\n\n"
+    "Le sujet sera fourni au format JSON dans le message utilisateur.\n"
+    "Si la catégorie 'PreviousResponses' contient quelque chose, analyse les anciennes réponses "
+    "et évite de répéter les mêmes informations."
+)
+
+
+def build_input_messages(subject: str, previous_responses: List[str]) -> tuple:
+    """Messages d'une recherche complète ; retourne (messages, rapport de compaction)."""
+    # Réponses précédentes condensées au-delà du budget
+    previous_context, compaction = compact_previous_responses(previous_responses)
     subject_json = {
         "Subject": subject,
-        "PreviousResponses": previous_responses
+        "PreviousResponses": previous_context
     }
-    
-    developer_instruction = (
-        "Tu es un assistant de veille technologique expert. Ta mission est de faire une recherche "
-        "approfondie et structurée sur un sujet donné, en utilisant l'outil Web Search pour trouver "
-        "des informations fiables, récentes et pertinentes.\n\n"
-        "Fait des recherches sur les nouvelles avancées, les plus récentes possible.\n\n"
-        "Le sujet sera fourni au format JSON dans le message utilisateur.\n"
-        "Si la catégorie 'PreviousResponses' contient quelque chose, analyse les anciennes réponses "
-        "et évite de répéter les mêmes informations."
-    )
-    
-    # Messages pour le modèle
     input_messages = [
         {
             "role": "developer",
             "content": [
-                {"type": "input_text", "text": developer_instruction}
+                {"type": "input_text", "text": DEVELOPER_INSTRUCTION}
             ]
         },
         {
             "role": "user",
             "content": [
-                {"type": "input_text", "text": json.dumps(subject_json, ensure_ascii=False, indent=2)}
+                {"type": "input_text", "text": json.dumps(subject_json, ensure_ascii=False)}
             ]
         }
     ]
+    return input_messages, compaction
+
+
+def build_followup_messages(subject: str, since: Optional[str]) -> list:
+    """
+    Message d'une suite chaînée par previous_response_id.
+    
+    Les instructions, le sujet et la réponse précédente sont déjà dans le
+    contexte conservé par OpenAI : seul le nouveau tour est envoyé.
+    """
+    followup_json = {
+        "Subject": subject,
+        "Since": since,
+        "Instruction": FOLLOWUP_INSTRUCTION
+    }
+    return [
+        {
+            "role": "user",
+            "content": [
+                {"type": "input_text", "text": json.dumps(followup_json, ensure_ascii=False)}
+            ]
+        }
+    ]
+
+
+async def perform_research(
+    subject: str,
+    previous_responses: List[str],
+    research_id: str,
+    model: str = MODEL,
+    verbosity: str = VERBOSITY,
+    reasoning_effort: str = REASONING_EFFORT,
+    on_event: Optional[Callable[[str, dict], None]] = None,
+    previous_response_id: Optional[str] = None,
+    lineage: Optional[dict] = None,
+    fanout: Optional[int] = None,
+    search_context_size: str = SEARCH_CONTEXT_SIZE,
+    routing_decision: Optional[dict] = None,
+    strip_duplicates: bool = False
+) -> dict:
+    """
+    Effectue la recherche et sauvegarde les résultats.
+    
+    La réponse est reçue en streaming ; si `on_event` est fourni, il reçoit
+    les deltas de texte, la progression des recherches web et les citations.
+    
+    Avec `previous_response_id`, la recherche est une suite : elle est chaînée
+    sur la réponse précédente au lieu de renvoyer l'historique. Si OpenAI ne
+    la connaît plus (expirée ou non stockée), la suite repart d'une recherche
+    complète avec le rapport parent en réponse précédente.
+    
+    Avec `fanout` (largeur), le sujet est découpé en sous-thèmes recherchés
+    en parallèle puis fusionnés (voir fanout.py).
+    
+    La durée de l'appel, les tokens et la taille du rapport sont enregistrés
+    par combinaison de paramètres pour le routage par latence (routing.py).
+    
+    Les paragraphes déjà présents dans les recherches récentes sont repérés
+    (dedup.py) : le score de nouveauté est enregistré dans les métadonnées et,
+    avec `strip_duplicates`, les redites sont retirées du rapport stocké.
+    """
+    if not API_KEY:
+        raise ValueError("OPENAI_API_KEY non définie dans les variables d'environnement")
+    
+    compaction = None
+    fanout_report = None
+    chained = previous_response_id is not None
+    if chained:
+        input_messages = build_followup_messages(subject, (lineage or {}).get("since"))
+    elif not fanout:
+        input_messages, compaction = build_input_messages(subject, previous_responses)
     
-    # Appel à l'API
-    response = client.responses.create(
+    relay = (lambda event: _relay_stream_event(event, on_event)) if on_event else None
+    request_options = dict(
         model=model,
-        input=input_messages,
         text={
             "format": {"type": "text"},
             "verbosity": verbosity
@@ -115,7 +382,7 @@ def perform_research(
             {
                 "type": "web_search",
                 "user_location": {"type": "approximate"},
-                "search_context_size": "high"
+                "search_context_size": search_context_size
             }
         ],
         store=True,
@@ -125,27 +392,59 @@ def perform_research(
         ]
     )
     
-    # Extraction du texte de sortie
-    output_text = getattr(response, "output_text", None)
-    if not output_text:
-        fragments = []
-        for item in getattr(response, "output", []):
-            for c in item.get("content", []):
-                if c.get("type") == "output_text":
-                    fragments.append(c.get("text", ""))
-        output_text = "\n\n".join(fragments) if fragments else "[Aucune sortie texte trouvée]"
-    
-    # Sauvegarde des résultats
-    now = datetime.utcnow().isoformat() + "Z"
-    
-    output_file = OUTPUT_DIR / f"{research_id}_output.txt"
-    metadata_file = OUTPUT_DIR / f"{research_id}_metadata.json"
+    # Appel à l'API en streaming (client partagé, retries et timeout inclus)
+    stage = metrics.research_stage_seconds.time
+    call_started = time.perf_counter()
+    if fanout and not chained:
+        # Recherche en éventail : sous-thèmes en parallèle puis fusion
+        previous_context, compaction = compact_previous_responses(previous_responses)
+        with stage(stage="openai_call"):
+            output_text, raw, fanout_report = await run_fanout(
+                subject, previous_context, fanout, request_options, on_event=on_event, relay=relay
+            )
+        if on_event:
+            # Les deltas des branches ne sont pas relayés : envoyer le rapport fusionné
+            on_event("delta", {"text": output_text})
+    else:
+        with stage(stage="openai_call"):
+            try:
+                chaining = {"previous_response_id": previous_response_id} if chained else {}
+                response = await stream_response(on_event=relay, input=input_messages, **chaining, **request_options)
+            except Exception as e:
+                # Le SDK est déjà chargé (par le client) : pas d'import sur la boucle
+                if not chained or not is_previous_response_missing(e):
+                    raise
+                # Réponse précédente introuvable côté OpenAI : recherche complète
+                parent_output = storage.read_output(lineage["parent_id"]) if lineage else None
+                previous_responses = [parent_output] if parent_output else []
+                input_messages, compaction = build_input_messages(subject, previous_responses)
+                chained = False
+                response = await stream_response(on_event=relay, input=input_messages, **request_options)
+        
+        # Extraction du texte de sortie
+        with stage(stage="extract_output"):
+            output_text = extract_output_text(response)
+        with stage(stage="model_dump"):
+            raw = response.model_dump()
+        await asyncio.to_thread(
+            routing.record,
+            {"model": model, "reasoning_effort": reasoning_effort, "verbosity": verbosity,
+             "search_context_size": search_context_size},
+            time.perf_counter() - call_started, raw.get("usage"), len(output_text)
+        )
     
-    with open(output_file, "w", encoding="utf-8") as f:
-        f.write(f"--- Résultat généré le {now} (UTC) ---\n\n")
-        f.write(f"Sujet: {subject}\n\n")
-        f.write("=" * 80 + "\n\n")
-        f.write(output_text)
+    # Sauvegarde des résultats : résumé compact + réponse brute compressée à part
+    now = datetime.utcnow().isoformat() + "Z"
+    with stage(stage="dedup"):
+        # Index incomplet pendant la préparation : le score est signalé comme partiel
+        novelty_partial = _warming_up("dedup")
+        output_text, novelty = await asyncio.to_thread(
+            dedup.deduplicate, output_text, research_id, now, strip_duplicates
+        )
+    metrics.record_usage(raw.get("usage"))
+    metrics.web_search_calls.observe(
+        sum(1 for item in raw.get("output") or [] if item.get("type") == "web_search_call")
+    )
     
     metadata = {
         "research_id": research_id,
@@ -153,21 +452,144 @@ def perform_research(
         "subject": subject,
         "previous_responses": previous_responses,
         "created_at": now,
-        "output_file": str(output_file),
-        "output_raw": response.model_dump()
+        "response_id": raw.get("id"),
+        "usage": raw.get("usage"),
+        "reasoning_effort": reasoning_effort,
+        "verbosity": verbosity,
+        "search_context_size": search_context_size,
+        "context_compaction": compaction,
+        "novelty": dedup.summary(novelty, stripped=strip_duplicates)
     }
+    if novelty_partial:
+        metadata["novelty"]["warming_up"] = True
+    if routing_decision:
+        metadata["routing"] = routing_decision
+    if fanout_report:
+        metadata["fanout"] = fanout_report
+    if lineage:
+        metadata["previous_response_id"] = previous_response_id
+        metadata["chained"] = chained
+        metadata["lineage"] = {k: lineage[k] for k in ("parent_id", "root_id", "depth")}
+    # Fichiers et index en un seul passage dans un thread, hors de la boucle
+    saved, durations = await asyncio.to_thread(_save_research, research_id, subject, output_text, metadata, raw)
+    for name, seconds in durations.items():
+        metrics.research_stage_seconds.observe(seconds, stage=name)
     
-    with open(metadata_file, "w", encoding="utf-8") as f:
-        json.dump(metadata, f, ensure_ascii=False, indent=2)
+    if on_event:
+        on_event("citations", {"citations": extract_citations(raw)})
     
     return {
-        "output_file": str(output_file),
-        "metadata_file": str(metadata_file),
+        "output_file": saved["output_file"],
+        "metadata_file": saved["metadata_file"],
         "output_text": output_text,
         "created_at": now
     }
 
 
+def _save_research(research_id: str, subject: str, output_text: str, metadata: dict, raw: dict):
+    """
+    Écrit les fichiers d'une recherche puis l'indexe (catalogue, sources, plein
+    texte) ; bloquant. Retourne aussi la durée de chaque étape, que l'appelant
+    reporte dans les métriques depuis la boucle.
+    """
+    started = time.perf_counter()
+    saved = storage.write_research(research_id, output_text, metadata, raw)
+    written = time.perf_counter()
+    
+    catalog.upsert(catalog.entry_from_files(
+        saved["metadata"], Path(saved["output_file"]), Path(saved["metadata_file"])
+    ))
+    sources.index(research_id, raw)
+    search_index.index(research_id, subject, output_text)
+    return saved, {"storage_write": written - started, "indexing": time.perf_counter() - written}
+
+
+# Cache des résultats et coalescence des requêtes identiques
+result_cache = ResultCache()
+
+# Suites de fin de recherche en cours (référence gardée jusqu'à leur terme)
+_finishing_tasks: set = set()
+
+
+def _on_job_finished(job: Job):
+    """
+    Met en cache le résultat d'une recherche réussie, libère sa clé et compte
+    la recherche ; webhooks, tableau de bord et routage, qui lisent ou écrivent
+    la base, sont confiés à une tâche qui les exécute dans un thread.
+    """
+    result_cache.finish(job.job_id, success=job.status == STATUS_COMPLETED)
+    # Exécuté ailleurs : déjà compté par l'autre processus
+    counted_here = job.executed_here or job.started_at is None
+    if counted_here:
+        metrics.researches_total.inc(status=job.status)
+        if job.started_at is not None:
+            metrics.research_stage_seconds.observe(job.started_at - job.created_at, stage="queue_wait")
+            metrics.research_stage_seconds.observe(job.finished_at - job.started_at, stage="total")
+    task = asyncio.create_task(_after_job_finished(job, counted_here))
+    _finishing_tasks.add(task)
+    task.add_done_callback(_finishing_tasks.discard)
+
+
+async def _after_job_finished(job: Job, counted_here: bool):
+    try:
+        await asyncio.to_thread(_announce_finished, job, counted_here)
+    except Exception as e:
+        print(f"[ERREUR] Suites de la recherche {job.job_id} : {e}")
+
+
+def _announce_finished(job: Job, counted_here: bool):
+    """Déclenche les webhooks d'une recherche terminée, la pousse aux tableaux de bord et au routage ; bloquant."""
+    if webhooks.has_waiting(job.job_id):
+        _notify_finished_research(job.job_id, job)
+    if not counted_here:
+        return
+    _emit_finished(job)
+    if job.status == STATUS_TIMED_OUT and job.started_at is not None and not job.params.get("fanout"):
+        # Une recherche expirée compte pour le routage avec la durée atteinte
+        routing.record(
+            {k: job.params.get(k) or default for k, default in (
+                ("model", MODEL), ("reasoning_effort", REASONING_EFFORT),
+                ("verbosity", VERBOSITY), ("search_context_size", SEARCH_CONTEXT_SIZE))},
+            job.finished_at - job.started_at, status=job.status
+        )
+
+
+def _on_job_started(job: Job):
+    live.hub.emit(live.EVENT_STATUS, job.job_id, {"status": job.status})
+
+
+def _emit_finished(job: Job):
+    """Pousse la fin d'une recherche aux tableaux de bord (entrée de /list si elle a réussi)."""
+    if job.status != STATUS_COMPLETED:
+        live.hub.emit(live.EVENT_STATUS, job.job_id, {"status": job.status, "error": job.error})
+        return
+    entry = catalog.get(job.job_id) or {}
+    live.hub.emit(live.EVENT_COMPLETED, job.job_id, {
+        "status": job.status,
+        "subject": entry.get("subject", job.params.get("subject")),
+        "created_at": entry.get("created_at"),
+        "model": entry.get("model", job.params.get("model"))
+    })
+
+
+# File d'attente des recherches (workers démarrés dans le lifespan)
+job_queue = JobQueue(runner=perform_research, on_finish=_on_job_finished, on_start=_on_job_started)
+
+# Métriques calculées à l'export
+metrics.Gauge("research_queue_depth", "Recherches en attente d'un worker",
+              callback=lambda: job_queue.stats()["queue_depth"])
+metrics.Gauge("research_jobs_running", "Recherches en cours d'exécution",
+              callback=lambda: job_queue.stats()["running"])
+metrics.Counter("result_cache_hits_total", "Requêtes servies depuis le cache de résultats",
+                callback=lambda: result_cache.hits)
+metrics.Counter("result_cache_coalesced_total", "Requêtes rattachées à une recherche identique en cours",
+                callback=lambda: result_cache.coalesced)
+metrics.Counter("result_cache_misses_total", "Requêtes ayant lancé une nouvelle recherche",
+                callback=lambda: result_cache.misses)
+metrics.Gauge("openai_rate_limit_waiting", "Appels OpenAI en attente de budget RPM/TPM",
+              callback=lambda: scheduler.waiting)
+
+
 @app.get("/")
 async def root():
     """Page d'accueil de l'API - Redirige vers l'interface web si disponible"""
@@ -180,10 +602,29 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "POST /research": "Lancer une nouvelle recherche",
+            "POST /research/{research_id}/followup": "Lancer la suite d'une recherche (chaînée sur sa réponse OpenAI)",
+            "GET /jobs/{research_id}": "Suivre l'état d'une recherche",
+            "POST /jobs/{research_id}/cancel": "Annuler une recherche en attente ou en cours",
+            "GET /webhooks/{research_id}": "Envois de webhook d'une recherche et journal des tentatives",
+            "GET /research/{research_id}/stream": "Suivre la sortie d'une recherche en direct (SSE)",
             "GET /health": "Vérifier l'état de l'API",
-            "GET /results/{research_id}": "Récupérer les résultats d'une recherche",
+            "GET /metrics": "Métriques au format Prometheus",
+            "GET /cache/stats": "Statistiques du cache de résultats",
+            "GET /routing/stats": "Latence et coût mesurés par combinaison de paramètres (routage)",
+            "GET /rate-limits": "Budget OpenAI (RPM/TPM) et temps d'attente",
+            "GET /results/{research_id}": "Récupérer les résultats d'une recherche (?include=raw pour la réponse brute)",
+            "GET /results/{research_id}/sources": "Sources citées et consultées par une recherche",
+            "GET /results/{research_id}/novelty": "Score de nouveauté et paragraphes repris des recherches récentes",
+            "GET /sources": "Rechercher les recherches ayant cité une URL ou un domaine",
+            "GET /sources/domains": "Domaines les plus cités",
             "GET /latest": "Récupérer la dernière recherche",
-            "GET /list": "Lister toutes les recherches"
+            "GET /list": "Lister les recherches (pagination et filtres)",
+            "WS /ws": "Changements de la liste des recherches en direct (créée, statut, terminée, supprimée)",
+            "GET /export": "Exporter les recherches filtrées en NDJSON ou CSV (flux, projection des champs)",
+            "GET /search": "Recherche plein texte dans les sujets et les rapports",
+            "POST /catalog/rebuild": "Reconstruire le catalogue et les index (sources, plein texte, redites) depuis outputs/",
+            "GET /storage/stats": "Volume occupé (fichiers, segments compactés) et dernière compaction",
+            "POST /storage/compact": "Appliquer la rétention et compacter les anciennes recherches (?dry_run=true pour simuler)"
         },
         "documentation": {
             "swagger": "/docs",
@@ -196,20 +637,65 @@ async def root():
 async def health_check():
     """Vérifier l'état de l'API"""
     api_key_configured = API_KEY is not None and len(API_KEY) > 0
+    budget = scheduler.stats()
     return {
         "status": "healthy" if api_key_configured else "degraded",
         "api_key_configured": api_key_configured,
         "model": MODEL,
+        "queue": job_queue.stats(),
+        "cache": result_cache.stats(),
+        "webhooks": webhooks.dispatcher.stats(),
+        "live": live.hub.stats(),
+        "rate_limits": {
+            "requests_available": budget["requests_available"],
+            "tokens_available": budget["tokens_available"],
+            "waiting": budget["waiting"]
+        },
+        "latency_s": {
+            "research": metrics.research_stage_seconds.summary(),
+            "http": metrics.http_request_seconds.summary()
+        },
+        "startup": startup_report,
         "timestamp": datetime.utcnow().isoformat() + "Z"
     }
 
 
-@app.post("/research", response_model=ResearchResponse)
-async def create_research(request: ResearchRequest, background_tasks: BackgroundTasks):
+@app.get("/metrics")
+async def get_metrics():
+    """Métriques au format d'exposition texte Prometheus"""
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.post("/research", response_model=ResearchResponse, status_code=202)
+async def create_research(request: ResearchRequest, response: Response):
     """
     Lancer une nouvelle recherche de veille technologique.
     
-    La recherche est effectuée en arrière-plan pour ne pas bloquer la réponse.
+    La recherche est placée dans la file d'attente et effectuée en arrière-plan :
+    la réponse est immédiate et l'avancement se suit via GET /jobs/{research_id}.
+    
+    Une requête identique à une recherche récente réutilise son résultat, et une
+    requête identique à une recherche en cours partage la même exécution.
+    `cache: "bypass"` force une nouvelle recherche.
+    
+    `deadline_s` borne la durée totale (attente comprise) : au-delà, l'appel est
+    interrompu et la recherche passe en `timed_out`.
+    
+    `fanout` découpe un sujet large en sous-thèmes recherchés en parallèle et
+    fusionnés en un seul rapport (durées par branche dans les métadonnées).
+    
+    `max_latency_s` (ou `mode: "fast"`) choisit, parmi les paramètres non
+    fournis, la combinaison la moins chère qui a tenu cette latence par le
+    passé ; `mode: "deep"` privilégie une recherche approfondie. Le choix est
+    enregistré dans les métadonnées (`routing`).
+    
+    `callback_url` reçoit un POST (signé avec `callback_secret`) quand la
+    recherche se termine, en succès comme en échec : inutile de surveiller
+    /results. Suivi des envois : GET /webhooks/{research_id}.
+    
+    Les paragraphes qui reprennent une recherche récente sont signalés (score
+    de nouveauté : GET /results/{research_id}/novelty) ; `strip_duplicates`
+    les retire du rapport.
     """
     if not API_KEY:
         raise HTTPException(
@@ -217,154 +703,854 @@ async def create_research(request: ResearchRequest, background_tasks: Background
             detail="OPENAI_API_KEY non configurée. Veuillez définir la variable d'environnement."
         )
     
+    # Paramètres fournis, sinon choisis selon l'objectif de latence, sinon par défaut
+    config, routing_decision = routing.resolve(
+        {"model": MODEL, "reasoning_effort": REASONING_EFFORT, "verbosity": VERBOSITY,
+         "search_context_size": SEARCH_CONTEXT_SIZE},
+        {"model": request.model, "reasoning_effort": request.reasoning_effort, "verbosity": request.verbosity,
+         "search_context_size": request.search_context_size},
+        mode=request.mode,
+        max_latency_s=request.max_latency_s
+    )
+    params = {
+        "subject": request.subject,
+        "previous_responses": request.previous_responses or [],
+        **config,
+        "fanout": request.fanout,
+        "strip_duplicates": request.strip_duplicates
+    }
+    key = request_key(**params)
+    params["routing_decision"] = routing_decision
+    return await _submit_research(params, key, request, response)
+
+
+@app.post("/research/{research_id}/followup", response_model=ResearchResponse, status_code=202)
+async def followup_research(research_id: str, response: Response, request: FollowupRequest = FollowupRequest()):
+    """
+    Lancer la suite d'une recherche existante.
+    
+    La suite est chaînée sur la réponse OpenAI de la recherche parente
+    (`previous_response_id`) : seul le nouveau tour est envoyé, sans renvoyer
+    l'historique. Une recherche parente sans réponse à chaîner (recherche en
+    éventail) donne lieu à une recherche complète, avec son rapport comme
+    réponse précédente. La lignée (parent, racine, profondeur) est enregistrée
+    dans les métadonnées de la nouvelle recherche.
+    """
+    if not API_KEY:
+        raise HTTPException(
+            status_code=500,
+            detail="OPENAI_API_KEY non configurée. Veuillez définir la variable d'environnement."
+        )
+    
+    parent = storage.read_metadata(research_id)
+    if parent is None:
+        raise HTTPException(status_code=404, detail=f"Recherche {research_id} non trouvée")
+    previous_response_id = parent.get("response_id")
+    previous_responses = []
+    if not previous_response_id:
+        # Rien à chaîner côté OpenAI : le rapport parent sert de contexte
+        parent_output = storage.read_output(research_id)
+        previous_responses = [parent_output] if parent_output else []
+    
+    parent_lineage = parent.get("lineage") or {}
+    params = {
+        "subject": parent.get("subject"),
+        "previous_responses": previous_responses,
+        "model": request.model or parent.get("model") or MODEL,
+        "verbosity": request.verbosity or parent.get("verbosity") or VERBOSITY,
+        "reasoning_effort": request.reasoning_effort or parent.get("reasoning_effort") or REASONING_EFFORT,
+        "search_context_size": parent.get("search_context_size") or SEARCH_CONTEXT_SIZE,
+        "previous_response_id": previous_response_id,
+        "lineage": {
+            "parent_id": research_id,
+            "root_id": parent_lineage.get("root_id", research_id),
+            "depth": parent_lineage.get("depth", 0) + 1,
+            "since": parent.get("created_at")
+        },
+        "strip_duplicates": request.strip_duplicates
+    }
+    key = request_key(
+        params["subject"], previous_responses, params["model"], params["verbosity"], params["reasoning_effort"],
+        previous_response_id=previous_response_id, search_context_size=params["search_context_size"],
+        strip_duplicates=request.strip_duplicates
+    )
+    # Une suite est une nouvelle question : jamais servie depuis une suite déjà terminée
+    return await _submit_research(params, key, request, response, reuse_results=False)
+
+
+async def _register_callback(research_id: str, request):
+    """Abonne `callback_url` à la fin de la recherche (aussitôt notifié si elle est déjà terminée)."""
+    if not request.callback_url:
+        return
+    await asyncio.to_thread(webhooks.subscribe, research_id, request.callback_url, request.callback_secret)
+    # La recherche a pu se terminer avant l'abonnement (résultat en cache, autre processus)
+    job = await job_queue.get(research_id)
+    if job is None or job.finished:
+        await asyncio.to_thread(_notify_finished_research, research_id, job)
+
+
+def _notify_finished_research(research_id: str, job: Optional[Job]):
+    """Déclenche les webhooks en attente d'une recherche terminée (`job` None : sortie de l'historique)."""
+    if job is not None:
+        metadata = storage.read_metadata(research_id) if job.status == STATUS_COMPLETED else None
+        webhooks.notify(research_id, webhooks.build_payload(research_id, job.status, metadata, job))
+        return
+    metadata = storage.read_metadata(research_id)
+    if metadata is not None:
+        webhooks.notify(research_id, webhooks.build_payload(research_id, STATUS_COMPLETED, metadata))
+
+
+async def _submit_research(params: dict, key: str, request, response: Response, reuse_results: bool = True):
+    """
+    Sert une recherche depuis le cache, la rattache à une exécution identique ou la met en file.
+
+    `reuse_results` False : pas de résultat stocké servi depuis le cache, seule
+    une exécution identique encore en cours est partagée.
+    """
+    if request.callback_url:
+        # Refuser d'emblée les adresses internes (résolution DNS hors de la boucle)
+        try:
+            await asyncio.to_thread(webhooks.resolve_url, request.callback_url)
+        except webhooks.WebhookURLError as e:
+            raise HTTPException(status_code=400, detail=f"callback_url refusée : {e}")
+        except OSError:
+            raise HTTPException(status_code=400, detail="callback_url refusée : hôte introuvable")
+    
+    if request.cache == "bypass":
+        result_cache.bypassed += 1
+    else:
+        # Résultat récent identique déjà stocké
+        cached_id = result_cache.lookup(key) if reuse_results else None
+        if cached_id is not None and storage.exists(cached_id):
+            result_cache.hits += 1
+            await _register_callback(cached_id, request)
+            if request.stream:
+                return _replay_response(cached_id)
+            response.status_code = 200
+            return ResearchResponse(
+                research_id=cached_id,
+                status=STATUS_COMPLETED,
+                message="Résultat identique récent servi depuis le cache",
+                output_file=str(storage.output_path(cached_id)),
+                metadata_file=str(storage.metadata_path(cached_id))
+            )
+        
+        # Recherche identique en cours : partager son exécution
+        inflight_id = result_cache.inflight(key)
+        inflight_job = await job_queue.get(inflight_id) if inflight_id else None
+        if inflight_job is not None and not inflight_job.finished:
+            result_cache.coalesced += 1
+            await _register_callback(inflight_id, request)
+            if request.stream:
+                return _sse_response(inflight_job)
+            return ResearchResponse(
+                research_id=inflight_id,
+                status=inflight_job.status,
+                message="Recherche identique déjà en cours, résultat partagé"
+            )
+        
+        result_cache.misses += 1
+    
     # Générer un ID unique pour cette recherche
     research_id = str(uuid.uuid4())
     
-    # Utiliser les paramètres par défaut ou ceux fournis
-    model = request.model or MODEL
-    verbosity = request.verbosity or VERBOSITY
-    reasoning_effort = request.reasoning_effort or REASONING_EFFORT
-    
+    # Rattachable dès maintenant par une requête identique, pendant l'insertion
+    result_cache.start(key, research_id)
     try:
-        # Effectuer la recherche de manière synchrone (pour l'instant)
-        result = perform_research(
-            subject=request.subject,
-            previous_responses=request.previous_responses,
-            research_id=research_id,
-            model=model,
-            verbosity=verbosity,
-            reasoning_effort=reasoning_effort
+        job = await job_queue.submit(research_id, params, deadline_s=request.deadline_s or JOB_DEADLINE_S)
+    except QueueFullError as e:
+        result_cache.finish(research_id, success=False)
+        raise HTTPException(status_code=503, detail=str(e))
+    await _register_callback(research_id, request)
+    live.hub.emit(live.EVENT_CREATED, research_id, {
+        "status": job.status,
+        "subject": params.get("subject"),
+        "created_at": datetime.utcfromtimestamp(job.created_at).isoformat() + "Z",
+        "model": params.get("model")
+    })
+    
+    if request.stream:
+        return _sse_response(job)
+    
+    return ResearchResponse(
+        research_id=research_id,
+        status=job.status,
+        message="Recherche ajoutée à la file d'attente"
+    )
+
+
+@app.get("/rate-limits")
+async def rate_limits():
+    """
+    Budget OpenAI courant (requêtes et tokens par minute) et temps d'attente
+    récents imposés par l'ordonnanceur, pour dimensionner le parallélisme.
+    """
+    return {
+        "scheduler": scheduler.stats(),
+        "queue": job_queue.stats()
+    }
+
+
+@app.get("/routing/stats")
+async def routing_stats():
+    """
+    Latence (p50/p90), tokens, taille des rapports et coût estimé de chaque
+    combinaison de paramètres mesurée, utilisés par le routage par latence.
+    """
+    return {
+        "window": routing.ROUTING_WINDOW,
+        "min_samples": routing.ROUTING_MIN_SAMPLES,
+        "fast_mode_latency_s": routing.FAST_MODE_LATENCY_S,
+        "combinations": routing.table()
+    }
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Statistiques du cache de résultats (hits, misses, requêtes coalescées)"""
+    return result_cache.stats()
+
+
+@app.get("/jobs/{research_id}")
+async def get_job(research_id: str):
+    """
+    Suivre l'état d'une recherche : queued, running, completed, failed,
+    cancelled ou timed_out.
+    
+    Retourne aussi les durées (attente en file, exécution) et l'erreur éventuelle.
+    """
+    job = await job_queue.get(research_id)
+    if job is not None:
+        return job.to_dict()
+    
+    # Job sorti de l'historique : se rabattre sur les fichiers
+    if storage.exists(research_id):
+        return {
+            "research_id": research_id,
+            "status": STATUS_COMPLETED,
+            "output_file": str(storage.output_path(research_id)),
+            "metadata_file": str(storage.metadata_path(research_id))
+        }
+    
+    raise HTTPException(
+        status_code=404,
+        detail=f"Recherche {research_id} non trouvée"
+    )
+
+
+@app.post("/jobs/{research_id}/cancel")
+async def cancel_job(research_id: str):
+    """
+    Annuler une recherche en attente ou en cours.
+    
+    L'appel à l'API OpenAI est interrompu et le worker libéré immédiatement.
+    """
+    job = await job_queue.get(research_id)
+    if job is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Recherche {research_id} non trouvée ou déjà sortie de l'historique"
         )
-        
-        return ResearchResponse(
-            research_id=research_id,
-            status="completed",
-            message="Recherche terminée avec succès",
-            output_file=result["output_file"],
-            metadata_file=result["metadata_file"]
+    if job.finished:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Recherche {research_id} déjà terminée ({job.status})"
         )
     
-    except Exception as e:
+    await job_queue.cancel(research_id)
+    # Laisser la tâche traiter son annulation avant de répondre
+    await job.wait(timeout=5)
+    return job.to_dict()
+
+
+def _format_sse(event: str, data: dict, event_id: Optional[int] = None) -> str:
+    """Sérialise un événement au format Server-Sent Events."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _sse_response(job: Job, start: int = 0) -> StreamingResponse:
+    """Relaie le journal d'événements d'un job sous forme de flux SSE."""
+    async def event_stream():
+        yield _format_sse("status", job.to_dict())
+        async for entry in job.subscribe(start=start):
+            if entry is None:
+                # Commentaire de keep-alive pour les proxys
+                yield ": ping\n\n"
+                continue
+            index, event, data = entry
+            yield _format_sse(event, data, event_id=index)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def _replay_response(research_id: str) -> StreamingResponse:
+    """Flux SSE rejouant le résultat stocké d'une recherche terminée."""
+    async def replay():
+        yield _format_sse("delta", {"text": storage.read_output(research_id) or ""})
+        yield _format_sse("citations", {"citations": extract_citations(storage.read_raw(research_id) or {})})
+        yield _format_sse("completed", {"research_id": research_id, "status": STATUS_COMPLETED})
+    
+    return StreamingResponse(
+        replay(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/webhooks/{research_id}")
+async def get_webhook_deliveries(research_id: str):
+    """Envois de webhook (`callback_url`) d'une recherche, avec le journal de leurs tentatives"""
+    deliveries = webhooks.deliveries(research_id)
+    if not deliveries:
         raise HTTPException(
-            status_code=500,
-            detail=f"Erreur lors de la recherche: {str(e)}"
+            status_code=404,
+            detail=f"Aucun webhook pour la recherche {research_id}"
         )
+    return {"research_id": research_id, "deliveries": deliveries}
 
 
-@app.get("/results/{research_id}")
-async def get_results(research_id: str, format: str = "json"):
+@app.get("/research/{research_id}/stream")
+async def stream_research(research_id: str, last_event_id: Optional[str] = Header(None)):
     """
-    Récupérer les résultats d'une recherche par son ID.
+    Suivre une recherche en direct (Server-Sent Events).
     
-    - **format**: 'json' pour les métadonnées complètes, 'text' pour le texte brut
+    Événements : status, response, delta (texte), web_search (progression),
+    citation, citations (liste finale), completed ou failed. L'en-tête
+    Last-Event-ID permet de reprendre un flux interrompu.
     """
-    output_file = OUTPUT_DIR / f"{research_id}_output.txt"
-    metadata_file = OUTPUT_DIR / f"{research_id}_metadata.json"
+    job = await job_queue.get(research_id)
+    # Recherche terminée dont le journal a été allégé : le rapport stocké fait foi
+    if job is not None and not (job.trimmed and job.status == STATUS_COMPLETED):
+        start = 0
+        if last_event_id is not None and last_event_id.isdigit():
+            start = int(last_event_id) + 1
+        return _sse_response(job, start=start)
     
-    if not metadata_file.exists():
+    # Recherche terminée, sortie de la mémoire ou au journal allégé : rejouer le résultat stocké
+    if not storage.exists(research_id):
         raise HTTPException(
             status_code=404,
             detail=f"Recherche {research_id} non trouvée"
         )
     
+    return _replay_response(research_id)
+
+
+def _parse_include(include: Optional[str]) -> set:
+    """Parse le paramètre `include` (liste séparée par des virgules)."""
+    return {part.strip() for part in (include or "").split(",") if part.strip()}
+
+
+def _artifact_validators(research_id: str, *variant):
+    """ETag et date de modification d'une recherche, d'après ses fichiers ou son segment (None si absente)."""
+    paths = [storage.metadata_path(research_id)]
+    if storage.output_path(research_id).exists():
+        paths.append(storage.output_path(research_id))
+    validators = http_cache.file_validators(paths, research_id, *variant)
+    if validators is not None:
+        return validators
+
+    # Recherche compactée : position des artefacts dans leur segment
+    packed = segments.entries(research_id)
+    if "metadata" not in packed:
+        return None
+    parts = [f"{e['kind']}:{e['segment']}:{e['offset']}:{e['length']}" for e in packed.values()]
+    return (
+        http_cache.make_etag(research_id, *variant, *sorted(parts)),
+        max(e["packed_at"] for e in packed.values())
+    )
+
+
+@app.get("/results/{research_id}")
+async def get_results(request: Request, research_id: str, format: str = "json", include: Optional[str] = None):
+    """
+    Récupérer les résultats d'une recherche par son ID.
+    
+    - **format**: 'json' pour les métadonnées, 'text' pour le texte brut (requêtes Range acceptées)
+    - **include**: 'raw' pour ajouter la réponse brute de l'API (`output_raw`)
+    
+    Les réponses portent un ETag : renvoyez-le dans `If-None-Match` pour
+    obtenir un 304 sans corps tant que la recherche n'a pas changé.
+    """
+    output_file = storage.output_path(research_id)
+    
     if format == "text":
+        if not storage.exists(research_id):
+            raise HTTPException(
+                status_code=404,
+                detail=f"Recherche {research_id} non trouvée"
+            )
+        if storage.is_packed(research_id):
+            validators = _artifact_validators(research_id, "text")
+            body = storage.read_output_bytes(research_id)
+            if validators is None or body is None:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Fichier de sortie pour {research_id} non trouvé"
+                )
+            return http_cache.bytes_response(
+                request,
+                body,
+                *validators,
+                media_type="text/plain; charset=utf-8",
+                filename=f"research_{research_id}.txt"
+            )
         if not output_file.exists():
             raise HTTPException(
                 status_code=404,
                 detail=f"Fichier de sortie pour {research_id} non trouvé"
             )
-        return FileResponse(
+        return http_cache.file_response(
+            request,
             path=output_file,
-            media_type="text/plain",
+            media_type="text/plain; charset=utf-8",
             filename=f"research_{research_id}.txt"
         )
     
     # Format JSON par défaut
-    with open(metadata_file, "r", encoding="utf-8") as f:
-        metadata = json.load(f)
+    includes = _parse_include(include)
+    validators = _artifact_validators(research_id, "json", "raw" in includes)
+    if validators is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Recherche {research_id} non trouvée"
+        )
+    headers = http_cache.cache_headers(*validators, cache_control=f"public, max-age={http_cache.RESULTS_MAX_AGE}")
+    if http_cache.is_not_modified(request, *validators):
+        return http_cache.not_modified_response(headers)
+    
+    metadata = storage.read_metadata(research_id, include_raw="raw" in includes)
+    if metadata is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Recherche {research_id} non trouvée"
+        )
     
     # Ajouter le texte de sortie si disponible
-    if output_file.exists():
-        with open(output_file, "r", encoding="utf-8") as f:
-            metadata["output_text"] = f.read()
+    output_text = storage.read_output(research_id)
+    if output_text is not None:
+        metadata["output_text"] = output_text
     
-    return metadata
+    return JSONResponse(content=metadata, headers=headers)
 
 
-@app.get("/latest")
-async def get_latest():
-    """Récupérer la dernière recherche effectuée"""
-    metadata_files = list(OUTPUT_DIR.glob("*_metadata.json"))
+@app.get("/results/{research_id}/sources")
+async def get_research_sources(research_id: str, cited_only: bool = False):
+    """
+    Sources d'une recherche
+    
+    - **cited_only**: ne garder que les sources citées dans le rapport
+    """
+    if not storage.exists(research_id):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Recherche {research_id} non trouvée"
+        )
+    
+    entries = sources.for_research(research_id, cited_only=cited_only)
+    return {
+        "research_id": research_id,
+        "total": len(entries),
+        "cited": sum(1 for e in entries if e["cited"]),
+        "retrieved": sum(1 for e in entries if e["retrieved"]),
+        "sources": entries
+    }
+
+
+@app.get("/results/{research_id}/novelty")
+async def get_research_novelty(research_id: str):
+    """
+    Score de nouveauté d'une recherche : part de ses paragraphes absents des
+    recherches des DEDUP_WINDOW_DAYS jours précédents, avec pour chaque
+    redite le paragraphe d'origine (recherche, position, similarité).
+    """
+    if not storage.exists(research_id):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Recherche {research_id} non trouvée"
+        )
     
-    if not metadata_files:
+    report = dedup.report(research_id)
+    summary = (storage.read_metadata(research_id) or {}).get("novelty")
+    if report is not None:
+        if summary and summary.get("warming_up"):
+            # Analysée pendant la préparation, contre un index incomplet
+            report["warming_up"] = True
+        return report
+    if summary is None:
         raise HTTPException(
             status_code=404,
-            detail="Aucune recherche trouvée"
+            detail=f"Recherche {research_id} non analysée (POST /catalog/rebuild pour l'indexer)"
         )
+    # Aucun paragraphe assez long pour être comparé
+    return {
+        "research_id": research_id,
+        **summary,
+        "stripped": summary["duplicates"] if summary.get("stripped") else 0,
+        "repeated": []
+    }
+
+
+@app.get("/latest")
+async def get_latest(request: Request, include: Optional[str] = None):
+    """
+    Récupérer la dernière recherche effectuée
     
-    # Trier par date de modification
-    latest_file = max(metadata_files, key=lambda p: p.stat().st_mtime)
+    - **include**: 'raw' pour ajouter la réponse brute de l'API (`output_raw`)
     
-    with open(latest_file, "r", encoding="utf-8") as f:
-        metadata = json.load(f)
+    Réponse revalidée à chaque appel (`Cache-Control: no-cache`) : un 304 est
+    renvoyé si `If-None-Match` correspond toujours à la dernière recherche.
+    """
+    includes = _parse_include(include)
+    while True:
+        latest = catalog.get_latest()
+        
+        if latest is None:
+            if _warming_up("catalog"):
+                raise HTTPException(
+                    status_code=503,
+                    detail="Indexation des recherches existantes en cours, réessayez dans quelques secondes",
+                    headers={"Retry-After": "5"}
+                )
+            raise HTTPException(
+                status_code=404,
+                detail="Aucune recherche trouvée"
+            )
+        
+        research_id = latest["research_id"]
+        validators = _artifact_validators(research_id, "latest", "raw" in includes)
+        if validators is not None:
+            break
+        
+        # Entrée orpheline (fichiers supprimés hors de l'API)
+        catalog.remove(research_id)
     
-    # Ajouter le texte de sortie
-    research_id = metadata.get("research_id")
-    output_file = OUTPUT_DIR / f"{research_id}_output.txt"
+    headers = http_cache.cache_headers(*validators)
+    if http_cache.is_not_modified(request, *validators):
+        return http_cache.not_modified_response(headers)
     
-    if output_file.exists():
-        with open(output_file, "r", encoding="utf-8") as f:
-            metadata["output_text"] = f.read()
+    metadata = storage.read_metadata(research_id, include_raw="raw" in includes)
+    if metadata is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Recherche {research_id} non trouvée"
+        )
+    
+    # Ajouter le texte de sortie
+    output_text = storage.read_output(research_id)
+    if output_text is not None:
+        metadata["output_text"] = output_text
     
-    return metadata
+    return JSONResponse(content=metadata, headers=headers)
 
 
 @app.get("/list")
-async def list_researches():
-    """Lister toutes les recherches disponibles"""
-    metadata_files = list(OUTPUT_DIR.glob("*_metadata.json"))
-    
-    researches = []
-    for metadata_file in sorted(metadata_files, key=lambda p: p.stat().st_mtime, reverse=True):
-        with open(metadata_file, "r", encoding="utf-8") as f:
-            metadata = json.load(f)
-            researches.append({
-                "research_id": metadata.get("research_id"),
-                "subject": metadata.get("subject"),
-                "created_at": metadata.get("created_at"),
-                "model": metadata.get("model")
-            })
+async def list_researches(
+    request: Request,
+    limit: int = Query(50, ge=1, le=catalog.MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    subject: Optional[str] = None,
+    model: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None
+):
+    """
+    Lister les recherches disponibles, de la plus récente à la plus ancienne.
     
-    return {
-        "total": len(researches),
+    - **limit** / **offset** : pagination classique
+    - **cursor** : pagination par curseur (valeur `next_cursor` de la page précédente)
+    - **subject** : filtre sur le sujet (contient, insensible à la casse)
+    - **model** : filtre sur le modèle
+    - **since** / **until** : bornes de date ISO 8601 sur `created_at`
+    
+    L'ETag change à chaque modification du catalogue (`If-None-Match` → 304).
+    Pendant l'indexation des recherches existantes au démarrage, la liste
+    peut être incomplète : `warming_up` vaut alors true et rien n'est mis en cache.
+    """
+    filters = {"subject": subject, "model": model, "since": since, "until": until}
+    warming_up = _warming_up("catalog")
+    headers = {"Cache-Control": "no-store"}
+    if not warming_up:
+        etag = http_cache.make_etag("list", catalog.generation(), limit, offset, cursor, sorted(filters.items()))
+        headers = http_cache.cache_headers(etag)
+        if http_cache.is_not_modified(request, etag):
+            return http_cache.not_modified_response(headers)
+    
+    try:
+        entries, next_cursor = catalog.list_entries(
+            limit=limit, offset=offset, cursor=cursor, **filters
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    researches = [
+        {
+            "research_id": e["research_id"],
+            "subject": e["subject"],
+            "created_at": e["created_at"],
+            "model": e["model"]
+        }
+        for e in entries
+    ]
+    
+    return JSONResponse(content={
+        "total": catalog.count(**filters),
+        "limit": limit,
+        "offset": 0 if cursor else offset,
+        "next_cursor": next_cursor,
+        "warming_up": warming_up,
         "researches": researches
+    }, headers=headers)
+
+
+@app.websocket("/ws")
+async def live_updates(websocket: WebSocket, since: Optional[int] = None):
+    """
+    Changements de la liste des recherches en direct, à appliquer sur le
+    résultat de /list : `created`, `status`, `completed`, `deleted`.
+
+    Chaque message porte un numéro `seq` ; en se reconnectant avec
+    `?since=<dernier seq reçu>`, le client reçoit les événements manqués.
+    Un message `resync` demande de recharger /list (client trop lent ou
+    coupure trop longue).
+    """
+    await live.serve(websocket, since)
+
+
+@app.get("/export")
+async def export_researches(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    fields: Optional[str] = None,
+    subject: Optional[str] = None,
+    model: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None
+):
+    """
+    Exporter en flux toutes les recherches correspondant aux filtres (NDJSON ou CSV).
+    
+    - **format**: 'ndjson' (une recherche par ligne) ou 'csv'
+    - **fields**: champs à exporter, séparés par des virgules (`output_text` pour le rapport,
+      `output_raw` pour la réponse brute). Par défaut : métadonnées et rapport, sans la réponse brute
+    - **subject** / **model** / **since** / **until** : mêmes filtres que /list
+    
+    Les recherches sont lues une par une : la mémoire utilisée ne dépend pas du nombre exporté.
+    """
+    filters = {"subject": subject, "model": model, "since": since, "until": until}
+    body = export.stream(format, export.parse_fields(fields), **filters)
+    filename = f"export_{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}.{format}"
+    return StreamingResponse(
+        body,
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@app.get("/search")
+async def search_researches(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=search_index.MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0)
+):
+    """
+    Recherche plein texte dans les sujets et les rapports
+    
+    - **q** : mots recherchés (tous requis, `mot*` pour un préfixe)
+    - **limit** / **offset** : pagination
+    
+    Les résultats sont classés par pertinence, avec un extrait où les mots
+    trouvés sont entourés de `<mark>`. `warming_up` vaut true tant que
+    l'index des recherches existantes est en construction au démarrage.
+    """
+    try:
+        results, total = search_index.search(q, limit=limit, offset=offset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {
+        "query": q,
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "warming_up": _warming_up("search_index"),
+        "results": results
     }
 
 
+@app.get("/sources")
+async def list_sources(
+    domain: Optional[str] = None,
+    url: Optional[str] = None,
+    cited_only: bool = False,
+    limit: int = Query(50, ge=1, le=sources.MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0)
+):
+    """
+    Quelles recherches ont cité ou consulté une source
+    
+    - **domain** : domaine (sous-domaines inclus), ex. `europa.eu`
+    - **url** : URL exacte (les paramètres utm_* sont ignorés)
+    - **cited_only** : ne garder que les sources citées dans les rapports
+    """
+    filters = {"domain": domain, "url": url, "cited_only": cited_only}
+    return {
+        "total": sources.count(**filters),
+        "limit": limit,
+        "offset": offset,
+        "warming_up": _warming_up("sources"),
+        "sources": sources.search(limit=limit, offset=offset, **filters)
+    }
+
+
+@app.get("/sources/domains")
+async def list_source_domains(
+    limit: int = Query(50, ge=1, le=sources.MAX_PAGE_SIZE),
+    cited_only: bool = False
+):
+    """Domaines les plus fréquents parmi les sources des recherches"""
+    return {
+        "domains": sources.top_domains(limit=limit, cited_only=cited_only)
+    }
+
+
+@app.post("/catalog/rebuild")
+async def rebuild_catalog():
+    """Reconstruire le catalogue des recherches et les index (sources, plein texte, redites) depuis le dossier outputs/"""
+    def rebuild_all():
+        total = catalog.rebuild(OUTPUT_DIR)
+        _, total_sources = sources.rebuild(OUTPUT_DIR)
+        total_indexed = search_index.rebuild(OUTPUT_DIR)
+        # Index des redites complété (les recherches déjà analysées sont conservées)
+        _, total_paragraphs = dedup.rebuild()
+        return {
+            "message": "Catalogue reconstruit",
+            "total": total,
+            "sources": total_sources,
+            "indexed": total_indexed,
+            "paragraphs": total_paragraphs
+        }
+
+    return await asyncio.to_thread(rebuild_all)
+
+
+@app.get("/storage/stats")
+async def get_storage_stats():
+    """Volume occupé par les fichiers et les segments compactés, politique de rétention et dernière compaction"""
+    return await asyncio.to_thread(compaction.storage_stats)
+
+
+@app.post("/storage/compact")
+async def compact_storage(dry_run: bool = False):
+    """
+    Appliquer la rétention et compacter les anciennes recherches
+    
+    - **dry_run**: lister ce qui serait supprimé et compacté sans rien modifier
+    
+    Les lectures restent servies pendant la compaction.
+    """
+    try:
+        return await _run_compaction(dry_run)
+    except compaction.CompactionBusyError as e:
+        raise HTTPException(
+            status_code=409,
+            detail=str(e)
+        )
+
+
 @app.delete("/results/{research_id}")
 async def delete_research(research_id: str):
     """Supprimer une recherche et ses fichiers associés"""
-    output_file = OUTPUT_DIR / f"{research_id}_output.txt"
-    metadata_file = OUTPUT_DIR / f"{research_id}_metadata.json"
-    
-    if not metadata_file.exists():
+    if not storage.exists(research_id):
         raise HTTPException(
             status_code=404,
             detail=f"Recherche {research_id} non trouvée"
         )
     
-    # Supprimer les fichiers
-    if output_file.exists():
-        output_file.unlink()
-    if metadata_file.exists():
-        metadata_file.unlink()
+    # Supprimer les fichiers et l'entrée du catalogue
+    storage.delete(research_id)
+    catalog.remove(research_id)
+    sources.remove(research_id)
+    search_index.remove(research_id)
+    dedup.remove(research_id)
+    result_cache.invalidate(research_id)
+    live.hub.emit(live.EVENT_DELETED, research_id)
     
     return {
         "message": f"Recherche {research_id} supprimée avec succès"
     }
 
 
+def _import_profile() -> List[tuple]:
+    """(module, secondes cumulées) des imports de api.py, mesurés dans un processus neuf (-X importtime)."""
+    import subprocess
+    import sys
+
+    code = f"import sys; sys.path.insert(0, {str(Path(__file__).resolve().parent)!r}); import api"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True
+    )
+    children, direct, total = [], [], None
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        seconds = int(cumulative) / 1_000_000
+        if depth == 1:
+            children.append((name.strip(), seconds))
+        elif depth == 0:
+            # Les imports d'un module sont listés juste avant lui
+            if name.strip() == "api":
+                direct, total = children, seconds
+            children = []
+    if total is None:
+        return []
+    return [("api", total)] + sorted(direct, key=lambda m: m[1], reverse=True)
+
+
+def profile_startup():
+    """Affiche le temps d'import, de démarrage, de la première réponse /health et de la préparation différée."""
+    print("[INFO] Temps d'import (processus neuf) :")
+    for name, seconds in _import_profile()[:15]:
+        print(f"  {name:<28} {seconds * 1000:8.1f} ms")
+
+    async def run():
+        started = time.perf_counter()
+        async with lifespan(app):
+            ready = time.perf_counter()
+            await health_check()
+            first_health = time.perf_counter()
+            while startup_report["warmup"]["status"] in ("pending", "running"):
+                await asyncio.sleep(0.01)
+        return ready - started, first_health - ready
+
+    lifespan_s, health_s = asyncio.run(run())
+    warmup = startup_report["warmup"]
+    print(f"[INFO] Démarrage (lifespan)      : {lifespan_s * 1000:.1f} ms")
+    print(f"[INFO] Première réponse /health  : {health_s * 1000:.1f} ms")
+    print(f"[INFO] Préparation en tâche de fond ({warmup['status']}) : {warmup.get('duration_s', 0) * 1000:.1f} ms")
+    for name, seconds in warmup["steps"].items():
+        print(f"  {name:<28} {seconds * 1000:8.1f} ms")
+    if warmup.get("error"):
+        print(f"[ERREUR] {warmup['error']}")
+
+
 if __name__ == "__main__":
+    import sys
+    if "--profile-startup" in sys.argv[1:]:
+        profile_startup()
+        sys.exit(0)
+
     import uvicorn
     port = int(os.getenv("PORT", "8000"))
     uvicorn.run(app, host="0.0.0.0", port=port)
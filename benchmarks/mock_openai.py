@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Serveur local qui imite POST /v1/responses de l'API OpenAI, pour les benchmarks.
+
+Les réponses ont la forme de metadata.json : raisonnements chiffrés, appels
+web_search avec leurs sources, texte annoté de citations url_citation. La
+latence, la taille des réponses et le taux d'erreurs sont configurables.
+
+Usage :
+    python benchmarks/mock_openai.py --port 8765 --latency 2 --error-rate 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=sk-bench uvicorn api:app
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Configuration (modifiable par les options de la ligne de commande)
+CONFIG = {
+    "latency": float(os.getenv("MOCK_LATENCY", "1.0")),
+    "jitter": float(os.getenv("MOCK_JITTER", "0.2")),
+    "error_rate": float(os.getenv("MOCK_ERROR_RATE", "0")),
+    "web_searches": int(os.getenv("MOCK_WEB_SEARCHES", "17")),
+    "sources_per_search": int(os.getenv("MOCK_SOURCES_PER_SEARCH", "9")),
+    "text_kb": float(os.getenv("MOCK_TEXT_KB", "10")),
+    "reasoning_kb": float(os.getenv("MOCK_REASONING_KB", "2")),
+    "chunks": int(os.getenv("MOCK_CHUNKS", "50")),
+}
+
+WORDS = (
+    "modèle agent robotique quantique diffusion vidéo régulation énergie puce inférence données "
+    "sécurité multimodal open-source benchmark entraînement GPU cloud santé climat Europe brevet "
+    "startup financement latence contexte raisonnement évaluation alignement"
+).split()
+
+DOMAINS = (
+    "openai.com", "arxiv.org", "reuters.com", "techcrunch.com", "theverge.com", "nature.com",
+    "digital-strategy.ec.europa.eu", "blog.google", "ai.meta.com", "anthropic.com", "wired.com",
+    "mistral.ai", "huggingface.co", "nvidia.com", "lemonde.fr"
+)
+
+app = FastAPI(title="Mock OpenAI Responses API")
+
+
+def _sentence(rng: random.Random, length: int = 14) -> str:
+    words = [rng.choice(WORDS) for _ in range(length)]
+    return " ".join(words).capitalize() + "."
+
+
+def build_text(rng: random.Random, size_kb: float, citations: list) -> tuple:
+    """Rapport en markdown d'environ `size_kb` Ko, et ses annotations url_citation."""
+    parts, annotations = [], []
+    length = 0
+    section = 0
+    while length < size_kb * 1024:
+        section += 1
+        block = f"## Section {section} : {rng.choice(WORDS)} et {rng.choice(WORDS)}\n\n"
+        for _ in range(4):
+            block += f"- {_sentence(rng)} "
+            if citations and rng.random() < 0.5:
+                url, title = rng.choice(citations)
+                start = length + len(block)
+                block += f"([{title}]({url}))"
+                annotations.append({
+                    "type": "url_citation",
+                    "start_index": start,
+                    "end_index": length + len(block),
+                    "url": url,
+                    "title": title,
+                })
+            block += "\n"
+        block += "\n"
+        parts.append(block)
+        length += len(block)
+    return "".join(parts), annotations
+
+
+def build_plan_response(body: dict, rng: random.Random) -> dict:
+    """Réponse à un appel de planification (sortie structurée json_schema) : liste de sous-thèmes."""
+    subtopics = [f"{rng.choice(WORDS).capitalize()} et {rng.choice(WORDS)} ({i + 1})" for i in range(4)]
+    text = json.dumps({"subtopics": subtopics}, ensure_ascii=False)
+    return {
+        "id": f"resp_{uuid.uuid4().hex}",
+        "object": "response",
+        "created_at": time.time(),
+        "status": "completed",
+        "model": body.get("model", "gpt-5-mini"),
+        "output": [{
+            "id": f"msg_{uuid.uuid4().hex}",
+            "type": "message",
+            "role": "assistant",
+            "status": "completed",
+            "content": [{"type": "output_text", "text": text, "annotations": [], "logprobs": []}],
+        }],
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+        "text": body.get("text"),
+        "reasoning": body.get("reasoning", {}),
+        "store": body.get("store", True),
+        "error": None,
+        "incomplete_details": None,
+        "instructions": None,
+        "metadata": {},
+        "temperature": 1.0,
+        "top_p": 1.0,
+        "usage": {
+            "input_tokens": 200,
+            "input_tokens_details": {"cached_tokens": 0},
+            "output_tokens": 60,
+            "output_tokens_details": {"reasoning_tokens": 0},
+            "total_tokens": 260,
+        },
+    }
+
+
+def build_response(body: dict, rng: random.Random = None, config: dict = None) -> dict:
+    """Réponse complète (status completed) au format de l'API Responses."""
+    rng = rng or random.Random()
+    config = config or CONFIG
+    if ((body.get("text") or {}).get("format") or {}).get("type") == "json_schema":
+        return build_plan_response(body, rng)
+    output = []
+    retrieved = []
+
+    for _ in range(config["web_searches"]):
+        encrypted = base64.b64encode(rng.randbytes(int(config["reasoning_kb"] * 768))).decode("ascii")
+        output.append({
+            "id": f"rs_{uuid.uuid4().hex}",
+            "type": "reasoning",
+            "summary": [],
+            "content": None,
+            "encrypted_content": encrypted,
+            "status": None,
+        })
+        sources = []
+        for _ in range(config["sources_per_search"]):
+            url = f"https://{rng.choice(DOMAINS)}/{rng.choice(WORDS)}/{uuid.uuid4().hex[:8]}"
+            sources.append({"type": "url", "url": url})
+            retrieved.append(url)
+        output.append({
+            "id": f"ws_{uuid.uuid4().hex}",
+            "type": "web_search_call",
+            "status": "completed",
+            "action": {
+                "type": "search",
+                "query": " ".join(rng.choice(WORDS) for _ in range(6)),
+                "sources": sources,
+            },
+        })
+
+    cited = [(f"{url}?utm_source=openai", _sentence(rng, 5)) for url in rng.sample(retrieved, min(30, len(retrieved)))]
+    text, annotations = build_text(rng, config["text_kb"], cited)
+    output.append({
+        "id": f"msg_{uuid.uuid4().hex}",
+        "type": "message",
+        "role": "assistant",
+        "status": "completed",
+        "content": [{"type": "output_text", "text": text, "annotations": annotations, "logprobs": []}],
+    })
+
+    input_tokens = 4000 + 4500 * config["web_searches"]
+    output_tokens = int(len(text) / 4) + 300 * config["web_searches"]
+    return {
+        "id": f"resp_{uuid.uuid4().hex}",
+        "object": "response",
+        "created_at": time.time(),
+        "status": "completed",
+        "model": body.get("model", "gpt-5"),
+        "output": output,
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": body.get("tools", []),
+        "text": body.get("text", {"format": {"type": "text"}}),
+        "reasoning": body.get("reasoning", {}),
+        "store": body.get("store", True),
+        "error": None,
+        "incomplete_details": None,
+        "instructions": None,
+        "metadata": {},
+        "temperature": 1.0,
+        "top_p": 1.0,
+        "usage": {
+            "input_tokens": input_tokens,
+            "input_tokens_details": {"cached_tokens": 0},
+            "output_tokens": output_tokens,
+            "output_tokens_details": {"reasoning_tokens": 300 * config["web_searches"]},
+            "total_tokens": input_tokens + output_tokens,
+        },
+    }
+
+
+def _latency() -> float:
+    return max(0.0, CONFIG["latency"] + random.uniform(-CONFIG["jitter"], CONFIG["jitter"]))
+
+
+def _rate_limit_headers() -> dict:
+    return {
+        "x-ratelimit-limit-requests": "100000",
+        "x-ratelimit-remaining-requests": "99999",
+        "x-ratelimit-limit-tokens": "1000000000",
+        "x-ratelimit-remaining-tokens": "999999999",
+    }
+
+
+def _sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+async def _stream(response: dict, latency: float):
+    """Événements de streaming, répartis sur la latence simulée."""
+    searches = [item for item in response["output"] if item["type"] == "web_search_call"]
+    text = response["output"][-1]["content"][0]["text"]
+    chunk_size = max(1, len(text) // max(1, CONFIG["chunks"]))
+    steps = len(searches) + max(1, len(text) // chunk_size)
+    pause = latency / max(1, steps)
+    sequence = 0
+
+    def event(**fields):
+        nonlocal sequence
+        sequence += 1
+        return _sse(dict(fields, sequence_number=sequence))
+
+    yield event(type="response.created", response=dict(response, status="in_progress", output=[]))
+    for index, item in enumerate(searches):
+        yield event(type="response.web_search_call.searching", item_id=item["id"], output_index=index)
+        await asyncio.sleep(pause)
+        yield event(type="response.output_item.done", item=item, output_index=index)
+    for start in range(0, len(text), chunk_size):
+        yield event(
+            type="response.output_text.delta", delta=text[start:start + chunk_size],
+            item_id="msg", output_index=len(searches), content_index=0, logprobs=[]
+        )
+        await asyncio.sleep(pause)
+    yield event(type="response.completed", response=response)
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", "config": CONFIG}
+
+
+@app.post("/v1/responses")
+async def responses(request: Request):
+    body = await request.json()
+    latency = _latency()
+
+    if random.random() < CONFIG["error_rate"]:
+        await asyncio.sleep(min(latency, 0.2))
+        if random.random() < 0.5:
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached (mock)", "type": "rate_limit_exceeded"}},
+                status_code=429, headers={"retry-after": "1", **_rate_limit_headers()}
+            )
+        return JSONResponse({"error": {"message": "Internal error (mock)", "type": "server_error"}}, status_code=500)
+
+    response = build_response(body)
+    if body.get("stream"):
+        return StreamingResponse(
+            _stream(response, latency), media_type="text/event-stream", headers=_rate_limit_headers()
+        )
+    await asyncio.sleep(latency)
+    return JSONResponse(response, headers=_rate_limit_headers())
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Faux serveur /v1/responses pour les benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=CONFIG["latency"], help="latence moyenne (s)")
+    parser.add_argument("--jitter", type=float, default=CONFIG["jitter"], help="variation de latence (s)")
+    parser.add_argument("--error-rate", type=float, default=CONFIG["error_rate"], help="part de réponses 429/500")
+    parser.add_argument("--web-searches", type=int, default=CONFIG["web_searches"])
+    parser.add_argument("--sources-per-search", type=int, default=CONFIG["sources_per_search"])
+    parser.add_argument("--text-kb", type=float, default=CONFIG["text_kb"], help="taille du rapport (Ko)")
+    parser.add_argument("--reasoning-kb", type=float, default=CONFIG["reasoning_kb"],
+                        help="taille de chaque raisonnement chiffré (Ko)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    for key in ("latency", "jitter", "error_rate", "web_searches", "sources_per_search", "text_kb", "reasoning_kb"):
+        CONFIG[key] = getattr(args, key)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Benchmarks de l'API sans clé OpenAI ni réseau.
+
+Lance le faux serveur /v1/responses, remplit un dossier outputs/ temporaire,
+démarre l'API dessus puis mesure débit (req/s) et latences p50/p95/p99 de
+chaque scénario sous concurrence. Les résultats sont écrits en JSON pour
+comparer les exécutions entre elles.
+
+Usage :
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --seed-count 5000 --concurrency 32 --scenarios list,search
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+
+BENCH_DIR = Path(__file__).resolve().parent
+ROOT = BENCH_DIR.parent
+sys.path.insert(0, str(BENCH_DIR))
+
+from mock_openai import WORDS  # noqa: E402
+from seed_outputs import CONFIG, rebuild_indexes, seed  # noqa: E402
+
+SCENARIOS = ("list", "latest", "results", "search", "research")
+RESULTS_DIR = BENCH_DIR / "results"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(url: str, timeout: float = 30, warm: bool = False):
+    """
+    Attend que `url` réponde 200 ; avec `warm`, attend aussi la fin de la
+    préparation différée de l'API (`startup.warmup.status` à "done").
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            response = httpx.get(url, timeout=1)
+            if response.status_code == 200:
+                if not warm:
+                    return
+                warmup = response.json().get("startup", {}).get("warmup", {})
+                if warmup.get("status") == "done":
+                    return
+                if warmup.get("status") == "failed":
+                    raise RuntimeError(f"Préparation de l'API échouée : {warmup.get('error')}")
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"Serveur injoignable ou non prêt : {url}")
+
+
+def percentile(values, fraction):
+    """Percentile (par rang le plus proche) d'une liste de valeurs."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, errors, elapsed) -> dict:
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "duration_s": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2) if latencies else 0.0,
+    }
+
+
+async def run_scenario(client, make_request, total, concurrency) -> dict:
+    """Envoie `total` requêtes avec au plus `concurrency` en vol ; une requête = une coroutine."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                ok = await make_request(client, i)
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def run_research(client, total, concurrency, poll_interval=0.1) -> dict:
+    """POST /research puis attente de la fin du job : latence d'acceptation et de bout en bout."""
+    semaphore = asyncio.Semaphore(concurrency)
+    accepted, completed, errors = [], [], 0
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post("/research", json={
+                "subject": f"Benchmark {i} {random.choice(WORDS)}",
+                "cache": "bypass"
+            })
+            if response.status_code not in (200, 202):
+                errors += 1
+                return
+            accepted.append(time.perf_counter() - started)
+            research_id = response.json()["research_id"]
+            while True:
+                job = (await client.get(f"/jobs/{research_id}")).json()
+                if job.get("status") in ("completed", "failed"):
+                    break
+                await asyncio.sleep(poll_interval)
+            if job["status"] == "completed":
+                completed.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - started
+    return {
+        "accept": summarize(accepted, 0, elapsed),
+        "end_to_end": summarize(completed, errors, elapsed),
+    }
+
+
+async def run_all(base_url, args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=600, limits=limits) as client:
+        listing = (await client.get("/list", params={"limit": 500})).json()
+        ids = [r["research_id"] for r in listing["researches"]] or ["absent"]
+        results = {}
+
+        async def list_page(c, i):
+            r = await c.get("/list", params={"limit": 50, "offset": (i * 50) % max(1, listing["total"])})
+            return r.status_code == 200
+
+        async def latest(c, i):
+            return (await c.get("/latest")).status_code == 200
+
+        async def result(c, i):
+            return (await c.get(f"/results/{ids[i % len(ids)]}")).status_code == 200
+
+        async def search(c, i):
+            q = " ".join(random.sample(WORDS, 2))
+            return (await c.get("/search", params={"q": q})).status_code == 200
+
+        handlers = {"list": list_page, "latest": latest, "results": result, "search": search}
+        for name in args.scenarios:
+            print(f"[INFO] Scénario {name}...")
+            if name == "research":
+                results[name] = await run_research(client, args.research_requests, args.concurrency)
+            else:
+                results[name] = await run_scenario(client, handlers[name], args.requests, args.concurrency)
+
+        health = (await client.get("/health")).json()
+        results["server_latency_s"] = health.get("latency_s", {}).get("research", {})
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "inconnu"
+
+
+def start_process(args, log_file: Path, env=None, cwd=None):
+    """Lance un processus dont la sortie d'erreur (avertissements, traces) va dans `log_file`."""
+    with open(log_file, "wb") as log:
+        return subprocess.Popen(
+            [sys.executable] + args, cwd=cwd, env=env,
+            stdout=subprocess.DEVNULL, stderr=log
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmarks de l'API avec un faux serveur OpenAI")
+    parser.add_argument("--seed-count", type=int, default=2000, help="recherches synthétiques à générer")
+    parser.add_argument("--requests", type=int, default=500, help="requêtes par scénario de lecture")
+    parser.add_argument("--research-requests", type=int, default=50, help="recherches lancées (POST /research)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"scénarios à exécuter parmi {','.join(SCENARIOS)}")
+    parser.add_argument("--workers", type=int, default=8, help="workers de recherche de l'API")
+    parser.add_argument("--mock-latency", type=float, default=1.0, help="latence du faux OpenAI (s)")
+    parser.add_argument("--mock-error-rate", type=float, default=0.0, help="part de 429/500 du faux OpenAI")
+    parser.add_argument("--output", help="fichier JSON de résultats (défaut : benchmarks/results/<date>.json)")
+    parser.add_argument("--keep-dir", action="store_true",
+                        help="conserver le dossier de travail (outputs/ généré, journaux des serveurs)")
+    args = parser.parse_args()
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"scénarios inconnus : {', '.join(sorted(unknown))}")
+    return args
+
+
+def main():
+    args = parse_args()
+    work_dir = Path(tempfile.mkdtemp(prefix="ainp_bench_"))
+    output_dir = work_dir / "outputs"
+    output_dir.mkdir()
+
+    print(f"[INFO] Génération de {args.seed_count} recherches dans '{output_dir}'...")
+    seed_config = dict(CONFIG, web_searches=5, reasoning_kb=0.5)
+    seed_s = seed(output_dir, args.seed_count, seed_config)
+    index_s = rebuild_indexes(output_dir)
+
+    mock_port, api_port = free_port(), free_port()
+    mock = start_process([
+        str(BENCH_DIR / "mock_openai.py"), "--port", str(mock_port),
+        "--latency", str(args.mock_latency), "--error-rate", str(args.mock_error_rate)
+    ], work_dir / "mock_openai.log")
+    env = dict(
+        os.environ,
+        OUTPUT_DIR=str(output_dir),
+        CATALOG_DB=str(output_dir / "catalog.db"),
+        OPENAI_API_KEY="sk-bench",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{mock_port}/v1",
+        OPENAI_BACKOFF_BASE="0.2",
+        RESEARCH_WORKERS=str(args.workers),
+    )
+    api = start_process(
+        ["-m", "uvicorn", "api:app", "--port", str(api_port), "--log-level", "warning"],
+        work_dir / "api.log", env=env, cwd=ROOT
+    )
+
+    try:
+        wait_ready(f"http://127.0.0.1:{mock_port}/health")
+        wait_ready(f"http://127.0.0.1:{api_port}/health", timeout=120, warm=True)
+        scenarios = asyncio.run(run_all(f"http://127.0.0.1:{api_port}", args))
+    finally:
+        for process in (api, mock):
+            process.terminate()
+            process.wait(timeout=10)
+        if not args.keep_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "started_at": datetime.utcnow().isoformat() + "Z",
+        "git_commit": git_commit(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": vars(args),
+        "seed": {"count": args.seed_count, "write_s": round(seed_s, 3), "index_s": index_s},
+        "scenarios": scenarios,
+    }
+
+    output_file = Path(args.output) if args.output else RESULTS_DIR / f"bench_{datetime.utcnow():%Y%m%dT%H%M%SZ}.json"
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    # Résumé lisible
+    print()
+    print("=" * 80)
+    print(f"{'Scénario':<22}{'req/s':>10}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}{'erreurs':>10}")
+    for name, result in scenarios.items():
+        rows = result.items() if name == "research" else [(None, result)] if "rps" in result else []
+        for sub, r in rows:
+            label = f"{name} ({sub})" if sub else name
+            print(f"{label:<22}{r['rps']:>10}{r['p50_ms']:>12}{r['p95_ms']:>12}{r['p99_ms']:>12}{r['errors']:>10}")
+    print("=" * 80)
+    print(f"[OK] Résultats écrits dans '{output_file}'")
+    if args.keep_dir:
+        print(f"[INFO] Dossier conservé : {work_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Remplit un dossier outputs/ de recherches synthétiques pour les benchmarks.
+
+Les artefacts sont écrits par storage.write_research (même format que l'API),
+puis le catalogue et les index (sources, plein texte, redites) sont reconstruits.
+
+Usage : python benchmarks/seed_outputs.py --count 5000 --output-dir /tmp/bench_outputs
+"""
+
+import argparse
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import catalog  # noqa: E402
+import db  # noqa: E402
+import dedup  # noqa: E402
+import search_index  # noqa: E402
+import sources  # noqa: E402
+import storage  # noqa: E402
+from mock_openai import CONFIG, WORDS, build_response  # noqa: E402
+
+MODELS = ("gpt-5", "gpt-5-mini", "o4-mini")
+
+
+def seed(output_dir: Path, count: int, config: dict, seed_value: int = 0) -> float:
+    """Écrit `count` recherches dans `output_dir` ; retourne la durée d'écriture."""
+    rng = random.Random(seed_value)
+    storage.OUTPUT_DIR = output_dir
+    db.configure(output_dir / "catalog.db")
+    now = datetime.utcnow()
+    started = time.perf_counter()
+
+    for i in range(count):
+        research_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        subject = f"{rng.choice(WORDS).capitalize()} {rng.choice(WORDS)} {rng.choice(WORDS)} ({i})"
+        model = rng.choice(MODELS)
+        raw = build_response({"model": model}, rng, config)
+        created_at = (now - timedelta(minutes=rng.randint(0, 60 * 24 * 365))).isoformat() + "Z"
+        metadata = {
+            "research_id": research_id,
+            "model": model,
+            "subject": subject,
+            "previous_responses": [],
+            "created_at": created_at,
+            "response_id": raw["id"],
+            "usage": raw["usage"],
+        }
+        output_text = raw["output"][-1]["content"][0]["text"]
+        storage.write_research(research_id, output_text, metadata, raw)
+        if (i + 1) % 500 == 0:
+            print(f"[INFO] {i + 1}/{count} recherches écrites")
+
+    return time.perf_counter() - started
+
+
+def rebuild_indexes(output_dir: Path) -> dict:
+    """Reconstruit catalogue et index ; retourne la durée de chaque étape."""
+    timings = {}
+    steps = (
+        ("catalog", lambda: catalog.rebuild(output_dir)),
+        ("sources", lambda: sources.rebuild(output_dir)),
+        ("search", lambda: search_index.rebuild(output_dir)),
+        ("dedup", dedup.rebuild),
+    )
+    for name, rebuild in steps:
+        started = time.perf_counter()
+        rebuild()
+        timings[name] = round(time.perf_counter() - started, 3)
+    return timings
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Génère des recherches synthétiques dans un dossier outputs/")
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--output-dir", default="bench_outputs")
+    parser.add_argument("--seed", type=int, default=0, help="graine aléatoire (résultats reproductibles)")
+    parser.add_argument("--web-searches", type=int, default=5)
+    parser.add_argument("--text-kb", type=float, default=CONFIG["text_kb"])
+    parser.add_argument("--reasoning-kb", type=float, default=0.5)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    config = dict(CONFIG, web_searches=args.web_searches, text_kb=args.text_kb, reasoning_kb=args.reasoning_kb)
+
+    print(f"[INFO] Génération de {args.count} recherches dans '{output_dir}'...")
+    elapsed = seed(output_dir, args.count, config, args.seed)
+    print(f"[OK] {args.count} recherches écrites en {elapsed:.1f}s")
+    timings = rebuild_indexes(output_dir)
+    print(f"[OK] Catalogue et index reconstruits : {timings}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Cache des résultats de recherche avec coalescence des requêtes identiques.
+
+Deux requêtes sont identiques si le sujet (normalisé), les réponses
+précédentes, le modèle, la verbosité et l'effort de raisonnement sont les
+mêmes. Une requête identique à une recherche terminée depuis moins de
+`RESULT_CACHE_TTL` secondes réutilise son research_id ; une requête identique
+à une recherche en cours partage le même job (single-flight).
+"""
+
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+# Configuration
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "3600"))
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1000"))
+
+
+def _normalize(text: str) -> str:
+    """Casse et espaces ignorés : « IA  générative » == « ia générative »."""
+    return " ".join((text or "").split()).casefold()
+
+
+def request_key(
+    subject: str,
+    previous_responses: List[str],
+    model: str,
+    verbosity: str,
+    reasoning_effort: str,
+    previous_response_id: Optional[str] = None,
+    fanout: Optional[int] = None,
+    search_context_size: Optional[str] = None,
+    strip_duplicates: bool = False
+) -> str:
+    """Clé de cache d'une requête normalisée (une suite dépend aussi de la réponse chaînée)."""
+    normalized = {
+        "subject": _normalize(subject),
+        "previous_responses": [_normalize(p) for p in previous_responses or []],
+        "model": model,
+        "verbosity": verbosity,
+        "reasoning_effort": reasoning_effort,
+    }
+    if previous_response_id:
+        normalized["previous_response_id"] = previous_response_id
+    if fanout:
+        normalized["fanout"] = fanout
+    if search_context_size:
+        normalized["search_context_size"] = search_context_size
+    if strip_duplicates:
+        normalized["strip_duplicates"] = True
+    payload = json.dumps(normalized, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Cache LRU borné avec expiration, et registre des recherches en cours.
+
+    - `lookup(key)` : research_id d'une recherche terminée encore valide
+    - `inflight(key)` : research_id d'une recherche identique en cours
+    """
+
+    def __init__(self, ttl: float = RESULT_CACHE_TTL, max_size: int = RESULT_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: Dict[str, str] = {}
+        self._inflight_keys: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.bypassed = 0
+
+    def lookup(self, key: str) -> Optional[str]:
+        """Research_id en cache pour cette clé, ou None (expiré ou absent)."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        research_id, stored_at = entry
+        if time.time() - stored_at > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return research_id
+
+    def inflight(self, key: str) -> Optional[str]:
+        return self._inflight.get(key)
+
+    def start(self, key: str, research_id: str):
+        """Enregistre une recherche en cours pour cette clé."""
+        self._inflight[key] = research_id
+        self._inflight_keys[research_id] = key
+
+    def finish(self, research_id: str, success: bool):
+        """Termine une recherche en cours ; en cas de succès, la met en cache."""
+        key = self._inflight_keys.pop(research_id, None)
+        if key is None:
+            return
+        if self._inflight.get(key) == research_id:
+            del self._inflight[key]
+        if success and self.ttl > 0:
+            self._entries[key] = (research_id, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, research_id: str):
+        """Retire du cache toutes les entrées pointant vers cette recherche."""
+        for key in [k for k, (rid, _) in self._entries.items() if rid == research_id]:
+            del self._entries[key]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.coalesced + self.misses
+        return {
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0,
+            "ttl_s": self.ttl,
+            "max_size": self.max_size,
+        }
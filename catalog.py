@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Catalogue indexé des recherches stockées dans outputs/.
+
+Le catalogue évite de parcourir et relire tous les fichiers *_metadata.json
+pour /list et /latest : il est mis à jour à chaque écriture et suppression,
+et peut être reconstruit depuis le disque à la demande.
+
+Usage : python catalog.py rebuild [dossier_outputs]
+"""
+
+import base64
+import json
+import sys
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import db
+import segments
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS researches (
+    research_id TEXT PRIMARY KEY,
+    subject TEXT,
+    model TEXT,
+    created_at TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'completed',
+    output_size INTEGER NOT NULL DEFAULT 0,
+    metadata_size INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_researches_created
+    ON researches (created_at DESC, research_id DESC);
+CREATE INDEX IF NOT EXISTS idx_researches_model
+    ON researches (model, created_at);
+
+-- Compteur de modifications, pour les ETag de /list
+CREATE TABLE IF NOT EXISTS catalog_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    generation INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO catalog_state (id, generation) VALUES (1, 0);
+CREATE TRIGGER IF NOT EXISTS researches_inserted AFTER INSERT ON researches
+    BEGIN UPDATE catalog_state SET generation = generation + 1; END;
+CREATE TRIGGER IF NOT EXISTS researches_updated AFTER UPDATE ON researches
+    BEGIN UPDATE catalog_state SET generation = generation + 1; END;
+CREATE TRIGGER IF NOT EXISTS researches_deleted AFTER DELETE ON researches
+    BEGIN UPDATE catalog_state SET generation = generation + 1; END;
+"""
+db.register_schema(SCHEMA)
+
+COLUMNS = ("research_id", "subject", "model", "created_at", "status", "output_size", "metadata_size")
+
+MAX_PAGE_SIZE = 500
+
+
+def _file_size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except OSError:
+        return 0
+
+
+def entry_from_metadata(metadata: dict, output_size: int, metadata_size: int) -> dict:
+    """Construit une entrée du catalogue à partir des métadonnées d'une recherche."""
+    return {
+        "research_id": metadata.get("research_id"),
+        "subject": metadata.get("subject"),
+        "model": metadata.get("model"),
+        "created_at": metadata.get("created_at") or "",
+        "status": metadata.get("status", "completed"),
+        "output_size": output_size,
+        "metadata_size": metadata_size,
+    }
+
+
+def entry_from_files(metadata: dict, output_file: Path, metadata_file: Path) -> dict:
+    return entry_from_metadata(metadata, _file_size(output_file), _file_size(metadata_file))
+
+
+def upsert(entry: dict):
+    """Ajoute ou met à jour une recherche dans le catalogue."""
+    with db.transaction() as conn:
+        conn.execute(
+            f"INSERT OR REPLACE INTO researches ({', '.join(COLUMNS)}) "
+            f"VALUES ({', '.join('?' for _ in COLUMNS)})",
+            [entry.get(c) for c in COLUMNS]
+        )
+
+
+def remove(research_id: str):
+    """Retire une recherche du catalogue."""
+    with db.transaction() as conn:
+        conn.execute("DELETE FROM researches WHERE research_id = ?", (research_id,))
+
+
+def get(research_id: str) -> Optional[dict]:
+    row = db.get_connection().execute(
+        "SELECT * FROM researches WHERE research_id = ?", (research_id,)
+    ).fetchone()
+    return dict(row) if row else None
+
+
+def get_latest() -> Optional[dict]:
+    """Dernière recherche, lue directement sur l'index par date."""
+    row = db.get_connection().execute(
+        "SELECT * FROM researches ORDER BY created_at DESC, research_id DESC LIMIT 1"
+    ).fetchone()
+    return dict(row) if row else None
+
+
+def encode_cursor(entry: dict) -> str:
+    """Curseur opaque de pagination (position après `entry`)."""
+    raw = f"{entry['created_at']}|{entry['research_id']}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        created_at, research_id = raw.split("|", 1)
+    except Exception:
+        raise ValueError("Curseur de pagination invalide")
+    return created_at, research_id
+
+
+def _filters(
+    subject: Optional[str] = None,
+    model: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None
+) -> Tuple[List[str], list]:
+    clauses, params = [], []
+    if subject:
+        escaped = subject.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        clauses.append("subject LIKE ? ESCAPE '\\'")
+        params.append(f"%{escaped}%")
+    if model:
+        clauses.append("model = ?")
+        params.append(model)
+    if since:
+        clauses.append("created_at >= ?")
+        params.append(since)
+    if until:
+        clauses.append("created_at <= ?")
+        params.append(until)
+    return clauses, params
+
+
+def count(**filters) -> int:
+    clauses, params = _filters(**filters)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return db.get_connection().execute(
+        f"SELECT COUNT(*) FROM researches {where}", params
+    ).fetchone()[0]
+
+
+def list_entries(
+    limit: int = 50,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    **filters
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Page de recherches, de la plus récente à la plus ancienne.
+
+    Le curseur (pagination par clé) est prioritaire sur `offset` et reste
+    en temps constant quelle que soit la profondeur de la page.
+    Retourne (entrées, curseur de la page suivante ou None).
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    clauses, params = _filters(**filters)
+    if cursor:
+        created_at, research_id = decode_cursor(cursor)
+        clauses.append("(created_at, research_id) < (?, ?)")
+        params.extend([created_at, research_id])
+        offset = 0
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = db.get_connection().execute(
+        f"SELECT * FROM researches {where} "
+        f"ORDER BY created_at DESC, research_id DESC LIMIT ? OFFSET ?",
+        params + [limit + 1, offset]
+    ).fetchall()
+
+    entries = [dict(r) for r in rows[:limit]]
+    next_cursor = encode_cursor(entries[-1]) if len(rows) > limit else None
+    return entries, next_cursor
+
+
+def ids_by_age() -> List[Tuple[str, str]]:
+    """(research_id, created_at) de toutes les recherches, de la plus ancienne à la plus récente."""
+    rows = db.get_connection().execute(
+        "SELECT research_id, created_at FROM researches ORDER BY created_at, research_id"
+    ).fetchall()
+    return [(row["research_id"], row["created_at"]) for row in rows]
+
+
+def generation() -> int:
+    """Numéro incrémenté à chaque modification du catalogue."""
+    return db.get_connection().execute(
+        "SELECT generation FROM catalog_state WHERE id = 1"
+    ).fetchone()[0]
+
+
+def is_empty() -> bool:
+    return db.get_connection().execute("SELECT 1 FROM researches LIMIT 1").fetchone() is None
+
+
+def rebuild(output_dir: Path, merge: bool = False) -> int:
+    """
+    Reconstruit entièrement le catalogue depuis les fichiers de `output_dir` et les segments.
+
+    Avec `merge`, rien n'est supprimé et les entrées déjà présentes sont
+    gardées : sûr pendant que l'API catalogue de nouvelles recherches.
+    """
+    entries = []
+    for metadata_file in Path(output_dir).glob("*_metadata.json"):
+        try:
+            with open(metadata_file, "r", encoding="utf-8") as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if not metadata.get("research_id"):
+            continue
+        output_file = Path(output_dir) / f"{metadata['research_id']}_output.txt"
+        entries.append(entry_from_files(metadata, output_file, metadata_file))
+
+    # Recherches déplacées dans les segments compactés
+    loose = {e["research_id"] for e in entries}
+    for research_id, contents in segments.iter_packed(("metadata",)):
+        if research_id in loose:
+            continue
+        positions = segments.entries(research_id)
+        metadata = json.loads(contents["metadata"].decode("utf-8"))
+        entries.append(entry_from_metadata(
+            dict(metadata, research_id=research_id),
+            positions.get("output", {}).get("length", 0),
+            positions["metadata"]["length"]
+        ))
+
+    with db.transaction() as conn:
+        if not merge:
+            conn.execute("DELETE FROM researches")
+        conn.executemany(
+            f"INSERT OR {'IGNORE' if merge else 'REPLACE'} INTO researches ({', '.join(COLUMNS)}) "
+            f"VALUES ({', '.join('?' for _ in COLUMNS)})",
+            [[e.get(c) for c in COLUMNS] for e in entries]
+        )
+    return len(entries)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        print("Usage : python catalog.py rebuild [dossier_outputs]", file=sys.stderr)
+        sys.exit(1)
+    directory = Path(sys.argv[2]) if len(sys.argv) > 2 else Path("outputs")
+    total = rebuild(directory)
+    print(f"[OK] Catalogue reconstruit : {total} recherches indexées dans '{db.DB_PATH}'")
@@ -22,6 +22,26 @@ def main():
     print("📁 Fichiers essentiels:")
     required_files = [
         "api.py",
+        "jobs.py",
+        "openai_client.py",
+        "db.py",
+        "catalog.py",
+        "storage.py",
+        "cache.py",
+        "rate_limiter.py",
+        "context_compaction.py",
+        "sources.py",
+        "search_index.py",
+        "metrics.py",
+        "http_cache.py",
+        "fanout.py",
+        "routing.py",
+        "segments.py",
+        "compaction.py",
+        "export.py",
+        "webhooks.py",
+        "live.py",
+        "dedup.py",
         "requirements.txt",
         "railway.toml",
         "Procfile",
@@ -81,7 +101,7 @@ def main():
             
         checks = {
             "FastAPI importé": "from fastapi import FastAPI" in api_content,
-            "OpenAI importé": "from openai import OpenAI" in api_content,
+            "Client OpenAI partagé": "from openai_client import" in api_content,
             "Endpoint /health": '@app.get("/health")' in api_content,
             "Endpoint /research": '/research' in api_content and '@app.post' in api_content,
             "Configuration PORT": 'os.getenv("PORT"' in api_content or 'os.getenv("OPENAI_API_KEY"' in api_content,
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Rétention et compaction du dossier outputs/.
+
+Une passe de compaction, exécutable pendant que l'API sert des requêtes :
+1. Rétention : supprime les recherches trop anciennes, au-delà du nombre
+   maximal ou du volume maximal (les plus anciennes d'abord), partout
+   (fichiers, segments, catalogue, sources, index plein texte, redites).
+2. Compactage : déplace les recherches plus anciennes que PACK_AFTER_DAYS de
+   leurs fichiers propres vers des segments (voir segments.py).
+3. Récupération de place : réécrit les segments dont la part vivante est
+   inférieure à SEGMENT_MIN_LIVE_RATIO et supprime les anciens fichiers.
+
+Un verrou avec bail dans SQLite garantit qu'une seule passe s'exécute à la
+fois, quel que soit le nombre de processus ; le rapport de la dernière
+passe y est conservé.
+
+Usage : python compaction.py [compact|stats] [--dry-run]
+"""
+
+import json
+import os
+import socket
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import catalog
+import db
+import dedup
+import search_index
+import segments
+import sources
+import storage
+
+# Configuration (0 = pas de limite / désactivé)
+RETENTION_MAX_AGE_DAYS = float(os.getenv("RETENTION_MAX_AGE_DAYS", "0"))
+RETENTION_MAX_COUNT = int(os.getenv("RETENTION_MAX_COUNT", "0"))
+RETENTION_MAX_BYTES = int(os.getenv("RETENTION_MAX_BYTES", "0"))
+PACK_AFTER_DAYS = float(os.getenv("PACK_AFTER_DAYS", "7"))
+SEGMENT_MIN_LIVE_RATIO = float(os.getenv("SEGMENT_MIN_LIVE_RATIO", "0.5"))
+COMPACTION_INTERVAL_S = float(os.getenv("COMPACTION_INTERVAL", "0"))
+COMPACTION_LEASE_S = float(os.getenv("COMPACTION_LEASE", "300"))
+PACK_BATCH_SIZE = 200
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS compaction_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    owner TEXT,
+    lease_until REAL,
+    last_report TEXT
+);
+INSERT OR IGNORE INTO compaction_state (id) VALUES (1);
+"""
+db.register_schema(SCHEMA)
+
+
+class CompactionBusyError(Exception):
+    """Une autre passe de compaction est en cours."""
+
+
+def default_policy() -> dict:
+    return {
+        "max_age_days": RETENTION_MAX_AGE_DAYS,
+        "max_count": RETENTION_MAX_COUNT,
+        "max_bytes": RETENTION_MAX_BYTES,
+        "pack_after_days": PACK_AFTER_DAYS,
+        "min_live_ratio": SEGMENT_MIN_LIVE_RATIO,
+    }
+
+
+def _owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _acquire(owner: str) -> bool:
+    now = time.time()
+    with db.transaction() as conn:
+        cursor = conn.execute(
+            "UPDATE compaction_state SET owner = ?, lease_until = ? "
+            "WHERE id = 1 AND (owner IS NULL OR owner = ? OR lease_until < ?)",
+            (owner, now + COMPACTION_LEASE_S, owner, now)
+        )
+    return cursor.rowcount == 1
+
+
+def _renew(owner: str):
+    with db.transaction() as conn:
+        conn.execute(
+            "UPDATE compaction_state SET lease_until = ? WHERE id = 1 AND owner = ?",
+            (time.time() + COMPACTION_LEASE_S, owner)
+        )
+
+
+def _release(owner: str, report: Optional[dict]):
+    with db.transaction() as conn:
+        if report is not None:
+            conn.execute(
+                "UPDATE compaction_state SET owner = NULL, lease_until = NULL, last_report = ? "
+                "WHERE id = 1 AND owner = ?",
+                (json.dumps(report, ensure_ascii=False), owner)
+            )
+        else:
+            conn.execute(
+                "UPDATE compaction_state SET owner = NULL, lease_until = NULL WHERE id = 1 AND owner = ?",
+                (owner,)
+            )
+
+
+def last_report() -> Optional[dict]:
+    row = db.get_connection().execute("SELECT last_report FROM compaction_state WHERE id = 1").fetchone()
+    return json.loads(row["last_report"]) if row and row["last_report"] else None
+
+
+def is_running() -> bool:
+    row = db.get_connection().execute(
+        "SELECT owner, lease_until FROM compaction_state WHERE id = 1"
+    ).fetchone()
+    return bool(row and row["owner"] and row["lease_until"] >= time.time())
+
+
+def _cutoff(days: float) -> str:
+    """Date ISO (format de `created_at`) d'il y a `days` jours."""
+    return (datetime.utcnow() - timedelta(days=days)).isoformat() + "Z"
+
+
+def select_expired(policy: dict) -> List[str]:
+    """Recherches à supprimer selon la politique de rétention, les plus anciennes d'abord."""
+    researches = catalog.ids_by_age()
+    expired = set()
+
+    if policy.get("max_age_days"):
+        cutoff = _cutoff(policy["max_age_days"])
+        expired.update(research_id for research_id, created_at in researches if created_at < cutoff)
+
+    if policy.get("max_count") and len(researches) > policy["max_count"]:
+        expired.update(research_id for research_id, _ in researches[: len(researches) - policy["max_count"]])
+
+    if policy.get("max_bytes"):
+        # Garder les plus récentes tant que le volume tient dans le budget
+        kept_bytes = 0
+        for research_id, _ in reversed(researches):
+            if research_id in expired:
+                continue
+            kept_bytes += storage.size(research_id)
+            if kept_bytes > policy["max_bytes"]:
+                expired.add(research_id)
+
+    return [research_id for research_id, _ in researches if research_id in expired]
+
+
+def delete_research(research_id: str) -> bool:
+    """Supprime une recherche partout : artefacts, catalogue, sources, index plein texte, redites."""
+    found = storage.delete(research_id)
+    catalog.remove(research_id)
+    sources.remove(research_id)
+    search_index.remove(research_id)
+    dedup.remove(research_id)
+    return found
+
+
+def select_packable(pack_after_days: float) -> List[str]:
+    """Recherches encore en fichiers propres et plus anciennes que `pack_after_days`."""
+    cutoff = _cutoff(pack_after_days)
+    return [
+        research_id for research_id, created_at in catalog.ids_by_age()
+        if created_at < cutoff and storage.metadata_path(research_id).exists()
+    ]
+
+
+def compact(policy: Optional[dict] = None, dry_run: bool = False) -> dict:
+    """
+    Exécute une passe complète (rétention, compactage, récupération de place).
+
+    En `dry_run`, rien n'est modifié : le rapport liste ce qui serait fait.
+    Lève CompactionBusyError si une autre passe est en cours.
+    """
+    policy = {**default_policy(), **(policy or {})}
+    owner = _owner()
+    if not _acquire(owner):
+        raise CompactionBusyError("Une compaction est déjà en cours")
+
+    started = time.perf_counter()
+    report = None
+    try:
+        expired = select_expired(policy)
+        deleted_bytes = sum(storage.size(research_id) for research_id in expired)
+        packable = [r for r in select_packable(policy["pack_after_days"]) if r not in set(expired)]
+
+        report = {
+            "started_at": datetime.utcnow().isoformat() + "Z",
+            "dry_run": dry_run,
+            "policy": policy,
+            "deleted": expired,
+            "deleted_bytes": deleted_bytes,
+            "packed": 0,
+            "segments_removed": 0,
+            "reclaimed_bytes": 0,
+        }
+        if dry_run:
+            report["packed"] = len(packable)
+            return report
+
+        for research_id in expired:
+            delete_research(research_id)
+        _renew(owner)
+
+        for start in range(0, len(packable), PACK_BATCH_SIZE):
+            report["packed"] += len(storage.pack(packable[start:start + PACK_BATCH_SIZE]))
+            _renew(owner)
+
+        report["segments_removed"], report["reclaimed_bytes"] = segments.reclaim(policy["min_live_ratio"])
+        return report
+    finally:
+        if report is not None:
+            report["duration_s"] = round(time.perf_counter() - started, 3)
+        _release(owner, None if report is None or dry_run else report)
+
+
+def storage_stats() -> dict:
+    """Volume occupé par les fichiers propres et les segments, et dernière compaction."""
+    loose_count = loose_bytes = 0
+    for path in storage.OUTPUT_DIR.glob("*"):
+        if not path.is_file():
+            continue
+        try:
+            loose_bytes += path.stat().st_size
+        except FileNotFoundError:
+            continue
+        if path.name.endswith("_metadata.json"):
+            loose_count += 1
+
+    segment_stats = segments.stats()
+    return {
+        "researches": catalog.count(),
+        "loose": {"researches": loose_count, "bytes": loose_bytes},
+        "segments": segment_stats,
+        "total_bytes": loose_bytes + segment_stats["bytes"],
+        "policy": default_policy(),
+        "compaction_running": is_running(),
+        "last_compaction": last_report(),
+    }
+
+
+def main() -> int:
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    command = args[0] if args else "compact"
+    if command == "stats":
+        print(json.dumps(storage_stats(), ensure_ascii=False, indent=2))
+        return 0
+    if command != "compact":
+        print("Usage : python compaction.py [compact|stats] [--dry-run]", file=sys.stderr)
+        return 1
+
+    dry_run = "--dry-run" in sys.argv
+    try:
+        report = compact(dry_run=dry_run)
+    except CompactionBusyError as e:
+        print(f"[ERREUR] {e}", file=sys.stderr)
+        return 1
+
+    prefix = "[INFO] (simulation) " if dry_run else "[OK] "
+    print(f"{prefix}{len(report['deleted'])} recherches supprimées ({report['deleted_bytes']} octets)")
+    print(f"{prefix}{report['packed']} recherches compactées dans {segments.SEGMENT_DIR}")
+    print(f"{prefix}{report['segments_removed']} segments réécrits, {report['reclaimed_bytes']} octets récupérés")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
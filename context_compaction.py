@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Compaction des réponses précédentes (PreviousResponses) sous un budget de tokens.
+
+Pour les sujets récurrents, les rapports précédents complets gonflent le
+message utilisateur à chaque édition. Au-delà du budget, ils sont remplacés
+par un condensé : thèmes déjà couverts, URLs déjà citées, entités clés et
+dates. La taille du prompt reste ainsi à peu près constante quelle que soit
+la longueur de l'historique.
+
+Les tokens sont comptés localement avec tiktoken s'il est installé, sinon
+par une approximation (environ 4 caractères par token).
+"""
+
+import json
+import os
+import re
+from collections import Counter
+from typing import List, Tuple, Union
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _ENCODING = None
+
+# Configuration
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+
+# Part du budget réservée à chaque rubrique du condensé
+SECTION_SHARES = (
+    ("Topics", 0.5),
+    ("CitedURLs", 0.25),
+    ("Entities", 0.15),
+    ("Dates", 0.1),
+)
+
+MAX_TOPIC_CHARS = 140
+
+_URL = re.compile(r"https?://[^\s<>\"')\]]+")
+_HEADING = re.compile(r"^\s*(?:#{1,6}\s+|\*\*)(.+?)(?:\*\*)?\s*:?\s*$")
+_BULLET = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+(.+)$")
+_ENTITY = re.compile(
+    r"\b(?:[A-ZÀ-Ý]\w*(?:[-.]\w+)*)(?:\s+(?:[A-ZÀ-Ý0-9]\w*(?:[-.]\w+)*))*"
+)
+_MONTHS = (
+    "janvier|février|fevrier|mars|avril|mai|juin|juillet|août|aout|septembre|octobre|novembre|décembre|decembre|"
+    "january|february|march|april|may|june|july|august|september|october|november|december"
+)
+_DATE = re.compile(
+    rf"\b(?:\d{{4}}-\d{{2}}-\d{{2}}|(?:\d{{1,2}}(?:er)?\s+)?(?:{_MONTHS})\s+\d{{4}}|Q[1-4]\s+\d{{4}})\b",
+    re.IGNORECASE
+)
+
+# Mots capitalisés en début de phrase qui ne sont pas des entités
+_STOPWORDS = {
+    "Le", "La", "Les", "Un", "Une", "Des", "Du", "De", "Et", "En", "Au", "Aux", "Ce", "Cette",
+    "Ces", "Il", "Elle", "Ils", "Elles", "On", "Pour", "Par", "Sur", "Dans", "Avec", "Sans",
+    "Voici", "Source", "Sources", "Pourquoi", "Quoi", "Comment", "Note", "The", "A", "An",
+    "In", "On", "For", "With", "Sujet", "Résultat",
+}
+
+
+def count_tokens(text: str) -> int:
+    """Nombre de tokens d'un texte (tiktoken si disponible, sinon approximation)."""
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return max(1, len(text) // 4)
+
+
+def _serialized_tokens(value) -> int:
+    return count_tokens(json.dumps(value, ensure_ascii=False))
+
+
+def _clean_url(url: str) -> str:
+    url = url.rstrip(".,;:")
+    # Les paramètres de suivi ne distinguent pas deux sources
+    return re.sub(r"[?&]utm_[^&#]*", "", url).rstrip("?&")
+
+
+def _shorten(text: str) -> str:
+    text = " ".join(_URL.sub("", text).replace("**", "").split()).strip(" :-")
+    if len(text) <= MAX_TOPIC_CHARS:
+        return text
+    cut = text[:MAX_TOPIC_CHARS]
+    return cut[: cut.rfind(" ")] + "…" if " " in cut else cut + "…"
+
+
+def extract_digest(previous_responses: List[str]) -> dict:
+    """Condensé complet (sans limite de taille) des réponses précédentes."""
+    topics, urls, entities, dates = [], [], Counter(), []
+    seen_topics, seen_urls, seen_dates = set(), set(), set()
+
+    for text in previous_responses:
+        for line in text.splitlines():
+            match = _HEADING.match(line) or _BULLET.match(line)
+            if match:
+                topic = _shorten(match.group(1))
+                key = topic.casefold()
+                if len(topic) > 3 and key not in seen_topics:
+                    seen_topics.add(key)
+                    topics.append(topic)
+
+        for url in _URL.findall(text):
+            url = _clean_url(url)
+            if url not in seen_urls:
+                seen_urls.add(url)
+                urls.append(url)
+
+        for entity in _ENTITY.findall(_URL.sub(" ", text)):
+            words = entity.split()
+            while words and words[0] in _STOPWORDS:
+                words = words[1:]
+            if words and (len(words) > 1 or len(words[0]) > 2 or words[0].isupper()):
+                entities[" ".join(words)] += 1
+
+        for date in _DATE.findall(text):
+            key = date.casefold()
+            if key not in seen_dates:
+                seen_dates.add(key)
+                dates.append(date)
+
+    # Un texte court sans structure reste un thème à part entière
+    if not topics:
+        topics = [_shorten(t) for t in previous_responses if t.strip()]
+
+    return {
+        "Topics": topics,
+        "CitedURLs": urls,
+        "Entities": [name for name, _ in entities.most_common()],
+        "Dates": dates,
+    }
+
+
+def _fit(digest: dict, budget: int) -> dict:
+    """Tronque chaque rubrique à sa part du budget, puis redistribue le reste."""
+    fitted = {name: [] for name, _ in SECTION_SHARES}
+    overhead = _serialized_tokens(fitted)
+    available = max(0, budget - overhead)
+
+    remaining = {}
+    used = 0
+    for name, share in SECTION_SHARES:
+        allowance = int(available * share)
+        spent = 0
+        items = list(digest.get(name, []))
+        while items:
+            cost = _serialized_tokens(items[0]) + 1
+            if spent + cost > allowance:
+                break
+            fitted[name].append(items.pop(0))
+            spent += cost
+        used += spent
+        remaining[name] = items
+
+    # Deuxième passe : le budget non utilisé profite aux rubriques dans l'ordre
+    for name, _ in SECTION_SHARES:
+        for item in remaining[name]:
+            cost = _serialized_tokens(item) + 1
+            if used + cost > available:
+                break
+            fitted[name].append(item)
+            used += cost
+
+    return {name: items for name, items in fitted.items() if items}
+
+
+def compact_previous_responses(
+    previous_responses: List[str],
+    budget: int = CONTEXT_TOKEN_BUDGET
+) -> Tuple[Union[List[str], dict], dict]:
+    """
+    Retourne (contexte à envoyer, rapport).
+
+    Sous le budget, les réponses précédentes sont envoyées telles quelles ;
+    au-delà, elles sont remplacées par un condensé qui tient dans le budget.
+    Le rapport indique les tokens avant/après et le gain.
+    """
+    previous_responses = previous_responses or []
+    original_tokens = _serialized_tokens(previous_responses)
+    report = {
+        "budget": budget,
+        "tokenizer": "tiktoken" if _ENCODING is not None else "approx",
+        "original_tokens": original_tokens,
+        "compacted_tokens": original_tokens,
+        "saved_tokens": 0,
+        "compacted": False,
+    }
+    if original_tokens <= budget:
+        return previous_responses, report
+
+    digest = _fit(extract_digest(previous_responses), budget)
+    compacted_tokens = _serialized_tokens(digest)
+    report.update(
+        compacted_tokens=compacted_tokens,
+        saved_tokens=original_tokens - compacted_tokens,
+        compacted=True,
+    )
+    return digest, report
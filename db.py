@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Accès à la base SQLite locale partagée (catalogue des recherches, index...).
+
+Chaque module déclare son schéma avec `register_schema` ; le schéma est
+appliqué à la première connexion de chaque thread. La base est en mode WAL
+pour que les lectures ne soient jamais bloquées par une écriture.
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List
+
+# Configuration
+DB_PATH = Path(os.getenv("CATALOG_DB", os.path.join(os.getenv("OUTPUT_DIR", "outputs"), "catalog.db")))
+
+_schemas: List[str] = []
+_local = threading.local()
+
+
+def register_schema(sql: str):
+    """Déclare des instructions CREATE ... IF NOT EXISTS à appliquer."""
+    if sql not in _schemas:
+        _schemas.append(sql)
+
+
+def configure(path):
+    """Change l'emplacement de la base (tests, benchmarks)."""
+    global DB_PATH
+    DB_PATH = Path(path)
+    close()
+
+
+def get_connection() -> sqlite3.Connection:
+    """Retourne la connexion du thread courant, en l'ouvrant si besoin."""
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.path != DB_PATH:
+        DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(DB_PATH, timeout=30, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn = conn
+        _local.path = DB_PATH
+        _local.applied = 0
+
+    # Appliquer les schémas déclarés depuis la dernière connexion
+    if _local.applied < len(_schemas):
+        for sql in _schemas[_local.applied:]:
+            conn.executescript(sql)
+        _local.applied = len(_schemas)
+    return conn
+
+
+@contextmanager
+def transaction() -> Iterator[sqlite3.Connection]:
+    """Connexion dans une transaction validée à la sortie, annulée sur erreur."""
+    conn = get_connection()
+    with conn:
+        yield conn
+
+
+def close():
+    """Ferme la connexion du thread courant."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
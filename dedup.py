@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Détection des redites d'une édition à l'autre (empreintes MinHash + LSH).
+
+Chaque paragraphe ou puce d'un rapport reçoit une empreinte MinHash de ses
+mots (liens de citation et URL exclus). L'empreinte est découpée en bandes ;
+une table SQLite indexée par valeur de bande donne, pour un paragraphe, les
+seuls candidats qui partagent au moins une bande avec lui, sans parcourir
+tous les paragraphes stockés. Les candidats sont ensuite confirmés par la
+similarité de Jaccard estimée (DEDUP_THRESHOLD). Seuls les
+DEDUP_MAX_BUCKET_ROWS paragraphes les plus récents de chaque bande sont lus
+(formules répétées, listes de sources), et seuls les DEDUP_MAX_CANDIDATES qui
+partagent le plus de bandes sont comparés : le coût d'une analyse ne croît
+pas avec la taille de l'index.
+
+Un paragraphe est une redite s'il ressemble à un paragraphe d'une autre
+recherche des DEDUP_WINDOW_DAYS jours précédents. Le score de nouveauté
+d'une recherche est la part de ses paragraphes qui ne sont pas des redites.
+
+`rebuild` est incrémental : seules les recherches du catalogue absentes de
+l'index sont analysées (les suppressions passent par `remove`).
+
+Usage : python dedup.py rebuild
+"""
+
+import hashlib
+import os
+import random
+import re
+import sys
+import unicodedata
+from array import array
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+import catalog
+import db
+import storage
+from search_index import strip_header
+
+# Configuration
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.6"))
+DEDUP_WINDOW_DAYS = float(os.getenv("DEDUP_WINDOW_DAYS", "90"))
+# Les paragraphes plus courts (titres, transitions) ne sont pas comparés
+DEDUP_MIN_WORDS = int(os.getenv("DEDUP_MIN_WORDS", "8"))
+# Bornes de la recherche de candidats (par paragraphe analysé)
+DEDUP_MAX_BUCKET_ROWS = int(os.getenv("DEDUP_MAX_BUCKET_ROWS", "100"))
+DEDUP_MAX_CANDIDATES = int(os.getenv("DEDUP_MAX_CANDIDATES", "10"))
+
+# Empreinte : BANDS bandes de ROWS valeurs. Un candidat est trouvé avec une
+# probabilité 1 - (1 - J^ROWS)^BANDS (≈ 95 % à J = 0.6, ≈ 1 % à J = 0.1).
+# Changer ces valeurs impose de reconstruire l'index.
+BANDS = 12
+ROWS = 3
+PERMUTATIONS = BANDS * ROWS
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20251007)
+_COEFFICIENTS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(PERMUTATIONS)]
+
+EXCERPT_CHARS = 160
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dedup_paragraphs (
+    paragraph_id INTEGER PRIMARY KEY,
+    research_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    signature BLOB NOT NULL,
+    excerpt TEXT NOT NULL,
+    duplicate_of TEXT,
+    duplicate_position INTEGER,
+    similarity REAL,
+    stripped INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_dedup_paragraphs_research ON dedup_paragraphs (research_id, position);
+CREATE TABLE IF NOT EXISTS dedup_bands (
+    bucket INTEGER NOT NULL,
+    paragraph_id INTEGER NOT NULL,
+    PRIMARY KEY (bucket, paragraph_id)
+) WITHOUT ROWID;
+"""
+db.register_schema(SCHEMA)
+
+_BULLET = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+")
+_CITATION = re.compile(r"\(\[[^\]]*\]\([^)]*\)\)|\]\([^)]*\)|https?://\S+")
+_WORD = re.compile(r"\w+")
+
+
+def split_items(text: str) -> List[dict]:
+    """
+    Paragraphes et puces de `text`, avec leurs lignes (début, fin exclue).
+
+    Chaque puce (tiret, astérisque, numéro) est un élément ; les lignes
+    consécutives hors puces forment un paragraphe.
+    """
+    items, start = [], None
+    lines = text.split("\n")
+
+    def close(end):
+        if start is not None:
+            items.append({"start": start, "end": end, "text": "\n".join(lines[start:end])})
+
+    for number, line in enumerate(lines):
+        if not line.strip():
+            close(number)
+            start = None
+        elif _BULLET.match(line):
+            close(number)
+            start = number
+        elif start is None:
+            start = number
+    close(len(lines))
+    return items
+
+
+def words(text: str) -> List[str]:
+    """Mots normalisés (minuscules, sans accents), liens de citation exclus."""
+    text = unicodedata.normalize("NFKD", _CITATION.sub(" ", text).lower())
+    return _WORD.findall("".join(c for c in text if not unicodedata.combining(c)))
+
+
+def signature(tokens: List[str]) -> List[int]:
+    """Empreinte MinHash (PERMUTATIONS valeurs de 32 bits) de l'ensemble des mots."""
+    hashes = [
+        int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+        for token in set(tokens)
+    ]
+    return [min((a * h + b) % _PRIME for h in hashes) & 0xFFFFFFFF for a, b in _COEFFICIENTS]
+
+
+def buckets(sig: List[int]) -> List[int]:
+    """Clés de bande (entiers signés 64 bits, numéro de bande inclus)."""
+    keys = []
+    for band in range(BANDS):
+        values = array("I", [band, *sig[band * ROWS:(band + 1) * ROWS]]).tobytes()
+        keys.append(int.from_bytes(hashlib.blake2b(values, digest_size=8).digest(), "big", signed=True))
+    return keys
+
+
+def similarity(a: List[int], b: List[int]) -> float:
+    """Similarité de Jaccard estimée entre deux empreintes."""
+    return sum(x == y for x, y in zip(a, b)) / PERMUTATIONS
+
+
+def _cutoff(created_at: str) -> Optional[str]:
+    if DEDUP_WINDOW_DAYS <= 0:
+        return None
+    moment = datetime.fromisoformat(created_at.rstrip("Z"))
+    return (moment - timedelta(days=DEDUP_WINDOW_DAYS)).isoformat() + "Z"
+
+
+def _candidates(keys: List[int], research_id: str, created_at: str) -> List:
+    """
+    Paragraphes d'autres recherches de la fenêtre partageant une clé de bande,
+    les DEDUP_MAX_CANDIDATES partageant le plus de bandes d'abord.
+
+    Chaque bande fournit au plus ses DEDUP_MAX_BUCKET_ROWS paragraphes les
+    plus récents ; les bandes communes sont comptées sur l'index seul.
+    """
+    since = _cutoff(created_at)
+    window = "AND p.created_at >= ? " if since else ""
+    bands = " UNION ALL ".join(
+        "SELECT * FROM (SELECT paragraph_id FROM dedup_bands WHERE bucket = ? "
+        "ORDER BY paragraph_id DESC LIMIT ?)" for _ in keys
+    )
+    params = [value for key in keys for value in (key, DEDUP_MAX_BUCKET_ROWS)]
+    return db.get_connection().execute(
+        f"SELECT p.paragraph_id, p.research_id, p.position, p.signature, p.excerpt "
+        f"FROM (SELECT paragraph_id, COUNT(*) AS hits FROM ({bands}) GROUP BY paragraph_id) c "
+        f"JOIN dedup_paragraphs p ON p.paragraph_id = c.paragraph_id "
+        f"WHERE p.research_id != ? AND p.created_at < ? {window}"
+        f"ORDER BY c.hits DESC, c.paragraph_id LIMIT ?",
+        [*params, research_id, created_at] + ([since] if since else []) + [DEDUP_MAX_CANDIDATES]
+    ).fetchall()
+
+
+def analyze(text: str, research_id: str, created_at: Optional[str] = None) -> dict:
+    """
+    Repère les paragraphes de `text` déjà présents dans les recherches
+    précédant `created_at` (par défaut : maintenant) dans la fenêtre.
+
+    Pour chaque paragraphe, la comparaison s'arrête au premier candidat qui
+    atteint DEDUP_THRESHOLD. Le résultat sert à `strip`, `summary` et `index`.
+    """
+    created_at = created_at or datetime.utcnow().isoformat() + "Z"
+    items = []
+    for item in split_items(text):
+        tokens = words(item["text"])
+        if len(tokens) < DEDUP_MIN_WORDS:
+            continue
+        sig = signature(tokens)
+        items.append({
+            **item,
+            "position": len(items),
+            "signature": sig,
+            "buckets": buckets(sig),
+            "excerpt": " ".join(item["text"].split())[:EXCERPT_CHARS],
+            "duplicate_of": None,
+        })
+
+    for item in items:
+        for row in _candidates(item["buckets"], research_id, created_at):
+            score = similarity(item["signature"], array("I", row["signature"]).tolist())
+            if score >= DEDUP_THRESHOLD:
+                item["duplicate_of"] = {
+                    "research_id": row["research_id"],
+                    "position": row["position"],
+                    "similarity": round(score, 3),
+                    "excerpt": row["excerpt"],
+                }
+                break
+
+    return {"research_id": research_id, "created_at": created_at, "items": items}
+
+
+def strip(text: str, analysis: dict) -> str:
+    """Retire de `text` les paragraphes repérés comme redites par `analyze`."""
+    removed = set()
+    for item in analysis["items"]:
+        if item["duplicate_of"] is not None:
+            removed.update(range(item["start"], item["end"]))
+    if not removed:
+        return text
+    kept = []
+    for number, line in enumerate(text.split("\n")):
+        if number in removed or (not line.strip() and (not kept or not kept[-1].strip())):
+            continue
+        kept.append(line)
+    return "\n".join(kept)
+
+
+def summary(analysis: dict, stripped: bool = False) -> dict:
+    """Score de nouveauté d'une analyse (stocké dans les métadonnées)."""
+    total = len(analysis["items"])
+    duplicates = sum(1 for item in analysis["items"] if item["duplicate_of"] is not None)
+    return {
+        "score": round(1 - duplicates / total, 3) if total else 1.0,
+        "paragraphs": total,
+        "duplicates": duplicates,
+        "stripped": stripped,
+    }
+
+
+def _delete(conn, research_id: str):
+    rows = conn.execute(
+        "SELECT paragraph_id, signature FROM dedup_paragraphs WHERE research_id = ?",
+        (research_id,)
+    ).fetchall()
+    conn.executemany(
+        "DELETE FROM dedup_bands WHERE bucket = ? AND paragraph_id = ?",
+        [
+            (key, row["paragraph_id"])
+            for row in rows
+            for key in buckets(array("I", row["signature"]).tolist())
+        ]
+    )
+    conn.execute("DELETE FROM dedup_paragraphs WHERE research_id = ?", (research_id,))
+
+
+def index(research_id: str, analysis: dict, stripped: bool = False) -> int:
+    """
+    (Ré)indexe les paragraphes d'une recherche analysée ; retourne leur nombre.
+
+    Les redites (retirées du rapport avec `stripped` ou non) sont conservées
+    pour le rapport de nouveauté mais pas indexées : l'original l'est déjà,
+    et les bandes d'un passage repris d'édition en édition restent courtes.
+    """
+    with db.transaction() as conn:
+        _delete(conn, research_id)
+        for item in analysis["items"]:
+            duplicate = item["duplicate_of"] or {}
+            removed = stripped and item["duplicate_of"] is not None
+            paragraph_id = conn.execute(
+                "INSERT INTO dedup_paragraphs (research_id, position, created_at, signature, excerpt, "
+                "duplicate_of, duplicate_position, similarity, stripped) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (research_id, item["position"], analysis["created_at"], array("I", item["signature"]).tobytes(),
+                 item["excerpt"], duplicate.get("research_id"), duplicate.get("position"),
+                 duplicate.get("similarity"), int(removed))
+            ).lastrowid
+            if item["duplicate_of"] is None:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO dedup_bands (bucket, paragraph_id) VALUES (?, ?)",
+                    [(key, paragraph_id) for key in item["buckets"]]
+                )
+    return len(analysis["items"])
+
+
+def deduplicate(text: str, research_id: str, created_at: str, strip_duplicates: bool = False) -> Tuple[str, dict]:
+    """
+    Analyse et indexe une nouvelle recherche ; retourne son texte (redites
+    retirées si `strip_duplicates`) et son analyse.
+    """
+    analysis = analyze(text, research_id, created_at)
+    if strip_duplicates:
+        text = strip(text, analysis)
+    index(research_id, analysis, stripped=strip_duplicates)
+    return text, analysis
+
+
+def remove(research_id: str):
+    with db.transaction() as conn:
+        _delete(conn, research_id)
+
+
+def report(research_id: str) -> Optional[dict]:
+    """Score de nouveauté et redites d'une recherche (None si aucun de ses paragraphes n'est indexé)."""
+    rows = db.get_connection().execute(
+        "SELECT position, excerpt, duplicate_of, duplicate_position, similarity, stripped "
+        "FROM dedup_paragraphs WHERE research_id = ? ORDER BY position",
+        (research_id,)
+    ).fetchall()
+    if not rows:
+        return None
+    duplicates = [row for row in rows if row["duplicate_of"] is not None]
+    return {
+        "research_id": research_id,
+        "score": round(1 - len(duplicates) / len(rows), 3),
+        "paragraphs": len(rows),
+        "duplicates": len(duplicates),
+        "stripped": sum(row["stripped"] for row in duplicates),
+        "repeated": [
+            {
+                "position": row["position"],
+                "excerpt": row["excerpt"],
+                "stripped": bool(row["stripped"]),
+                "duplicate_of": {
+                    "research_id": row["duplicate_of"],
+                    "position": row["duplicate_position"],
+                    "similarity": row["similarity"],
+                },
+            }
+            for row in duplicates
+        ],
+    }
+
+
+def is_empty() -> bool:
+    return db.get_connection().execute("SELECT 1 FROM dedup_paragraphs LIMIT 1").fetchone() is None
+
+
+def rebuild() -> Tuple[int, int]:
+    """
+    Complète l'index : analyse les recherches du catalogue qui n'y sont pas
+    encore, de la plus ancienne à la plus récente (chacune comparée à celles
+    qui la précèdent) ; retourne (recherches, paragraphes) ajoutés.
+    """
+    indexed = {
+        row[0] for row in db.get_connection().execute("SELECT DISTINCT research_id FROM dedup_paragraphs")
+    }
+    researches = paragraphs = 0
+    for research_id, created_at in catalog.ids_by_age():
+        if research_id in indexed or not created_at:
+            continue
+        text = storage.read_output(research_id)
+        if text is None:
+            continue
+        paragraphs += index(research_id, analyze(strip_header(text), research_id, created_at))
+        researches += 1
+    return researches, paragraphs
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        print("Usage : python dedup.py rebuild", file=sys.stderr)
+        sys.exit(1)
+    researches, paragraphs = rebuild()
+    print(f"[OK] Index des redites complété : {paragraphs} paragraphes pour {researches} recherches dans '{db.DB_PATH}'")
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Export en masse des recherches stockées, au format NDJSON ou CSV.
+
+Les recherches sont parcourues page par page dans le catalogue (pagination
+par curseur) et chaque enregistrement est produit puis oublié : la mémoire
+reste constante quel que soit le nombre de recherches exportées. La
+projection (`fields`) évite de lire les artefacts inutiles, en particulier
+la réponse brute (`output_raw`), qui n'est chargée que si elle est demandée.
+
+Utilisé par GET /export et par `python main.py --export`.
+"""
+
+import csv
+import io
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+
+import catalog
+import storage
+
+FORMATS = ("ndjson", "csv")
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+# Champs calculés à partir des autres artefacts que les métadonnées
+OUTPUT_FIELD = "output_text"
+RAW_FIELD = "output_raw"
+
+# Colonnes par défaut (le CSV a besoin d'une liste fixe ; le NDJSON, sans
+# projection, exporte toutes les métadonnées et le rapport)
+DEFAULT_CSV_FIELDS = ["research_id", "created_at", "subject", "model", "status", "response_id", OUTPUT_FIELD]
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Liste de champs séparés par des virgules (None = champs par défaut)."""
+    parsed = [f.strip() for f in (fields or "").split(",") if f.strip()]
+    return list(dict.fromkeys(parsed)) or None
+
+
+def iter_records(
+    fields: Optional[List[str]] = None,
+    page_size: int = catalog.MAX_PAGE_SIZE,
+    **filters
+) -> Iterator[dict]:
+    """
+    Recherches correspondant aux filtres (`subject`, `model`, `since`,
+    `until`), de la plus récente à la plus ancienne.
+
+    Sans projection, chaque enregistrement contient les métadonnées et le
+    texte du rapport, sans la réponse brute. Les recherches du catalogue
+    dont les fichiers ont disparu sont ignorées.
+    """
+    cursor = None
+    while True:
+        entries, cursor = catalog.list_entries(limit=page_size, cursor=cursor, **filters)
+        for entry in entries:
+            record = _load_record(entry["research_id"], fields)
+            if record is not None:
+                yield record
+        if cursor is None:
+            return
+
+
+def _load_record(research_id: str, fields: Optional[List[str]]) -> Optional[dict]:
+    metadata = storage.read_metadata(research_id, include_raw=bool(fields and RAW_FIELD in fields))
+    if metadata is None:
+        return None
+    if fields is None or OUTPUT_FIELD in fields:
+        metadata[OUTPUT_FIELD] = storage.read_output(research_id)
+    if fields is None:
+        return metadata
+    return {field: metadata.get(field) for field in fields}
+
+
+def iter_ndjson(records: Iterable[dict]) -> Iterator[bytes]:
+    """Une ligne JSON par recherche."""
+    for record in records:
+        yield (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    return value
+
+
+def iter_csv(records: Iterable[dict], fields: List[str]) -> Iterator[bytes]:
+    """En-tête puis une ligne par recherche ; les valeurs structurées sont encodées en JSON."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for record in records:
+        writer.writerow([_csv_value(record.get(field)) for field in fields])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _encode(records: Iterable[dict], format: str, fields: Optional[List[str]]) -> Iterator[bytes]:
+    if format not in FORMATS:
+        raise ValueError(f"Format d'export inconnu : {format} (attendu : {', '.join(FORMATS)})")
+    if format == "csv":
+        return iter_csv(records, fields or DEFAULT_CSV_FIELDS)
+    return iter_ndjson(records)
+
+
+def stream(format: str = "ndjson", fields: Optional[List[str]] = None, **filters) -> Iterator[bytes]:
+    """Flux d'octets de l'export complet dans le format demandé."""
+    if format == "csv":
+        fields = fields or DEFAULT_CSV_FIELDS
+    return _encode(iter_records(fields, **filters), format, fields)
+
+
+def write(path: Path, format: str = "ndjson", fields: Optional[List[str]] = None, **filters) -> int:
+    """
+    Écrit l'export dans `path` (même contenu que GET /export) au fil de l'eau.
+
+    Le fichier n'apparaît qu'une fois complet (fichier temporaire puis
+    os.replace). Retourne le nombre de recherches exportées.
+    """
+    if format == "csv":
+        fields = fields or DEFAULT_CSV_FIELDS
+    count = 0
+
+    def counted(records):
+        nonlocal count
+        for record in records:
+            count += 1
+            yield record
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in _encode(counted(iter_records(fields, **filters)), format, fields):
+                f.write(chunk)
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        raise
+    return count
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Recherche en éventail (fan-out) pour les sujets larges.
+
+Un appel de planification peu coûteux découpe le sujet en sous-thèmes
+indépendants, chaque sous-thème fait l'objet d'une recherche web complète
+exécutée en parallèle, puis les rapports sont assemblés en un seul document
+avec une liste de sources dédupliquée. La durée totale est celle de la
+branche la plus lente au lieu de la somme des recherches.
+
+Le résultat a la même forme qu'une recherche classique : texte du rapport
+et réponse « brute » regroupant les éléments de sortie de toutes les
+branches (recherches web, citations), pour l'indexation des sources.
+"""
+
+import asyncio
+import json
+import os
+import re
+import time
+from typing import Callable, List, Optional, Tuple
+
+import metrics
+from openai_client import create_response, extract_output_text, stream_response
+from sources import normalize_url
+
+# Configuration
+FANOUT_MAX_WIDTH = int(os.getenv("FANOUT_MAX_WIDTH", "6"))
+FANOUT_PLANNER_MODEL = os.getenv("FANOUT_PLANNER_MODEL", "gpt-5-mini")
+FANOUT_PLANNER_EFFORT = os.getenv("FANOUT_PLANNER_EFFORT", "minimal")
+
+PLANNER_INSTRUCTION = (
+    "Tu prépares une veille technologique. Découpe le sujet fourni en au plus {width} sous-thèmes "
+    "indépendants, qui ne se recouvrent pas et couvrent ensemble tout le sujet. Chaque sous-thème "
+    "est une phrase courte, assez précise pour guider une recherche web à elle seule."
+)
+
+BRANCH_INSTRUCTION = (
+    "Tu es un assistant de veille technologique expert. Tu traites un seul volet d'un sujet plus "
+    "large, les autres volets étant couverts séparément : fais une recherche approfondie avec "
+    "l'outil Web Search sur ce volet uniquement, en privilégiant les avancées les plus récentes.\n\n"
+    "Le message utilisateur est au format JSON : 'Subject' est le sujet global, 'Focus' le volet à "
+    "traiter. Si 'PreviousResponses' contient quelque chose, évite de répéter ces informations.\n"
+    "Commence directement par le contenu, sans titre général ni conclusion sur le sujet global."
+)
+
+PLAN_SCHEMA = {
+    "type": "json_schema",
+    "name": "plan_veille",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "subtopics": {"type": "array", "items": {"type": "string"}}
+        },
+        "required": ["subtopics"],
+        "additionalProperties": False
+    }
+}
+
+
+async def plan_subtopics(
+    subject: str, width: int, model: str = FANOUT_PLANNER_MODEL
+) -> Tuple[List[str], Optional[str], Optional[dict]]:
+    """
+    Découpe `subject` en au plus `width` sous-thèmes.
+
+    Retourne (sous-thèmes, identifiant de la réponse, bloc `usage` de la
+    réponse). Un plan illisible ou
+    d'un seul sous-thème donne [subject] : la recherche n'est pas découpée.
+    """
+    response = await create_response(
+        model=model,
+        input=[
+            {"role": "developer", "content": [
+                {"type": "input_text", "text": PLANNER_INSTRUCTION.format(width=width)}
+            ]},
+            {"role": "user", "content": [{"type": "input_text", "text": subject}]}
+        ],
+        text={"format": PLAN_SCHEMA},
+        reasoning={"effort": FANOUT_PLANNER_EFFORT},
+        store=False
+    )
+    try:
+        planned = json.loads(extract_output_text(response))["subtopics"]
+    except (ValueError, KeyError, TypeError):
+        planned = []
+
+    subtopics, seen = [], set()
+    for subtopic in planned:
+        if isinstance(subtopic, str) and subtopic.strip() and subtopic.strip().lower() not in seen:
+            seen.add(subtopic.strip().lower())
+            subtopics.append(subtopic.strip())
+    usage = getattr(response, "usage", None)
+    if usage is not None and not isinstance(usage, dict):
+        usage = usage.model_dump()
+    return (subtopics[:width] if len(subtopics) > 1 else [subject]), getattr(response, "id", None), usage
+
+
+async def research_branch(
+    subject: str,
+    subtopic: str,
+    previous_context: list,
+    request_options: dict,
+    on_event: Optional[Callable] = None
+) -> dict:
+    """Recherche web complète sur un sous-thème ; retourne le texte, la réponse brute et la durée."""
+    branch_json = {"Subject": subject, "Focus": subtopic, "PreviousResponses": previous_context}
+    started = time.perf_counter()
+    response = await stream_response(
+        on_event=on_event,
+        input=[
+            {"role": "developer", "content": [{"type": "input_text", "text": BRANCH_INSTRUCTION}]},
+            {"role": "user", "content": [
+                {"type": "input_text", "text": json.dumps(branch_json, ensure_ascii=False)}
+            ]}
+        ],
+        **request_options
+    )
+    duration = time.perf_counter() - started
+    metrics.research_stage_seconds.observe(duration, stage="fanout_branch")
+    return {
+        "subtopic": subtopic,
+        "output_text": extract_output_text(response),
+        "raw": response.model_dump(),
+        "duration_s": duration
+    }
+
+
+def _sum_usage(usages: List[Optional[dict]]) -> dict:
+    """Additionne les blocs `usage` (y compris les détails imbriqués)."""
+    total = {}
+    for usage in usages:
+        for key, value in (usage or {}).items():
+            if isinstance(value, dict):
+                details = total.setdefault(key, {})
+                for sub_key, sub_value in value.items():
+                    if isinstance(sub_value, (int, float)):
+                        details[sub_key] = details.get(sub_key, 0) + sub_value
+            elif isinstance(value, (int, float)):
+                total[key] = total.get(key, 0) + value
+    return total
+
+
+def _demote_headings(text: str) -> str:
+    """Descend les titres markdown d'un niveau (la branche devient une section du rapport)."""
+    return re.sub(r"^(#{1,5})(?=\s)", r"#\1", text, flags=re.MULTILINE)
+
+
+def merge_branches(subject: str, branches: List[dict]) -> Tuple[str, List[dict]]:
+    """
+    Assemble les rapports des branches en un seul rapport.
+
+    Chaque branche devient une section ; les citations de toutes les branches
+    sont dédupliquées (URL normalisée) dans une section finale « Sources ».
+    """
+    sections, citations, seen = [], [], set()
+    for branch in branches:
+        sections.append(f"## {branch['subtopic']}\n\n{_demote_headings(branch['output_text'].strip())}\n")
+        for item in branch["raw"].get("output") or []:
+            for content in item.get("content") or []:
+                for annotation in content.get("annotations") or []:
+                    if annotation.get("type") != "url_citation" or not annotation.get("url"):
+                        continue
+                    url = normalize_url(annotation["url"])
+                    if url not in seen:
+                        seen.add(url)
+                        citations.append({"url": url, "title": annotation.get("title")})
+
+    report = f"# {subject}\n\n" + "\n".join(sections)
+    if citations:
+        report += "\n## Sources\n\n" + "\n".join(
+            f"- [{c['title'] or c['url']}]({c['url']})" for c in citations
+        ) + "\n"
+    return report, citations
+
+
+async def run_fanout(
+    subject: str,
+    previous_context: list,
+    width: int,
+    request_options: dict,
+    on_event: Optional[Callable[[str, dict], None]] = None,
+    relay: Optional[Callable] = None
+) -> Tuple[str, dict, dict]:
+    """
+    Exécute une recherche en éventail.
+
+    `request_options` sont les paramètres de chaque recherche de branche
+    (modèle, outils, raisonnement...). `on_event` reçoit les événements
+    `plan` et `branch` ; `relay` reçoit les événements de streaming bruts
+    de toutes les branches (les deltas de texte n'y sont pas relayés, les
+    branches étant entrelacées).
+
+    Retourne (rapport, réponse brute fusionnée, rapport d'exécution).
+    Une branche en échec est écartée ; si toutes échouent, la première
+    erreur est levée.
+    """
+    width = max(1, min(width, FANOUT_MAX_WIDTH))
+    started = time.perf_counter()
+
+    with metrics.research_stage_seconds.time(stage="fanout_plan"):
+        subtopics, plan_response_id, plan_usage = await plan_subtopics(subject, width)
+    plan_s = time.perf_counter() - started
+    if on_event:
+        on_event("plan", {"subtopics": subtopics})
+
+    def branch_relay(event):
+        if relay is not None and event.type != "response.output_text.delta":
+            relay(event)
+
+    async def run_branch(index: int, subtopic: str) -> dict:
+        if on_event:
+            on_event("branch", {"index": index, "subtopic": subtopic, "status": "running"})
+        try:
+            branch = await research_branch(subject, subtopic, previous_context, request_options, branch_relay)
+        except Exception as e:
+            if on_event:
+                on_event("branch", {"index": index, "subtopic": subtopic, "status": "failed", "error": str(e)})
+            raise
+        if on_event:
+            on_event("branch", {
+                "index": index, "subtopic": subtopic, "status": "completed",
+                "duration_s": round(branch["duration_s"], 3)
+            })
+        return branch
+
+    outcomes = await asyncio.gather(
+        *(run_branch(i, subtopic) for i, subtopic in enumerate(subtopics)),
+        return_exceptions=True
+    )
+    for outcome in outcomes:
+        if isinstance(outcome, asyncio.CancelledError):
+            raise outcome
+    branches = [o for o in outcomes if not isinstance(o, BaseException)]
+    if not branches:
+        raise outcomes[0]
+
+    merge_started = time.perf_counter()
+    report, citations = merge_branches(subject, branches)
+    raw = {
+        "object": "fanout",
+        "id": None,
+        "model": request_options.get("model"),
+        "output": [item for b in branches for item in b["raw"].get("output") or []],
+        # Le plan est facturé comme les branches
+        "usage": _sum_usage([plan_usage] + [b["raw"].get("usage") for b in branches])
+    }
+    merge_s = time.perf_counter() - merge_started
+
+    execution = {
+        "width": len(subtopics),
+        "planner_model": FANOUT_PLANNER_MODEL,
+        "plan_response_id": plan_response_id,
+        "plan_usage": plan_usage,
+        "plan_s": round(plan_s, 3),
+        "merge_s": round(merge_s, 3),
+        "wall_s": round(time.perf_counter() - started, 3),
+        "citations": len(citations),
+        "branches": [],
+    }
+    for subtopic, outcome in zip(subtopics, outcomes):
+        if isinstance(outcome, BaseException):
+            execution["branches"].append({"subtopic": subtopic, "status": "failed", "error": str(outcome)})
+        else:
+            execution["branches"].append({
+                "subtopic": subtopic,
+                "status": "completed",
+                "response_id": outcome["raw"].get("id"),
+                "duration_s": round(outcome["duration_s"], 3),
+                "web_search_calls": sum(
+                    1 for item in outcome["raw"].get("output") or [] if item.get("type") == "web_search_call"
+                ),
+                "usage": outcome["raw"].get("usage"),
+            })
+    execution["sequential_s"] = round(sum(b.get("duration_s", 0) for b in execution["branches"]), 3)
+    return report, raw, execution
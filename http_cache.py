@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Cache HTTP et compression des réponses de lecture.
+
+- ETag fort et Last-Modified dérivés des artefacts stockés (taille et date de
+  modification), `If-None-Match` / `If-Modified-Since` → 304 sans relire ni
+  resérialiser les fichiers
+- En-têtes Cache-Control
+- Compression négociée : brotli si le module `brotli` est installé, sinon gzip ;
+  l'ETag d'une réponse compressée porte le codage (`"…-gzip"`), chaque
+  représentation ayant son propre validateur fort
+- Requêtes Range pour les téléchargements texte : gérées par FileResponse
+  pour un fichier, ici (une seule plage) pour un contenu en mémoire
+"""
+
+import hashlib
+import os
+import zlib
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Callable, Iterable, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Configuration
+RESULTS_MAX_AGE = int(os.getenv("RESULTS_CACHE_MAX_AGE", "300"))
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Contenus jamais compressés (flux en direct, déjà compressés)
+UNCOMPRESSED_TYPES = ("text/event-stream", "application/gzip", "image/", "audio/", "video/")
+
+
+def make_etag(*parts) -> str:
+    """ETag fort (entre guillemets) calculé à partir de `parts`."""
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def file_validators(paths: Iterable[Path], *variant) -> Optional[Tuple[str, float]]:
+    """
+    (ETag, date de dernière modification) d'un ensemble de fichiers.
+
+    `variant` distingue les représentations d'une même ressource (format,
+    include...). Retourne None si un fichier manque.
+    """
+    parts = list(variant)
+    last_modified = 0.0
+    for path in paths:
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        parts.append(f"{path.name}:{stat.st_mtime_ns}:{stat.st_size}")
+        last_modified = max(last_modified, stat.st_mtime)
+    return make_etag(*parts), last_modified
+
+
+def cache_headers(etag: str, last_modified: Optional[float] = None, cache_control: str = "no-cache") -> dict:
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified:
+        headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+    return headers
+
+
+# Codages de contenu ajoutés à l'ETag par CompressionMiddleware
+CODINGS = ("br", "gzip")
+
+
+def _without_coding(etag: str) -> str:
+    """ETag de la représentation non compressée (`"x-gzip"` → `"x"`)."""
+    for coding in CODINGS:
+        suffix = f'-{coding}"'
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+
+def _with_coding(etag: bytes, coding: str) -> bytes:
+    """ETag d'une représentation compressée (`"x"` → `"x-gzip"`)."""
+    if not etag.endswith(b'"'):
+        return etag
+    return etag[:-1] + f"-{coding}\"".encode("latin-1")
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # Comparaison faible pour If-None-Match (RFC 9110, 13.1.2), quel que soit le codage
+    candidates = {_without_coding(tag.strip().removeprefix("W/")) for tag in header.split(",")}
+    return etag in candidates
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[float] = None) -> bool:
+    """Vrai si la copie du client est à jour (If-None-Match prioritaire sur If-Modified-Since)."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def not_modified_response(headers: dict) -> Response:
+    return Response(status_code=304, headers=headers)
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Plage (début, fin incluse) d'un en-tête `Range: bytes=...`.
+
+    Retourne None si l'en-tête est ignoré (syntaxe inconnue, plusieurs plages)
+    et lève ValueError si la plage est hors du fichier.
+    """
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+    start, _, end = ranges.strip().partition("-")
+    try:
+        if not start:
+            length = int(end)
+            first, last = max(0, size - length), size - 1
+        else:
+            first = int(start)
+            last = min(int(end), size - 1) if end else size - 1
+    except ValueError:
+        return None
+    # Un suffixe nul (bytes=-0) ou un fichier vide ne contiennent aucun octet
+    if first >= size or first > last or (not start and length <= 0):
+        raise ValueError("Plage hors du fichier")
+    return first, last
+
+
+def _range_response(
+    request: Request,
+    headers: dict,
+    size: int,
+    read: Callable[[int, int], bytes],
+    media_type: str,
+    filename: str
+) -> Optional[Response]:
+    """Réponse 206/416 si la requête demande une plage applicable, sinon None."""
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if not range_header or (if_range is not None and if_range not in (headers["ETag"], headers.get("Last-Modified"))):
+        return None
+    try:
+        byte_range = _parse_range(range_header, size)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    if byte_range is None:
+        return None
+    first, last = byte_range
+    headers = dict(headers)
+    headers["Content-Range"] = f"bytes {first}-{last}/{size}"
+    headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return Response(content=read(first, last - first + 1), status_code=206, media_type=media_type, headers=headers)
+
+
+def file_response(
+    request: Request,
+    path: Path,
+    media_type: str,
+    filename: str,
+    cache_control: str = f"public, max-age={RESULTS_MAX_AGE}"
+) -> Response:
+    """
+    Sert un fichier avec validation conditionnelle ; Range et If-Range sont
+    gérés par FileResponse, avec l'ETag calculé ici.
+    """
+    etag, last_modified = file_validators([path])
+    headers = cache_headers(etag, last_modified, cache_control)
+    headers["Accept-Ranges"] = "bytes"
+    if is_not_modified(request, etag, last_modified):
+        return not_modified_response(headers)
+    return FileResponse(path=path, media_type=media_type, filename=filename, headers=headers)
+
+
+def bytes_response(
+    request: Request,
+    body: bytes,
+    etag: str,
+    last_modified: Optional[float],
+    media_type: str,
+    filename: str,
+    cache_control: str = f"public, max-age={RESULTS_MAX_AGE}"
+) -> Response:
+    """Comme `file_response`, pour un contenu déjà en mémoire (artefact lu dans un segment)."""
+    headers = cache_headers(etag, last_modified, cache_control)
+    headers["Accept-Ranges"] = "bytes"
+    if is_not_modified(request, etag, last_modified):
+        return not_modified_response(headers)
+
+    partial = _range_response(
+        request, headers, len(body), lambda first, length: body[first:first + length], media_type, filename
+    )
+    if partial is not None:
+        return partial
+    headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+def _choose_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip()] = quality
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+class CompressionMiddleware:
+    """
+    Middleware ASGI de compression brotli/gzip selon Accept-Encoding.
+
+    Les petites réponses, les flux SSE, les réponses partielles (206) et
+    celles déjà encodées sont transmises telles quelles. L'ETag d'une réponse
+    compressée reçoit le suffixe du codage ; un 304 reprend ce suffixe si
+    c'est la version compressée que le client a validée.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ""
+        if_none_match = b""
+        for name, value in scope.get("headers", []):
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+            elif name == b"if-none-match":
+                if_none_match = value
+        encoding = _choose_encoding(accept_encoding)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+        compressor = None
+
+        def compress(data: bytes, final: bool) -> bytes:
+            nonlocal compressor
+            if compressor is None:
+                compressor = (
+                    brotli.Compressor(quality=BROTLI_QUALITY) if encoding == "br"
+                    else zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+                )
+            if encoding == "br":
+                out = compressor.process(data)
+                return out + (compressor.finish() if final else compressor.flush())
+            out = compressor.compress(data)
+            return out + compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+        def coded_etag(headers: list) -> list:
+            return [(k, _with_coding(v, encoding) if k.lower() == b"etag" else v) for k, v in headers]
+
+        async def send_compressed(message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                headers = {k.lower(): v for k, v in message.get("headers", [])}
+                etag = headers.get(b"etag")
+                if message["status"] == 304 and etag and _with_coding(etag, encoding) in if_none_match:
+                    message = {**message, "headers": coded_etag(message.get("headers", []))}
+                content_type = headers.get(b"content-type", b"").decode("latin-1")
+                passthrough = (
+                    b"content-encoding" in headers
+                    or message["status"] in (204, 206, 304)
+                    or any(content_type.startswith(t) for t in UNCOMPRESSED_TYPES)
+                )
+                if passthrough:
+                    await send(message)
+                else:
+                    start_message = message
+                return
+
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] != "http.response.body":
+                # Envoi direct d'un fichier (pathsend) : pas de compression
+                if start_message is not None:
+                    await send(start_message)
+                    start_message = None
+                passthrough = True
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start_message is not None:
+                headers = [(k, v) for k, v in start_message.get("headers", [])
+                           if k.lower() not in (b"content-length", b"vary")]
+                headers.append((b"vary", b"Accept-Encoding"))
+                if not more_body and len(body) < self.minimum_size:
+                    # Trop petit pour gagner quelque chose : envoyer tel quel
+                    headers.append((b"content-length", str(len(body)).encode("latin-1")))
+                    await send({**start_message, "headers": headers})
+                    start_message = None
+                    passthrough = True
+                    await send(message)
+                    return
+                body = compress(body, final=not more_body)
+                headers = coded_etag(headers)
+                headers.append((b"content-encoding", encoding.encode("latin-1")))
+                if not more_body:
+                    headers.append((b"content-length", str(len(body)).encode("latin-1")))
+                await send({**start_message, "headers": headers})
+                start_message = None
+            else:
+                body = compress(body, final=not more_body)
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,644 @@
+#!/usr/bin/env python3
+"""
+File d'attente des recherches avec un pool de workers borné.
+
+POST /research dépose un job dans la file et rend la main immédiatement ;
+les workers exécutent les recherches en arrière-plan sans bloquer la boucle
+d'événements d'uvicorn.
+
+Chaque job a une échéance (comptée depuis sa soumission) : passé ce délai,
+l'appel en cours est interrompu et le job passe en `timed_out`. Un job peut
+aussi être annulé explicitement, ce qui libère aussitôt son worker.
+
+Tous les accès à la base (soumission, lecture, annulation, fin de job,
+renouvellement du bail) passent par un thread : la boucle d'événements
+n'attend jamais SQLite, même quand la base est verrouillée par un autre
+processus. Les compteurs par statut sont relus à chaque tour de
+synchronisation et l'historique est purgé périodiquement, pas à chaque
+soumission.
+
+Les jobs sont enregistrés dans la base SQLite partagée (table `jobs`) : avec
+plusieurs processus (uvicorn --workers), n'importe quel worker réclame le
+prochain job en attente par une mise à jour atomique et le garde sous bail,
+renouvelé pendant l'exécution. Si son processus meurt, le bail expire et le
+job est repris par un autre worker (au plus JOB_MAX_ATTEMPTS fois). Les
+deltas de texte ne sont diffusés que par le processus qui exécute la
+recherche ; les autres relaient ses changements d'état.
+"""
+
+import asyncio
+import json
+import os
+import socket
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+
+import db
+
+# Configuration
+JOB_WORKERS = int(os.getenv("RESEARCH_WORKERS", "4"))
+JOB_QUEUE_SIZE = int(os.getenv("RESEARCH_QUEUE_SIZE", "1000"))
+JOB_HISTORY_SIZE = int(os.getenv("RESEARCH_JOB_HISTORY", "1000"))
+STREAM_HEARTBEAT_S = float(os.getenv("RESEARCH_STREAM_HEARTBEAT", "15"))
+# Échéance par défaut d'une recherche, en secondes (0 = aucune)
+JOB_DEADLINE_S = float(os.getenv("RESEARCH_DEADLINE", "1800"))
+# Bail d'un job en cours : sans renouvellement pendant ce délai, le job est repris
+JOB_LEASE_S = float(os.getenv("RESEARCH_JOB_LEASE", "60"))
+JOB_POLL_INTERVAL_S = float(os.getenv("RESEARCH_POLL_INTERVAL", "1"))
+JOB_MAX_ATTEMPTS = int(os.getenv("RESEARCH_MAX_ATTEMPTS", "3"))
+# Intervalle entre deux purges de l'historique des jobs terminés, en secondes
+JOB_PRUNE_INTERVAL_S = float(os.getenv("RESEARCH_PRUNE_INTERVAL", "60"))
+
+# États possibles d'un job
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+STATUS_TIMED_OUT = "timed_out"
+
+FINISHED_STATUSES = {STATUS_COMPLETED, STATUS_FAILED, STATUS_CANCELLED, STATUS_TIMED_OUT}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    deadline REAL,
+    started_at REAL,
+    finished_at REAL,
+    error TEXT,
+    result TEXT,
+    owner TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+"""
+db.register_schema(SCHEMA)
+
+# Champs du résultat conservés dans la base (le texte reste dans outputs/)
+RESULT_FIELDS = ("output_file", "metadata_file", "created_at")
+
+
+def _utc_iso(timestamp: Optional[float]) -> Optional[str]:
+    """Convertit un timestamp epoch en ISO 8601 UTC."""
+    if timestamp is None:
+        return None
+    return datetime.utcfromtimestamp(timestamp).isoformat() + "Z"
+
+
+class QueueFullError(Exception):
+    """Levée quand la file d'attente a atteint sa capacité maximale."""
+
+
+class Job:
+    """Une recherche soumise à la file d'attente."""
+
+    def __init__(self, job_id: str, params: dict, deadline_s: Optional[float] = None):
+        self.job_id = job_id
+        self.params = params
+        self.status = STATUS_QUEUED
+        self.created_at = time.time()
+        self.deadline = self.created_at + deadline_s if deadline_s else None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        # Journal des événements diffusés aux abonnés du flux SSE : (numéro, événement, données)
+        self.events = []
+        self._next_event = 0
+        self._subscribers = 0
+        # Vrai une fois les deltas de texte oubliés (job terminé : le rapport est stocké)
+        self.trimmed = False
+        self._wakeup = asyncio.Event()
+        # Tâche de la recherche en cours (pour l'annulation)
+        self._task: Optional[asyncio.Task] = None
+        # Vrai si la recherche est exécutée par ce processus
+        self.executed_here = False
+
+    @classmethod
+    def from_row(cls, row) -> "Job":
+        """Reconstruit un job enregistré par un autre processus."""
+        job = cls(row["job_id"], json.loads(row["params"]))
+        job.created_at = row["created_at"]
+        job.deadline = row["deadline"]
+        job.refresh(row)
+        return job
+
+    def refresh(self, row) -> bool:
+        """
+        Met à jour l'état depuis la base ; retourne True si le statut a changé.
+
+        Le changement est publié aux abonnés comme s'il avait eu lieu ici.
+        """
+        previous = self.status
+        self.status = row["status"]
+        self.started_at = row["started_at"]
+        self.finished_at = row["finished_at"]
+        self.error = row["error"]
+        self.result = json.loads(row["result"]) if row["result"] else None
+        if self.status == previous:
+            return False
+        if self.finished:
+            self.publish(self.status, self.to_dict())
+        else:
+            self.publish("status", {"status": self.status})
+        return True
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def publish(self, event: str, data: dict):
+        """Ajoute un événement au journal et réveille les abonnés."""
+        self.events.append((self._next_event, event, data))
+        self._next_event += 1
+        self._wakeup.set()
+        self._wakeup = asyncio.Event()
+        self._trim()
+
+    def _trim(self):
+        """
+        Oublie les deltas de texte d'un job terminé qui n'a plus d'abonné.
+
+        Le journal d'un job de l'historique reste ainsi petit ; un abonné
+        tardif relit le rapport stocké. Les numéros d'événements restants ne
+        changent pas (reprise par Last-Event-ID).
+        """
+        if self.finished and not self._subscribers and not self.trimmed:
+            self.events = [entry for entry in self.events if entry[1] != "delta"]
+            self.trimmed = True
+
+    async def subscribe(
+        self,
+        start: int = 0,
+        heartbeat: float = STREAM_HEARTBEAT_S
+    ) -> AsyncIterator[Optional[Tuple[int, str, dict]]]:
+        """
+        Rejoue le journal à partir de `start` puis suit les nouveaux événements.
+
+        Produit des tuples (index, événement, données), ou None toutes les
+        `heartbeat` secondes sans activité. S'arrête quand le job est terminé.
+        """
+        index = start
+        self._subscribers += 1
+        try:
+            while True:
+                position = bisect_left(self.events, index, key=lambda entry: entry[0])
+                while position < len(self.events):
+                    entry = self.events[position]
+                    yield entry
+                    index = entry[0] + 1
+                    position += 1
+                if self.finished:
+                    return
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            self._subscribers -= 1
+            self._trim()
+
+    async def wait(self, timeout: float) -> bool:
+        """Attend la fin du job, au plus `timeout` secondes ; retourne True s'il est terminé."""
+        deadline = time.monotonic() + timeout
+        while not self.finished:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), remaining)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    def to_dict(self) -> dict:
+        """Représentation JSON du job pour GET /jobs/{id}."""
+        now = time.time()
+        queue_wait = None
+        if self.started_at is not None:
+            queue_wait = self.started_at - self.created_at
+        elif not self.finished:
+            queue_wait = now - self.created_at
+
+        duration = None
+        if self.started_at is not None:
+            duration = (self.finished_at or now) - self.started_at
+
+        return {
+            "research_id": self.job_id,
+            "status": self.status,
+            "subject": self.params.get("subject"),
+            "created_at": _utc_iso(self.created_at),
+            "deadline_at": _utc_iso(self.deadline),
+            "started_at": _utc_iso(self.started_at),
+            "finished_at": _utc_iso(self.finished_at),
+            "queue_wait_s": round(queue_wait, 3) if queue_wait is not None else None,
+            "duration_s": round(duration, 3) if duration is not None else None,
+            "error": self.error,
+            "output_file": (self.result or {}).get("output_file"),
+            "metadata_file": (self.result or {}).get("metadata_file"),
+        }
+
+
+def _default_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobQueue:
+    """
+    File d'attente asynchrone exécutant les jobs avec une concurrence plafonnée.
+
+    `runner` est une coroutine appelée avec les paramètres du job ; le nombre
+    de workers plafonne le nombre de recherches exécutées simultanément par
+    ce processus. `on_finish`, s'il est fourni, est appelé avec le job une
+    fois terminé (y compris quand il a été exécuté par un autre processus) ;
+    `on_start` l'est par le processus qui démarre le job.
+    """
+
+    def __init__(
+        self,
+        runner: Callable[..., Awaitable[dict]],
+        on_finish: Optional[Callable[[Job], None]] = None,
+        workers: int = JOB_WORKERS,
+        max_queue: int = JOB_QUEUE_SIZE,
+        history_size: int = JOB_HISTORY_SIZE,
+        lease_s: float = JOB_LEASE_S,
+        poll_interval: float = JOB_POLL_INTERVAL_S,
+        max_attempts: int = JOB_MAX_ATTEMPTS,
+        on_start: Optional[Callable[[Job], None]] = None,
+        prune_interval: float = JOB_PRUNE_INTERVAL_S
+    ):
+        self.runner = runner
+        self.on_finish = on_finish
+        self.on_start = on_start
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.history_size = history_size
+        self.lease_s = lease_s
+        self.poll_interval = poll_interval
+        self.max_attempts = max(1, max_attempts)
+        self.prune_interval = prune_interval
+        self.owner = _default_owner()
+        # Jobs connus de ce processus (journal d'événements des flux SSE)
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks = []
+        # Nombre de jobs par statut, relu à chaque tour de synchronisation
+        self._counts: Dict[str, int] = {}
+
+    async def start(self):
+        """Démarre les workers (à appeler au démarrage de l'application)."""
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._counts = await asyncio.to_thread(self._count_by_status)
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"research-worker-{i}")
+            for i in range(self.workers)
+        ]
+        self._tasks.append(asyncio.create_task(self._sync(), name="research-jobs-sync"))
+
+    async def stop(self):
+        """Arrête les workers ; les jobs en cours sont interrompus et rendus à la file."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await asyncio.to_thread(self._release_owned)
+
+    def _release_owned(self):
+        with db.transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, lease_until = NULL "
+                "WHERE status = ? AND owner = ?",
+                (STATUS_QUEUED, STATUS_RUNNING, self.owner)
+            )
+
+    async def submit(self, job_id: str, params: dict, deadline_s: Optional[float] = JOB_DEADLINE_S) -> Job:
+        """
+        Ajoute un job à la file et le retourne dès qu'il est enregistré.
+
+        Le job est connu de `get` avant la fin de l'insertion : une requête
+        identique arrivée entre-temps peut déjà s'y rattacher.
+        """
+        if not self._tasks:
+            raise RuntimeError("La file d'attente n'est pas démarrée")
+
+        job = Job(job_id, params, deadline_s)
+        self.jobs[job_id] = job
+        try:
+            queued = await asyncio.to_thread(self._insert, job)
+        except QueueFullError as e:
+            del self.jobs[job_id]
+            job.status = STATUS_FAILED
+            job.error = str(e)
+            job.publish(job.status, job.to_dict())
+            raise
+        self._counts[STATUS_QUEUED] = queued + 1
+        # Réveiller tous les workers inactifs de ce processus
+        self._wakeup.set()
+        self._wakeup = asyncio.Event()
+        return job
+
+    def _insert(self, job: Job) -> int:
+        """Enregistre un job en attente ; retourne le nombre de jobs déjà en attente."""
+        with db.transaction() as conn:
+            queued = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ?", (STATUS_QUEUED,)
+            ).fetchone()[0]
+            if queued >= self.max_queue:
+                raise QueueFullError(
+                    f"File d'attente pleine ({self.max_queue} recherches en attente)"
+                )
+            conn.execute(
+                "INSERT INTO jobs (job_id, params, status, created_at, deadline) VALUES (?, ?, ?, ?, ?)",
+                (job.job_id, json.dumps(job.params, ensure_ascii=False), job.status, job.created_at, job.deadline)
+            )
+        return queued
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        """Job par identifiant, à jour de la base s'il est exécuté ailleurs."""
+        job = self.jobs.get(job_id)
+        if job is not None and (job.executed_here or job.finished):
+            return job
+        row = await asyncio.to_thread(self._read_row, job_id)
+        if row is None:
+            return job
+        if job is None:
+            job = Job.from_row(row)
+            self.jobs[job_id] = job
+        else:
+            self._refresh(job, row)
+        return job
+
+    @staticmethod
+    def _read_row(job_id: str):
+        return db.get_connection().execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Annule un job en attente ou en cours (None s'il est inconnu).
+
+        Un job en attente est retiré du circuit avant d'occuper un worker ; un
+        job en cours voit sa tâche annulée, ce qui ferme la connexion à l'API.
+        Si un autre processus l'exécute, l'annulation lui est transmise par la
+        base et appliquée au prochain renouvellement du bail.
+        """
+        job = await self.get(job_id)
+        if job is None or job.finished:
+            return job
+        if job._task is not None:
+            job._task.cancel()
+            return job
+
+        now = time.time()
+        error = "Recherche annulée avant son démarrage"
+        cancelled = await asyncio.to_thread(self._cancel_row, job_id, now, error)
+        # Le job a pu démarrer ici pendant l'écriture : sa tâche est alors annulée
+        if job._task is not None:
+            job._task.cancel()
+        elif cancelled and not job.finished:
+            self._finish_local(job, STATUS_CANCELLED, error, now)
+        return job
+
+    @staticmethod
+    def _cancel_row(job_id: str, now: float, error: str) -> bool:
+        """Annule un job encore en attente, sinon demande l'annulation à son worker."""
+        with db.transaction() as conn:
+            cancelled = conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE job_id = ? AND status = ?",
+                (STATUS_CANCELLED, now, error, job_id, STATUS_QUEUED)
+            ).rowcount
+            if not cancelled:
+                conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE job_id = ?", (job_id,))
+        return bool(cancelled)
+
+    async def _finish(self, job: Job, status: str, error: Optional[str] = None):
+        """
+        Enregistre la fin d'un job exécuté ici puis la publie.
+
+        Si le bail a été perdu entre-temps (job repris par un autre processus),
+        rien n'est écrit et le job est suivi comme un job distant.
+        """
+        finished_at = time.time()
+        result = {k: v for k, v in (job.result or {}).items() if k in RESULT_FIELDS}
+        updated = await asyncio.to_thread(self._finish_row, job.job_id, status, error, result, finished_at)
+        if not updated:
+            job.executed_here = False
+            return
+        self._finish_local(job, status, error, finished_at)
+
+    def _finish_row(self, job_id: str, status: str, error: Optional[str], result: dict, finished_at: float) -> bool:
+        with db.transaction() as conn:
+            return conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = ?, result = ?, "
+                "owner = NULL, lease_until = NULL WHERE job_id = ? AND owner = ?",
+                (status, finished_at, error, json.dumps(result) if result else None, job_id, self.owner)
+            ).rowcount > 0
+
+    def _renew_lease(self, job_id: str):
+        """Prolonge le bail d'un job exécuté ici ; None s'il a été perdu."""
+        with db.transaction() as conn:
+            return conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE job_id = ? AND owner = ? "
+                "RETURNING cancel_requested",
+                (time.time() + self.lease_s, job_id, self.owner)
+            ).fetchone()
+
+    def _finish_local(self, job: Job, status: str, error: Optional[str], finished_at: float):
+        job.finished_at = finished_at
+        job.status = status
+        job.error = error
+        job.publish(status, job.to_dict())
+        if self.on_finish is not None:
+            self.on_finish(job)
+
+    def _refresh(self, job: Job, row):
+        if job.refresh(row) and job.finished and self.on_finish is not None:
+            self.on_finish(job)
+
+    def stats(self) -> dict:
+        """
+        Statistiques de la file (tous processus confondus).
+
+        Les compteurs datent du dernier tour de synchronisation (au plus
+        `poll_interval` secondes) : aucun accès à la base ici.
+        """
+        counts = dict(self._counts)
+        return {
+            "workers": self.workers,
+            "queue_depth": counts.get(STATUS_QUEUED, 0),
+            "running": counts.get(STATUS_RUNNING, 0),
+            "running_here": sum(1 for j in self.jobs.values() if j._task is not None),
+            "jobs": counts,
+        }
+
+    @staticmethod
+    def _count_by_status() -> Dict[str, int]:
+        rows = db.get_connection().execute(
+            "SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"
+        ).fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def _forget_finished(self):
+        """Oublie en mémoire les jobs terminés les plus anciens au-delà de l'historique."""
+        excess = len(self.jobs) - self.history_size
+        if excess > 0:
+            for job_id in [j.job_id for j in self.jobs.values() if j.finished][:excess]:
+                del self.jobs[job_id]
+
+    def _prune_history(self):
+        """Supprime de la base les jobs terminés les plus anciens au-delà de l'historique."""
+        placeholders = ", ".join("?" for _ in FINISHED_STATUSES)
+        with db.transaction() as conn:
+            conn.execute(
+                f"DELETE FROM jobs WHERE job_id IN (SELECT job_id FROM jobs WHERE status IN ({placeholders}) "
+                f"ORDER BY finished_at DESC LIMIT -1 OFFSET ?)",
+                (*FINISHED_STATUSES, self.history_size)
+            )
+
+    async def _claim(self) -> Optional[Job]:
+        """
+        Réclame le plus ancien job en attente, ou dont le bail a expiré.
+
+        La sélection et le passage en `running` tiennent en une seule
+        instruction UPDATE : deux processus ne peuvent pas réclamer le même job.
+        """
+        row = await asyncio.to_thread(self._claim_row)
+        if row is None:
+            return None
+
+        job = self.jobs.get(row["job_id"])
+        if job is None:
+            job = Job.from_row(row)
+            self.jobs[job.job_id] = job
+        job.executed_here = True
+        job.status = STATUS_RUNNING
+        job.started_at = row["started_at"]
+        job.publish("status", {"status": job.status})
+        if self.on_start is not None:
+            self.on_start(job)
+        return job
+
+    def _claim_row(self):
+        now = time.time()
+        with db.transaction() as conn:
+            # Jobs abandonnés trop souvent ou annulés pendant que leur worker a disparu
+            conn.execute(
+                "UPDATE jobs SET status = CASE WHEN cancel_requested THEN ? ELSE ? END, "
+                "finished_at = ?, owner = NULL, lease_until = NULL, "
+                "error = CASE WHEN cancel_requested THEN 'Recherche annulée' "
+                "ELSE 'Abandonnée après ' || attempts || ' tentatives interrompues' END "
+                "WHERE status = ? AND lease_until < ? AND (cancel_requested OR attempts >= ?)",
+                (STATUS_CANCELLED, STATUS_FAILED, now, STATUS_RUNNING, now, self.max_attempts)
+            )
+            row = conn.execute(
+                "UPDATE jobs SET status = ?, owner = ?, lease_until = ?, started_at = ?, "
+                "attempts = attempts + 1 "
+                "WHERE job_id = (SELECT job_id FROM jobs WHERE status = ? "
+                "OR (status = ? AND lease_until < ?) ORDER BY created_at LIMIT 1) "
+                "RETURNING *",
+                (STATUS_RUNNING, self.owner, now + self.lease_s, now,
+                 STATUS_QUEUED, STATUS_RUNNING, now)
+            ).fetchone()
+        return row
+
+    async def _run(self, job: Job):
+        """Exécute un job jusqu'à sa fin, son annulation ou son échéance."""
+        if job.deadline is not None and job.deadline <= time.time():
+            await self._finish(job, STATUS_TIMED_OUT, "Échéance dépassée avant le démarrage")
+            return
+
+        job._task = asyncio.create_task(
+            self.runner(research_id=job.job_id, on_event=job.publish, **job.params)
+        )
+        # Attendre par tranches pour renouveler le bail et relayer les annulations
+        renew_every = max(0.1, self.lease_s / 3)
+        timed_out = False
+        try:
+            while True:
+                wait_s = renew_every
+                if job.deadline is not None:
+                    wait_s = min(wait_s, max(0.0, job.deadline - time.time()))
+                done, _ = await asyncio.wait({job._task}, timeout=wait_s)
+                if done:
+                    break
+                if job.deadline is not None and time.time() >= job.deadline:
+                    timed_out = True
+                    break
+                lease = await asyncio.to_thread(self._renew_lease, job.job_id)
+                if lease is None or lease["cancel_requested"]:
+                    # Annulation demandée par un autre processus, ou bail perdu
+                    job._task.cancel()
+        except asyncio.CancelledError:
+            # Arrêt du worker : interrompre aussi la recherche
+            job._task.cancel()
+            raise
+
+        if timed_out:
+            job._task.cancel()
+            try:
+                await job._task
+            except BaseException:
+                pass
+            # L'échéance est comptée depuis la soumission, comme `deadline`
+            deadline_s = job.deadline - job.created_at
+            await self._finish(job, STATUS_TIMED_OUT, f"Échéance de {deadline_s:g}s dépassée")
+        elif job._task.cancelled():
+            await self._finish(job, STATUS_CANCELLED, "Recherche annulée")
+        elif job._task.exception() is not None:
+            await self._finish(job, STATUS_FAILED, str(job._task.exception()))
+        else:
+            job.result = job._task.result()
+            await self._finish(job, STATUS_COMPLETED)
+        job._task = None
+
+    async def _worker(self):
+        while True:
+            wakeup = self._wakeup
+            job = await self._claim()
+            if job is None:
+                # Rien à faire : attendre une soumission locale ou le prochain tour
+                try:
+                    await asyncio.wait_for(wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _sync(self):
+        """
+        Suit l'état des jobs connus ici mais exécutés par un autre processus,
+        relit les compteurs par statut et purge périodiquement l'historique.
+        """
+        next_prune = time.monotonic() + self.prune_interval
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            self._forget_finished()
+            if time.monotonic() >= next_prune:
+                await asyncio.to_thread(self._prune_history)
+                next_prune = time.monotonic() + self.prune_interval
+            self._counts = await asyncio.to_thread(self._count_by_status)
+            watched = [j.job_id for j in self.jobs.values() if not j.finished and not j.executed_here]
+            if not watched:
+                continue
+            rows = await asyncio.to_thread(self._read_rows, watched)
+            for row in rows:
+                job = self.jobs.get(row["job_id"])
+                if job is not None:
+                    self._refresh(job, row)
+
+    @staticmethod
+    def _read_rows(job_ids) -> list:
+        placeholders = ", ".join("?" for _ in job_ids)
+        return db.get_connection().execute(
+            f"SELECT * FROM jobs WHERE job_id IN ({placeholders})", job_ids
+        ).fetchall()
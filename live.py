@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Canal WebSocket des changements de la liste des recherches (GET /ws).
+
+Au lieu de recharger /list périodiquement, le tableau de bord reçoit des
+événements incrémentaux : recherche créée, changement de statut, recherche
+terminée, recherche supprimée.
+
+Les événements sont ajoutés à un journal SQLite (`live_events`) par le
+processus où ils se produisent ; dans chaque processus, une seule tâche lit
+les nouveaux événements du journal et les distribue à toutes les connexions
+ouvertes. `emit` ne fait que mettre l'événement en attente : c'est cette
+tâche qui l'écrit, relit le journal et le purge, dans un thread, si bien que
+la boucle d'événements n'attend jamais SQLite. La charge ne dépend donc plus du nombre de spectateurs : une
+requête par intervalle et par processus, quel que soit ce nombre. Le
+numéro d'événement sert de curseur de reprise (`/ws?since=N`).
+
+Chaque connexion a une file bornée (LIVE_QUEUE_SIZE) : un client trop lent
+voit sa file vidée et remplacée par un unique événement `resync`, qui lui
+demande de recharger /list, plutôt que de faire grossir la mémoire du
+serveur.
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from typing import List, Optional, Set, Tuple
+
+from fastapi import WebSocket, WebSocketDisconnect
+from starlette.websockets import WebSocketState
+
+import db
+
+# Configuration
+LIVE_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", "100"))
+LIVE_MAX_CONNECTIONS = int(os.getenv("LIVE_MAX_CONNECTIONS", "1000"))
+LIVE_POLL_INTERVAL_S = float(os.getenv("LIVE_POLL_INTERVAL", "0.5"))
+LIVE_HEARTBEAT_S = float(os.getenv("LIVE_HEARTBEAT", "30"))
+LIVE_SEND_TIMEOUT_S = float(os.getenv("LIVE_SEND_TIMEOUT", "10"))
+# Nombre d'événements conservés dans le journal (reprise après coupure)
+LIVE_EVENT_HISTORY = int(os.getenv("LIVE_EVENT_HISTORY", "10000"))
+
+# Types d'événements
+EVENT_CREATED = "created"
+EVENT_STATUS = "status"
+EVENT_COMPLETED = "completed"
+EVENT_DELETED = "deleted"
+EVENT_RESYNC = "resync"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS live_events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    event TEXT NOT NULL,
+    research_id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+db.register_schema(SCHEMA)
+
+
+def _message(seq: int, event: str, research_id: str, data: dict) -> dict:
+    return {"seq": seq, "event": event, "research_id": research_id, **data}
+
+
+class Connection:
+    """File d'envoi bornée d'un spectateur."""
+
+    def __init__(self, max_size: int = LIVE_QUEUE_SIZE):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self.dropped = 0
+
+    def offer(self, message: dict):
+        """Ajoute un message sans jamais bloquer ; en cas de débordement, demande une resynchronisation."""
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped += self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"seq": message["seq"], "event": EVENT_RESYNC, "reason": "overflow"})
+
+
+class LiveHub:
+    """Distribue les événements du journal aux connexions WebSocket de ce processus."""
+
+    def __init__(self):
+        self.connections: Set[Connection] = set()
+        self.last_seq = 0
+        self.resyncs = 0
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Événements émis, en attente d'écriture dans le journal
+        self._pending = deque()
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self.last_seq = await asyncio.to_thread(current_seq)
+        self._task = asyncio.create_task(self._tail(), name="live-events")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._flush()
+        self._loop = None
+
+    def emit(self, event: str, research_id: str, data: Optional[dict] = None):
+        """
+        Ajoute un événement au journal (visible de tous les processus).
+
+        Sans attente : l'écriture est faite par la tâche de lecture du journal.
+        Appelable depuis n'importe quel thread.
+        """
+        self._pending.append((event, research_id, data or {}, time.time()))
+        if self._loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._set_wakeup()
+        else:
+            self._loop.call_soon_threadsafe(self._set_wakeup)
+
+    def _set_wakeup(self):
+        self._wakeup.set()
+
+    async def _flush(self):
+        """Écrit les événements en attente dans le journal, dans l'ordre d'émission."""
+        batch = []
+        while self._pending:
+            batch.append(self._pending.popleft())
+        if batch:
+            await asyncio.to_thread(append, batch)
+
+    def connect(self) -> Optional[Connection]:
+        """Nouvelle connexion, ou None si la limite est atteinte."""
+        if len(self.connections) >= LIVE_MAX_CONNECTIONS:
+            return None
+        connection = Connection()
+        self.connections.add(connection)
+        return connection
+
+    def disconnect(self, connection: Connection):
+        self.connections.discard(connection)
+
+    async def _tail(self):
+        pruned_at = time.monotonic()
+        while True:
+            wakeup = self._wakeup
+            try:
+                await asyncio.wait_for(wakeup.wait(), LIVE_POLL_INTERVAL_S)
+            except asyncio.TimeoutError:
+                pass
+            if wakeup.is_set():
+                self._wakeup = asyncio.Event()
+
+            try:
+                await self._flush()
+                messages = await asyncio.to_thread(read_since, self.last_seq)
+                if time.monotonic() - pruned_at > 60:
+                    await asyncio.to_thread(prune)
+                    pruned_at = time.monotonic()
+            except Exception as e:
+                print(f"[ERREUR] Journal des événements : {e}")
+                continue
+            if messages:
+                self.last_seq = messages[-1]["seq"]
+                for connection in list(self.connections):
+                    for message in messages:
+                        connection.offer(message)
+
+    def stats(self) -> dict:
+        return {
+            "connections": len(self.connections),
+            "max_connections": LIVE_MAX_CONNECTIONS,
+            "last_seq": self.last_seq,
+            "queued": sum(c.queue.qsize() for c in self.connections),
+            "resyncs": self.resyncs,
+        }
+
+
+def current_seq() -> int:
+    return db.get_connection().execute("SELECT COALESCE(MAX(seq), 0) FROM live_events").fetchone()[0]
+
+
+def oldest_seq() -> int:
+    return db.get_connection().execute("SELECT COALESCE(MIN(seq), 0) FROM live_events").fetchone()[0]
+
+
+def append(events: List[Tuple[str, str, dict, float]]):
+    """Écrit des événements (événement, research_id, données, date) dans le journal."""
+    with db.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO live_events (event, research_id, data, created_at) VALUES (?, ?, ?, ?)",
+            [(event, research_id, json.dumps(data, ensure_ascii=False), created_at)
+             for event, research_id, data, created_at in events]
+        )
+
+
+def read_since(seq: int, limit: Optional[int] = None) -> List[dict]:
+    """Événements postérieurs à `seq`, dans l'ordre."""
+    query = "SELECT * FROM live_events WHERE seq > ? ORDER BY seq"
+    params = [seq]
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    rows = db.get_connection().execute(query, params).fetchall()
+    return [_message(row["seq"], row["event"], row["research_id"], json.loads(row["data"])) for row in rows]
+
+
+def prune(keep: int = LIVE_EVENT_HISTORY):
+    with db.transaction() as conn:
+        conn.execute("DELETE FROM live_events WHERE seq <= (SELECT MAX(seq) FROM live_events) - ?", (keep,))
+
+
+async def serve(websocket: WebSocket, since: Optional[int] = None):
+    """
+    Sert une connexion /ws jusqu'à sa fermeture.
+
+    Envoie d'abord `hello` (numéro courant), puis les événements manqués
+    depuis `since` s'ils sont encore dans le journal (sinon `resync`), puis
+    les événements au fil de l'eau. Un client qui ne lit plus pendant
+    LIVE_SEND_TIMEOUT est déconnecté.
+    """
+    connection = hub.connect()
+    if connection is None:
+        await websocket.close(code=1013)
+        return
+    # Les événements postérieurs à `upto` arriveront par la file de la connexion
+    upto = hub.last_seq
+    receiver = getter = None
+    try:
+        await websocket.accept()
+        await websocket.send_json({"event": "hello", "seq": upto})
+        if since is not None and since < upto:
+            if since < await asyncio.to_thread(oldest_seq) - 1:
+                hub.resyncs += 1
+                await websocket.send_json({"event": EVENT_RESYNC, "seq": upto, "reason": "history"})
+            else:
+                for message in await asyncio.to_thread(read_since, since):
+                    if message["seq"] > upto:
+                        break
+                    await websocket.send_json(message)
+
+        async def receive():
+            # Messages du client ignorés : seule la fermeture compte
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass
+
+        receiver = asyncio.create_task(receive())
+        while True:
+            # Lecture en cours conservée d'un tour à l'autre : un message déjà
+            # retiré de la file n'est jamais perdu sur un battement de cœur
+            if getter is None:
+                getter = asyncio.create_task(connection.queue.get())
+            done, _ = await asyncio.wait(
+                {getter, receiver}, timeout=LIVE_HEARTBEAT_S, return_when=asyncio.FIRST_COMPLETED
+            )
+            if receiver in done:
+                break
+            if getter in done:
+                message = getter.result()
+                getter = None
+                if message["event"] == EVENT_RESYNC:
+                    hub.resyncs += 1
+            else:
+                message = {"event": "ping", "seq": hub.last_seq}
+            await asyncio.wait_for(websocket.send_json(message), LIVE_SEND_TIMEOUT_S)
+    except (WebSocketDisconnect, asyncio.TimeoutError):
+        # Client parti, ou trop lent pour suivre
+        pass
+    finally:
+        for task in (getter, receiver):
+            if task is not None:
+                task.cancel()
+        hub.disconnect(connection)
+        if websocket.client_state == WebSocketState.CONNECTED:
+            try:
+                await websocket.close()
+            except RuntimeError:
+                pass
+
+
+# Instance partagée (tâche de lecture du journal démarrée dans le lifespan de l'API)
+hub = LiveHub()
@@ -2,13 +2,35 @@
 """
 veille_research.py
 Script de veille technologique utilisant l'API OpenAI + outil Web Search.
+
+Usage :
+    python main.py                                  # traite subject.json
+    python main.py --batch sujets.jsonl             # traite un fichier JSONL de sujets
+    python main.py --batch dossier_sujets/ --parallel 8 --output-dir veille/
+    python main.py --followup                       # suite de la recherche de metadata.json
 """
 
+import argparse
+import asyncio
+import hashlib
 import json
 import sys
 import os
+import time
 from datetime import datetime
-from openai import OpenAI
+from pathlib import Path
+
+from openai import APIStatusError
+
+from context_compaction import compact_previous_responses
+from openai_client import (
+    FOLLOWUP_INSTRUCTION,
+    close_client,
+    create_response,
+    extract_output_text,
+    is_previous_response_missing,
+)
+from rate_limiter import scheduler
 
 # Clé API depuis les variables d'environnement
 API_KEY = os.getenv("OPENAI_API_KEY")
@@ -18,11 +40,26 @@ INPUT_FILE = "subject.json"
 OUTPUT_TEXT_FILE = "output.txt"
 METADATA_FILE = "metadata.json"
 
+# Mode batch
+BATCH_OUTPUT_DIR = "batch_outputs"
+BATCH_PARALLEL = 4
+MANIFEST_FILE = "manifest.jsonl"
+
 # Paramètres du modèle
 MODEL = "gpt-5"
 VERBOSITY = "medium"
 REASONING_EFFORT = "medium"
 
+DEVELOPER_INSTRUCTION = (
+    "Tu es un assistant de veille technologique expert. Ta mission est de faire une recherche "
+    "approfondie et structurée sur un sujet donné, en utilisant l'outil Web Search pour trouver "
+    "des informations fiables, récentes et pertinentes.\n\n"
+    "Fait des recherches sur les nouvelles avancées, les plus récentes possible.\n\n"
+    "Le sujet sera fourni au format JSON dans le message utilisateur.\n"
+    "Si la catégorie 'PreviousResponses' contient quelque chose, analyse les anciennes réponses "
+    "et évite de répéter les mêmes informations."
+)
+
 def load_subject(path):
     """Charge le sujet JSON à traiter."""
     try:
@@ -32,93 +69,130 @@ def load_subject(path):
         print(f"[ERREUR] Impossible de lire '{path}': {e}", file=sys.stderr)
         sys.exit(1)
 
-def main():
-    # Vérifier que la clé API est définie
-    if not API_KEY:
-        print("[ERREUR] La variable d'environnement OPENAI_API_KEY n'est pas définie.", file=sys.stderr)
-        print("Veuillez définir votre clé API OpenAI dans les variables d'environnement.", file=sys.stderr)
-        sys.exit(1)
-    
-    client = OpenAI(api_key=API_KEY)
-
-    subject_json = load_subject(INPUT_FILE)
-
-    developer_instruction = (
-        "Tu es un assistant de veille technologique expert. Ta mission est de faire une recherche "
-        "approfondie et structurée sur un sujet donné, en utilisant l'outil Web Search pour trouver "
-        "des informations fiables, récentes et pertinentes.\n\n"
-        "Fait des recherches sur les nouvelles avancées, les plus récentes possible.\n\n"
-        "Le sujet sera fourni au format JSON dans le message utilisateur.\n"
-        "Si la catégorie 'PreviousResponses' contient quelque chose, analyse les anciennes réponses "
-        "et évite de répéter les mêmes informations."
-    )
-
-    # Messages envoyés au modèle
-    input_messages = [
+def build_input_messages(subject_json):
+    """
+    Messages envoyés au modèle pour un sujet (réponses précédentes condensées
+    au besoin) ; retourne (messages, rapport de compaction).
+    """
+    compaction = None
+    if subject_json.get("PreviousResponses"):
+        previous_context, compaction = compact_previous_responses(subject_json["PreviousResponses"])
+        subject_json = {**subject_json, "PreviousResponses": previous_context}
+    return [
         {
             "role": "developer",
             "content": [
-                {"type": "input_text", "text": developer_instruction}
+                {"type": "input_text", "text": DEVELOPER_INSTRUCTION}
             ]
         },
         {
             "role": "user",
             "content": [
-                {"type": "input_text", "text": json.dumps(subject_json, ensure_ascii=False, indent=2)}
+                {"type": "input_text", "text": json.dumps(subject_json, ensure_ascii=False)}
             ]
         }
-    ]
+    ], compaction
 
-    print("[INFO] Envoi de la requête à l'API...")
-    try:
-        response = client.responses.create(
-            model=MODEL,
-            input=input_messages,
-            text={
-                "format": {"type": "text"},
-                "verbosity": VERBOSITY
-            },
-            reasoning={"effort": REASONING_EFFORT},
-            tools=[
-                {
-                    "type": "web_search",
-                    "user_location": {"type": "approximate"},
-                    "search_context_size": "high"
-                }
-            ],
-            store=True,
-            include=[
-                "reasoning.encrypted_content",
-                "web_search_call.action.sources"
+def build_followup_messages(subject_json, since):
+    """Message d'une suite chaînée : seul le nouveau tour est envoyé, l'historique reste chez OpenAI."""
+    followup_json = {
+        "Subject": subject_json.get("Subject"),
+        "Since": since,
+        "Instruction": FOLLOWUP_INSTRUCTION
+    }
+    return [
+        {
+            "role": "user",
+            "content": [
+                {"type": "input_text", "text": json.dumps(followup_json, ensure_ascii=False)}
             ]
-        )
-    except Exception as e:
-        print(f"[ERREUR] Échec de l'appel API : {e}", file=sys.stderr)
+        }
+    ]
+
+def load_followup(path):
+    """Réponse à chaîner et lignée de la suite, lues dans les métadonnées d'une recherche précédente."""
+    metadata = load_subject(path)
+    response_id = metadata.get("response_id") or (metadata.get("output_raw") or {}).get("id")
+    if not response_id:
+        print(f"[ERREUR] Aucun identifiant de réponse dans '{path}'", file=sys.stderr)
         sys.exit(1)
+    # Même schéma de lignée que l'API : parent_id, root_id, depth
+    parent_id = metadata.get("research_id") or response_id
+    lineage = metadata.get("lineage") or {}
+    return response_id, metadata.get("created_at"), {
+        "parent_id": parent_id,
+        "root_id": lineage.get("root_id") or lineage.get("root_response_id") or parent_id,
+        "depth": lineage.get("depth", 0) + 1
+    }
 
-    # Extraction du texte de sortie
-    output_text = getattr(response, "output_text", None)
-    if not output_text:
-        fragments = []
-        for item in getattr(response, "output", []):
-            for c in item.get("content", []):
-                if c.get("type") == "output_text":
-                    fragments.append(c.get("text", ""))
-        output_text = "\n\n".join(fragments) if fragments else "[Aucune sortie texte trouvée]"
+def _request_options(input_messages):
+    """Paramètres de l'appel à l'API pour des messages donnés."""
+    return dict(
+        model=MODEL,
+        input=input_messages,
+        text={
+            "format": {"type": "text"},
+            "verbosity": VERBOSITY
+        },
+        reasoning={"effort": REASONING_EFFORT},
+        tools=[
+            {
+                "type": "web_search",
+                "user_location": {"type": "approximate"},
+                "search_context_size": "high"
+            }
+        ],
+        store=True,
+        include=[
+            "reasoning.encrypted_content",
+            "web_search_call.action.sources"
+        ]
+    )
+
+async def request_response(input_messages, previous_response_id=None):
+    """Appelle l'API via le client partagé (chaînée sur `previous_response_id` si fourni)."""
+    options = _request_options(input_messages)
+    if previous_response_id:
+        options["previous_response_id"] = previous_response_id
+    return await create_response(**options)
+
+async def fetch_response(input_messages, previous_response_id=None, fallback_messages=None):
+    """
+    Appelle l'API via le client partagé puis libère son pool de connexions.
+
+    Si la réponse chaînée n'existe plus côté OpenAI (expirée ou non stockée),
+    `fallback_messages` est envoyé à la place, sans chaînage.
+    """
+    try:
+        try:
+            return await request_response(input_messages, previous_response_id), previous_response_id
+        except APIStatusError as e:
+            if not previous_response_id or fallback_messages is None or not is_previous_response_missing(e):
+                raise
+            print("[INFO] Réponse précédente introuvable, recherche complète...")
+            return await request_response(fallback_messages), None
+    finally:
+        await close_client()
+
+def save_results(response, output_text_file, metadata_file, input_file, extra=None):
+    """Écrit le texte de sortie et les métadonnées d'une réponse."""
+    output_text = extract_output_text(response)
 
     # Sauvegarde dans un fichier texte
     now = datetime.utcnow().isoformat() + "Z"
-    with open(OUTPUT_TEXT_FILE, "w", encoding="utf-8") as f:
+    with open(output_text_file, "w", encoding="utf-8") as f:
         f.write(f"--- Résultat généré le {now} (UTC) ---\n\n")
         f.write(output_text)
 
     # Sauvegarde des métadonnées
-    with open(METADATA_FILE, "w", encoding="utf-8") as f:
+    with open(metadata_file, "w", encoding="utf-8") as f:
         json.dump(
             {
                 "model": MODEL,
                 "created_at": now,
-                "input_file": INPUT_FILE,
+                "input_file": input_file,
+                "response_id": response.id,
+                **(extra or {}),
                 "output_raw": response.model_dump()  # dump brut de l'objet réponse
             },
             f,
@@ -126,6 +200,258 @@ def main():
             indent=2
         )
 
+def subject_key(subject_json):
+    """Identifiant stable d'un sujet : son champ `id`, sinon un hash de son contenu."""
+    if subject_json.get("id"):
+        return str(subject_json["id"])
+    payload = json.dumps(subject_json, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+def load_batch(path):
+    """
+    Charge les sujets d'un fichier JSONL (un sujet par ligne) ou d'un dossier
+    de fichiers *.json au format de subject.json.
+
+    Retourne une liste de (clé, source, sujet).
+    """
+    path = Path(path)
+    subjects = []
+    try:
+        if path.is_dir():
+            for subject_file in sorted(path.glob("*.json")):
+                with open(subject_file, "r", encoding="utf-8") as f:
+                    subject_json = json.load(f)
+                subject_json.setdefault("id", subject_file.stem)
+                subjects.append((subject_key(subject_json), str(subject_file), subject_json))
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                for line_number, line in enumerate(f, start=1):
+                    if not line.strip():
+                        continue
+                    subject_json = json.loads(line)
+                    subjects.append((subject_key(subject_json), f"{path}:{line_number}", subject_json))
+    except Exception as e:
+        print(f"[ERREUR] Impossible de lire '{path}': {e}", file=sys.stderr)
+        sys.exit(1)
+    return subjects
+
+def load_manifest(manifest_path):
+    """Clés des sujets déjà traités avec succès lors d'une exécution précédente."""
+    completed = set()
+    if not manifest_path.exists():
+        return completed
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # ligne tronquée par une interruption
+            if entry.get("status") == "completed":
+                completed.add(entry["key"])
+    return completed
+
+def append_manifest(manifest_path, entry):
+    """Ajoute une ligne au manifeste et la force sur le disque."""
+    with open(manifest_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+def percentile(values, fraction):
+    """Percentile (par rang le plus proche) d'une liste de valeurs."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+async def run_batch(subjects, output_dir, parallel, manifest_path):
+    """Traite les sujets en parallèle (au plus `parallel` appels simultanés)."""
+    semaphore = asyncio.Semaphore(parallel)
+    latencies = []
+    failures = []
+
+    async def process(key, source, subject_json):
+        async with semaphore:
+            started = time.perf_counter()
+            output_text_file = output_dir / f"{key}_output.txt"
+            metadata_file = output_dir / f"{key}_metadata.json"
+            try:
+                subject = {k: v for k, v in subject_json.items() if k != "id"}
+                input_messages, compaction = build_input_messages(subject)
+                response = await request_response(input_messages)
+                save_results(response, output_text_file, metadata_file, source,
+                             {"context_compaction": compaction})
+            except Exception as e:
+                duration = time.perf_counter() - started
+                failures.append(key)
+                append_manifest(manifest_path, {
+                    "key": key,
+                    "source": source,
+                    "status": "failed",
+                    "error": str(e),
+                    "duration_s": round(duration, 3),
+                    "finished_at": datetime.utcnow().isoformat() + "Z"
+                })
+                print(f"[ERREUR] {key} ({source}) : {e}", file=sys.stderr)
+                return
+
+            duration = time.perf_counter() - started
+            latencies.append(duration)
+            append_manifest(manifest_path, {
+                "key": key,
+                "source": source,
+                "status": "completed",
+                "output_file": str(output_text_file),
+                "metadata_file": str(metadata_file),
+                "duration_s": round(duration, 3),
+                "finished_at": datetime.utcnow().isoformat() + "Z"
+            })
+            print(f"[OK] {key} terminé en {duration:.1f}s")
+
+    try:
+        await asyncio.gather(*(process(*subject) for subject in subjects))
+    finally:
+        await close_client()
+    return latencies, failures
+
+def batch_main(args):
+    """Mode batch : plusieurs sujets, en parallèle, avec reprise sur interruption."""
+    subjects = load_batch(args.batch)
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = Path(args.checkpoint) if args.checkpoint else output_dir / MANIFEST_FILE
+
+    done = load_manifest(manifest_path)
+    pending = []
+    seen = set()
+    for key, source, subject_json in subjects:
+        if key in done or key in seen:
+            continue
+        seen.add(key)
+        pending.append((key, source, subject_json))
+    skipped = len(subjects) - len(pending)
+
+    print(f"[INFO] {len(subjects)} sujet(s), {skipped} déjà traité(s) ou en double, "
+          f"{len(pending)} à traiter avec {args.parallel} en parallèle...")
+
+    started = time.perf_counter()
+    latencies, failures = asyncio.run(run_batch(pending, output_dir, args.parallel, manifest_path))
+    elapsed = time.perf_counter() - started
+
+    # Résumé de débit et de latence
+    print()
+    print("=" * 80)
+    print(f"Sujets traités  : {len(latencies)} réussi(s), {len(failures)} en échec, {skipped} ignoré(s)")
+    print(f"Durée totale    : {elapsed:.1f}s")
+    if elapsed > 0:
+        print(f"Débit           : {len(latencies) / elapsed * 60:.2f} sujets/min")
+    if latencies:
+        print(f"Latence         : p50 {percentile(latencies, 0.5):.1f}s | "
+              f"p95 {percentile(latencies, 0.95):.1f}s | max {max(latencies):.1f}s")
+    waits = scheduler.stats()["wait_s"]
+    print(f"Attente budget  : p50 {waits['p50']:.1f}s | p95 {waits['p95']:.1f}s | max {waits['max']:.1f}s "
+          f"({scheduler.throttled} limitation(s) 429)")
+    print(f"Manifeste       : {manifest_path}")
+    print("=" * 80)
+
+    if failures:
+        print("[INFO] Relancez la même commande pour reprendre les sujets en échec.")
+        sys.exit(1)
+
+def export_main(args):
+    """Mode export : écrit les recherches de l'API (outputs/) dans un fichier NDJSON ou CSV."""
+    import export
+
+    fmt = args.format or ("csv" if args.export.lower().endswith(".csv") else "ndjson")
+    filters = {"subject": args.subject, "model": args.model, "since": args.since, "until": args.until}
+    print(f"[INFO] Export {fmt.upper()} vers '{args.export}'...")
+    try:
+        total = export.write(Path(args.export), fmt, export.parse_fields(args.fields), **filters)
+    except (OSError, ValueError) as e:
+        print(f"[ERREUR] Échec de l'export : {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"[OK] {total} recherche(s) exportée(s) dans '{args.export}'")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Veille technologique avec l'API OpenAI + Web Search")
+    parser.add_argument("--batch", metavar="CHEMIN",
+                        help="fichier JSONL de sujets ou dossier de fichiers *.json")
+    parser.add_argument("--parallel", type=int, default=BATCH_PARALLEL,
+                        help=f"nombre de recherches simultanées en mode batch (défaut : {BATCH_PARALLEL})")
+    parser.add_argument("--output-dir", default=BATCH_OUTPUT_DIR,
+                        help=f"dossier des résultats du mode batch (défaut : {BATCH_OUTPUT_DIR})")
+    parser.add_argument("--checkpoint", metavar="FICHIER",
+                        help=f"manifeste de reprise (défaut : <output-dir>/{MANIFEST_FILE})")
+    parser.add_argument("--followup", nargs="?", const=METADATA_FILE, metavar="FICHIER",
+                        help="suite d'une recherche précédente, chaînée sur sa réponse OpenAI "
+                             f"(métadonnées lues dans FICHIER, défaut : {METADATA_FILE})")
+    parser.add_argument("--export", metavar="FICHIER",
+                        help="exporter les recherches stockées par l'API (même contenu que GET /export)")
+    parser.add_argument("--format", choices=["ndjson", "csv"],
+                        help="format de l'export (défaut : d'après l'extension de FICHIER, sinon ndjson)")
+    parser.add_argument("--fields", help="champs exportés, séparés par des virgules")
+    parser.add_argument("--subject", help="export : filtre sur le sujet")
+    parser.add_argument("--model", help="export : filtre sur le modèle")
+    parser.add_argument("--since", help="export : date ISO 8601 minimale de création")
+    parser.add_argument("--until", help="export : date ISO 8601 maximale de création")
+    args = parser.parse_args()
+    if args.parallel < 1:
+        parser.error("--parallel doit être supérieur ou égal à 1")
+    if args.followup and args.batch:
+        parser.error("--followup ne s'utilise pas avec --batch")
+    if args.export and (args.batch or args.followup):
+        parser.error("--export ne s'utilise pas avec --batch ni --followup")
+    return args
+
+def main():
+    args = parse_args()
+
+    # L'export ne fait aucun appel à l'API OpenAI
+    if args.export:
+        export_main(args)
+        return
+
+    # Vérifier que la clé API est définie
+    if not API_KEY:
+        print("[ERREUR] La variable d'environnement OPENAI_API_KEY n'est pas définie.", file=sys.stderr)
+        print("Veuillez définir votre clé API OpenAI dans les variables d'environnement.", file=sys.stderr)
+        sys.exit(1)
+
+    if args.batch:
+        batch_main(args)
+        return
+
+    subject_json = load_subject(INPUT_FILE)
+
+    # Messages envoyés au modèle
+    input_messages, compaction = build_input_messages(subject_json)
+    previous_response_id = None
+    if args.followup:
+        previous_response_id, since, lineage = load_followup(args.followup)
+        print(f"[INFO] Suite chaînée sur la réponse {previous_response_id}")
+
+    print("[INFO] Envoi de la requête à l'API...")
+    try:
+        if previous_response_id:
+            response, chained_on = asyncio.run(fetch_response(
+                build_followup_messages(subject_json, since), previous_response_id, input_messages
+            ))
+            # Une suite chaînée n'envoie pas les réponses précédentes
+            extra = {
+                "previous_response_id": chained_on,
+                "lineage": lineage,
+                "context_compaction": None if chained_on else compaction
+            }
+        else:
+            response, _ = asyncio.run(fetch_response(input_messages))
+            extra = {"context_compaction": compaction}
+    except Exception as e:
+        print(f"[ERREUR] Échec de l'appel API : {e}", file=sys.stderr)
+        sys.exit(1)
+
+    save_results(response, OUTPUT_TEXT_FILE, METADATA_FILE, INPUT_FILE, extra)
+
     print(f"[OK] Résultat écrit dans '{OUTPUT_TEXT_FILE}'")
     print(f"[OK] Métadonnées écrites dans '{METADATA_FILE}'")
 
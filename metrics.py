@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Métriques du service au format texte Prometheus (/metrics).
+
+Compteurs, jauges et histogrammes minimalistes, sans dépendance externe.
+Les histogrammes gardent aussi une fenêtre des dernières mesures pour
+résumer les percentiles récents dans /health.
+"""
+
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Bornes (secondes) adaptées à des durées allant de la milliseconde à plusieurs minutes
+DEFAULT_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600
+)
+
+# Nombre de mesures récentes conservées par série pour les percentiles
+RECENT_WINDOW = 500
+
+_registry: List["_Metric"] = []
+
+LabelKey = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelKey, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> LabelKey:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        """Lignes d'exposition de la métrique (hors HELP et TYPE)."""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Valeur croissante, éventuellement par jeu d'étiquettes."""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=(), callback: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[LabelKey, float] = {}
+        self.callback = callback
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        if self.callback is not None:
+            return [f"{self.name} {_format_value(self.callback())}"]
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}"
+                for k, v in self.values.items()]
+
+
+class Gauge(Counter):
+    """Valeur instantanée ; `callback` la calcule au moment de l'export."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        self.values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    """Répartition de durées par tranches cumulées (+ somme et nombre de mesures)."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.series: Dict[LabelKey, dict] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = {
+                "counts": [0] * (len(self.buckets) + 1),
+                "sum": 0.0,
+                "count": 0,
+                "recent": deque(maxlen=RECENT_WINDOW),
+            }
+        series["counts"][bisect_left(self.buckets, value)] += 1
+        series["sum"] += value
+        series["count"] += 1
+        series["recent"].append(value)
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Mesure la durée du bloc, y compris en cas d'exception."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def summary(self) -> Dict[str, dict]:
+        """p50/p95 des mesures récentes de chaque série."""
+        result = {}
+        for key, series in self.series.items():
+            recent = sorted(series["recent"])
+            if not recent:
+                continue
+
+            def pct(fraction):
+                return round(recent[min(len(recent) - 1, int(fraction * len(recent)))], 4)
+
+            name = " ".join(key) or "all"
+            result[name] = {"p50": pct(0.5), "p95": pct(0.95), "count": series["count"]}
+        return result
+
+    def samples(self):
+        lines = []
+        for key, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series["counts"]):
+                cumulative += count
+                le = 'le="' + _format_value(float(bound)) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series['sum'])}")
+            lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+
+class RequestTimingMiddleware:
+    """
+    Middleware ASGI qui mesure chaque requête HTTP jusqu'au dernier fragment
+    du corps envoyé (flux SSE et exports compris), étiquetée par méthode,
+    modèle de route et statut.
+    """
+
+    def __init__(self, app, histogram: "Histogram"):
+        self.app = app
+        self.histogram = histogram
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+        observed = False
+
+        def observe():
+            nonlocal observed
+            if observed:
+                return
+            observed = True
+            route = scope.get("route")
+            self.histogram.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=getattr(route, "path", "inconnue"),
+                status=status
+            )
+
+        async def send_timed(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                observe()
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            # Erreur ou client déconnecté avant la fin du corps
+            observe()
+
+
+def render() -> str:
+    """Toutes les métriques enregistrées, au format d'exposition texte Prometheus."""
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+# Recherches
+research_stage_seconds = Histogram(
+    "research_stage_seconds",
+    "Durée de chaque étape d'une recherche",
+    ("stage",)
+)
+researches_total = Counter(
+    "researches_total",
+    "Recherches terminées, par statut",
+    ("status",)
+)
+openai_tokens_total = Counter(
+    "openai_tokens_total",
+    "Tokens consommés, par type (input, cached_input, output, reasoning)",
+    ("type",)
+)
+web_search_calls = Histogram(
+    "research_web_search_calls",
+    "Nombre d'appels web_search par recherche",
+    buckets=(0, 1, 2, 5, 10, 15, 20, 30, 50)
+)
+
+# Requêtes HTTP
+http_request_seconds = Histogram(
+    "http_request_duration_seconds",
+    "Durée de traitement des requêtes HTTP, par route",
+    ("method", "route", "status")
+)
+
+
+def record_usage(usage):
+    """Ajoute aux compteurs les tokens d'un bloc `usage` de l'API Responses."""
+    if usage is None:
+        return
+    if not isinstance(usage, dict):
+        usage = usage.model_dump()
+    input_details = usage.get("input_tokens_details") or {}
+    output_details = usage.get("output_tokens_details") or {}
+    for token_type, value in (
+        ("input", usage.get("input_tokens")),
+        ("cached_input", input_details.get("cached_tokens")),
+        ("output", usage.get("output_tokens")),
+        ("reasoning", output_details.get("reasoning_tokens")),
+    ):
+        if value:
+            openai_tokens_total.inc(value, type=token_type)
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Migration du dossier outputs/ vers le format de stockage séparé.
+
+Chaque {id}_metadata.json qui contient encore la réponse brute (`output_raw`)
+est réécrit en résumé compact, et la réponse brute est déplacée dans
+{id}_raw.json.gz.
+
+Usage : python migrate_outputs.py [dossier_outputs]
+"""
+
+import sys
+from pathlib import Path
+
+from storage import migrate_metadata_file
+
+
+def main():
+    directory = Path(sys.argv[1]) if len(sys.argv) > 1 else Path("outputs")
+    if not directory.is_dir():
+        print(f"[ERREUR] Dossier '{directory}' introuvable", file=sys.stderr)
+        return 1
+
+    migrated = skipped = failed = 0
+    total_before = total_after = 0
+
+    for metadata_file in sorted(directory.glob("*_metadata.json")):
+        try:
+            result = migrate_metadata_file(metadata_file)
+        except Exception as e:
+            print(f"[ERREUR] {metadata_file.name}: {e}", file=sys.stderr)
+            failed += 1
+            continue
+
+        if result is None:
+            skipped += 1
+            continue
+
+        before, after = result
+        total_before += before
+        total_after += after
+        migrated += 1
+
+    print(f"[OK] {migrated} recherche(s) migrée(s), {skipped} déjà au nouveau format, {failed} en erreur")
+    if migrated:
+        saved = total_before - total_after
+        print(f"[OK] Espace disque : {total_before / 1024:.1f} Ko -> {total_after / 1024:.1f} Ko "
+              f"({saved / 1024:.1f} Ko économisés, {100 * saved / total_before:.0f}%)")
+        print("[INFO] Mettez à jour les tailles du catalogue avec : python catalog.py rebuild")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
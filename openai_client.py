@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Client OpenAI asynchrone partagé par tout le processus.
+
+Le client est construit une seule fois (pool de connexions HTTP keep-alive)
+puis réutilisé par api.py et main.py. Les appels passent par
+`create_response`, qui applique un timeout par appel et un backoff
+exponentiel avec jitter sur les erreurs 429/5xx et les coupures réseau.
+`stream_response` utilise le mode streaming de l'API Responses et relaie
+chaque événement au fur et à mesure.
+
+Chaque tentative réserve d'abord son budget auprès de l'ordonnanceur
+partagé (rate_limiter.scheduler), alimenté par les en-têtes x-ratelimit-*
+et le bloc `usage` des réponses.
+
+Le SDK `openai` (et httpx) n'est importé qu'à la construction du client,
+dans un thread : importer ce module reste quasi gratuit au démarrage, et la
+boucle d'événements n'attend jamais l'import du SDK.
+"""
+
+import asyncio
+import logging
+import os
+import random
+from typing import TYPE_CHECKING, Callable, List, Optional, Tuple
+
+from rate_limiter import Reservation, scheduler
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # ex: serveur local de test
+
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "900"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "10"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "60"))
+
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "5"))
+OPENAI_BACKOFF_BASE = float(os.getenv("OPENAI_BACKOFF_BASE", "1.0"))
+OPENAI_BACKOFF_MAX = float(os.getenv("OPENAI_BACKOFF_MAX", "60"))
+
+# Codes HTTP pour lesquels une nouvelle tentative a du sens
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+# Code d'erreur renvoyé quand `previous_response_id` n'existe plus (expirée, non stockée)
+PREVIOUS_RESPONSE_NOT_FOUND = "previous_response_not_found"
+
+# Consigne du nouveau tour d'une suite chaînée (api.py et main.py)
+FOLLOWUP_INSTRUCTION = (
+    "Nouvelle édition de la veille sur le même sujet. Ne cherche que les nouveautés publiées "
+    "depuis ta réponse précédente (date 'Since') et ne répète pas ce qu'elle couvre déjà. "
+    "S'il n'y a rien de nouveau, dis-le explicitement."
+)
+
+_client: Optional["AsyncOpenAI"] = None
+# Construction en cours du client partagé, attendue par les appels concurrents
+_building: Optional["asyncio.Task"] = None
+
+
+def build_client(
+    api_key: Optional[str] = None,
+    base_url: Optional[str] = None,
+    timeout: float = OPENAI_TIMEOUT,
+    max_connections: int = OPENAI_MAX_CONNECTIONS,
+    max_keepalive_connections: int = OPENAI_MAX_KEEPALIVE,
+    keepalive_expiry: float = OPENAI_KEEPALIVE_EXPIRY
+) -> "AsyncOpenAI":
+    """
+    Construit un client AsyncOpenAI adossé à un pool httpx keep-alive.
+
+    Les retries du SDK sont désactivés : la politique de retry est celle de
+    `create_response`.
+    """
+    import httpx
+    from openai import AsyncOpenAI
+
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        ),
+        timeout=httpx.Timeout(timeout, connect=OPENAI_CONNECT_TIMEOUT)
+    )
+    return AsyncOpenAI(
+        api_key=api_key or API_KEY,
+        base_url=base_url or OPENAI_BASE_URL,
+        timeout=httpx.Timeout(timeout, connect=OPENAI_CONNECT_TIMEOUT),
+        max_retries=0,
+        http_client=http_client
+    )
+
+
+async def get_client() -> "AsyncOpenAI":
+    """
+    Retourne le client partagé, en le construisant dans un thread au premier appel.
+
+    Les appels concurrents attendent la même construction. Un client injecté
+    entre-temps (`set_client`) est conservé et celui construit est fermé.
+    """
+    global _client, _building
+    if _client is not None:
+        return _client
+    if _building is None:
+        _building = asyncio.create_task(asyncio.to_thread(build_client))
+    building = _building
+    try:
+        client = await asyncio.shield(building)
+    finally:
+        if _building is building and building.done():
+            _building = None
+    if _client is None:
+        _client = client
+    elif _client is not client:
+        await client.close()
+    return _client
+
+
+def set_client(client: Optional["AsyncOpenAI"]):
+    """Remplace le client partagé (injection pour les tests ou un serveur local)."""
+    global _client
+    _client = client
+
+
+async def close_client():
+    """Ferme le pool de connexions du client partagé."""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Indique si une erreur de l'API justifie une nouvelle tentative."""
+    from openai import APIConnectionError, APIStatusError, APITimeoutError
+
+    if isinstance(error, (APIConnectionError, APITimeoutError)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+
+def is_previous_response_missing(error: Exception) -> bool:
+    """Indique si l'erreur signale une réponse chaînée introuvable côté OpenAI."""
+    from openai import APIStatusError
+
+    return isinstance(error, APIStatusError) and error.code == PREVIOUS_RESPONSE_NOT_FOUND
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Délai demandé par le serveur via les en-têtes Retry-After, s'il existe."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """
+    Délai avant la tentative `attempt` (0 = premier retry).
+
+    Backoff exponentiel plafonné avec "full jitter" ; un Retry-After fourni
+    par le serveur sert de plancher.
+    """
+    ceiling = min(OPENAI_BACKOFF_MAX, OPENAI_BACKOFF_BASE * (2 ** attempt))
+    delay = random.uniform(0, ceiling)
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, OPENAI_BACKOFF_MAX))
+    return delay
+
+
+async def _create(
+    client: Optional["AsyncOpenAI"],
+    timeout: Optional[float],
+    max_retries: int,
+    **kwargs
+) -> Tuple[object, Reservation]:
+    """Appel cadencé par l'ordonnanceur, avec retries ; retourne (résultat, réservation)."""
+    client = client or await get_client()
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+
+    attempt = 0
+    while True:
+        reservation = await scheduler.acquire()
+        try:
+            raw = await client.responses.with_raw_response.create(**kwargs)
+        except Exception as e:
+            # Rien n'a été consommé : rendre les tokens réservés
+            scheduler.release(reservation)
+            response = getattr(e, "response", None)
+            if response is not None:
+                scheduler.record_headers(response.headers)
+
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt, _retry_after(e))
+            if getattr(e, "status_code", None) == 429:
+                # Limite atteinte : suspendre tous les appels, pas seulement celui-ci
+                scheduler.throttle(delay)
+            logger.warning(
+                "Appel OpenAI échoué (%s), nouvelle tentative %d/%d dans %.1fs",
+                e, attempt + 1, max_retries, delay
+            )
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+
+        scheduler.record_headers(raw.headers)
+        return raw.parse(), reservation
+
+
+async def create_response(
+    client: Optional["AsyncOpenAI"] = None,
+    timeout: Optional[float] = None,
+    max_retries: int = OPENAI_MAX_RETRIES,
+    **kwargs
+):
+    """
+    Appelle `client.responses.create(**kwargs)` avec retries et timeout.
+
+    - **timeout** : timeout de l'appel en secondes (défaut : celui du client)
+    - **max_retries** : nombre de nouvelles tentatives sur erreur transitoire
+    """
+    result, reservation = await _create(client, timeout, max_retries, **kwargs)
+    if not kwargs.get("stream"):
+        scheduler.record_usage(reservation, getattr(result, "usage", None))
+    return result
+
+
+async def stream_response(
+    on_event: Optional[Callable] = None,
+    client: Optional["AsyncOpenAI"] = None,
+    timeout: Optional[float] = None,
+    max_retries: int = OPENAI_MAX_RETRIES,
+    **kwargs
+):
+    """
+    Appelle l'API en mode streaming et retourne la réponse finale.
+
+    Chaque événement reçu est transmis à `on_event` dès son arrivée. Les
+    retries ne s'appliquent qu'à l'ouverture du flux : une coupure en cours
+    de flux est remontée à l'appelant.
+    """
+    stream, reservation = await _create(client, timeout, max_retries, stream=True, **kwargs)
+
+    final_response = None
+    async with stream:
+        async for event in stream:
+            if on_event is not None:
+                on_event(event)
+            if event.type in ("response.completed", "response.incomplete"):
+                final_response = event.response
+            elif event.type == "response.failed":
+                error = getattr(event.response, "error", None)
+                raise RuntimeError(f"Réponse en échec: {getattr(error, 'message', error)}")
+            elif event.type == "error":
+                raise RuntimeError(f"Erreur dans le flux: {event.message}")
+
+    if final_response is None:
+        raise RuntimeError("Flux interrompu avant la fin de la réponse")
+    scheduler.record_usage(reservation, final_response.usage)
+    return final_response
+
+
+def extract_output_text(response) -> str:
+    """Extrait le texte de sortie d'une réponse de l'API Responses."""
+    output_text = getattr(response, "output_text", None)
+    if output_text:
+        return output_text
+
+    fragments = []
+    for item in getattr(response, "output", None) or []:
+        if not isinstance(item, dict):
+            item = item.model_dump()
+        for c in item.get("content") or []:
+            if c.get("type") == "output_text":
+                fragments.append(c.get("text", ""))
+    return "\n\n".join(fragments) if fragments else "[Aucune sortie texte trouvée]"
+
+
+def extract_citations(response) -> List[dict]:
+    """Liste dédupliquée des annotations url_citation du texte de sortie."""
+    if not isinstance(response, dict):
+        response = response.model_dump()
+
+    citations = []
+    seen = set()
+    for item in response.get("output") or []:
+        for c in item.get("content") or []:
+            for annotation in c.get("annotations") or []:
+                if annotation.get("type") != "url_citation":
+                    continue
+                url = annotation.get("url")
+                if not url or url in seen:
+                    continue
+                seen.add(url)
+                citations.append({"url": url, "title": annotation.get("title")})
+    return citations
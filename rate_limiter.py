@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Ordonnanceur des appels OpenAI selon les limites de l'organisation.
+
+Deux seaux à jetons (requêtes par minute et tokens par minute) cadencent les
+appels à `responses.create` au lieu de les laisser échouer en 429. Les seaux
+sont recalés sur les en-têtes x-ratelimit-* renvoyés par l'API, et le coût
+réel de chaque appel (bloc `usage` de la réponse) corrige l'estimation faite
+au moment de la réservation.
+"""
+
+import asyncio
+import os
+import re
+import time
+from collections import deque
+from typing import Mapping, Optional
+
+# Configuration
+OPENAI_RPM_LIMIT = float(os.getenv("OPENAI_RPM_LIMIT", "500"))
+OPENAI_TPM_LIMIT = float(os.getenv("OPENAI_TPM_LIMIT", "1000000"))
+OPENAI_TOKENS_ESTIMATE = float(os.getenv("OPENAI_TOKENS_ESTIMATE", "20000"))
+
+# Poids des nouvelles mesures dans la moyenne mobile du coût d'un appel
+ESTIMATE_SMOOTHING = 0.2
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_reset(value: Optional[str]) -> Optional[float]:
+    """Convertit une durée OpenAI ("6m0s", "1.5s", "20ms") en secondes."""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+class TokenBucket:
+    """Seau à jetons rempli en continu jusqu'à `capacity` sur une minute."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / 60.0
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount: float) -> float:
+        """Secondes avant de disposer de `amount` jetons (0 si disponibles)."""
+        self.refill()
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate) if self.rate > 0 else float("inf")
+
+    def consume(self, amount: float):
+        self.refill()
+        self.tokens -= amount
+
+    def set_limit(self, per_minute: float):
+        self.refill()
+        self.capacity = per_minute
+        self.tokens = min(self.tokens, per_minute)
+
+    def set_remaining(self, remaining: float):
+        """Recale le seau sur le solde annoncé par le serveur (jamais à la hausse)."""
+        self.refill()
+        self.tokens = min(self.tokens, remaining)
+
+
+class Reservation:
+    """Budget réservé pour un appel : tokens estimés et attente subie."""
+
+    def __init__(self, tokens: float, waited: float):
+        self.tokens = tokens
+        self.waited = waited
+
+
+class RateScheduler:
+    """Cadence les appels pour rester sous les limites RPM/TPM."""
+
+    def __init__(
+        self,
+        rpm: float = OPENAI_RPM_LIMIT,
+        tpm: float = OPENAI_TPM_LIMIT,
+        tokens_estimate: float = OPENAI_TOKENS_ESTIMATE
+    ):
+        self.requests = TokenBucket(rpm)
+        self.token_bucket = TokenBucket(tpm)
+        self.tokens_estimate = tokens_estimate
+        self.blocked_until = 0.0
+        self.waiting = 0
+        self.total_calls = 0
+        self.throttled = 0
+        self.waits = deque(maxlen=500)
+        self.last_headers = {}
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def acquire(self, estimated_tokens: Optional[float] = None) -> Reservation:
+        """Attend que le budget permette un appel, puis le réserve (ordre FIFO)."""
+        tokens = estimated_tokens if estimated_tokens is not None else self.tokens_estimate
+        started = time.monotonic()
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        self.waiting += 1
+        try:
+            async with self._lock:
+                while True:
+                    delay = max(
+                        self.blocked_until - time.monotonic(),
+                        self.requests.time_until(1),
+                        self.token_bucket.time_until(tokens)
+                    )
+                    if delay <= 0:
+                        break
+                    await asyncio.sleep(delay)
+                self.requests.consume(1)
+                self.token_bucket.consume(tokens)
+        finally:
+            self.waiting -= 1
+
+        waited = time.monotonic() - started
+        self.total_calls += 1
+        self.waits.append(waited)
+        return Reservation(tokens, waited)
+
+    def release(self, reservation: Reservation):
+        """Rend les tokens d'un appel qui n'a rien consommé (erreur avant traitement)."""
+        self.token_bucket.consume(-reservation.tokens)
+        reservation.tokens = 0
+
+    def record_usage(self, reservation: Reservation, usage) -> None:
+        """Corrige le budget avec le coût réel d'un appel et affine l'estimation."""
+        if usage is None:
+            return
+        if not isinstance(usage, dict):
+            usage = usage.model_dump()
+        actual = usage.get("total_tokens") or (
+            (usage.get("input_tokens") or 0) + (usage.get("output_tokens") or 0)
+        )
+        if not actual:
+            return
+        self.token_bucket.consume(actual - reservation.tokens)
+        reservation.tokens = actual
+        self.tokens_estimate += ESTIMATE_SMOOTHING * (actual - self.tokens_estimate)
+
+    def record_headers(self, headers: Mapping[str, str]):
+        """Recale les seaux sur les en-têtes x-ratelimit-* de l'API."""
+        def number(name):
+            try:
+                return float(headers[name])
+            except (KeyError, TypeError, ValueError):
+                return None
+
+        limit_requests = number("x-ratelimit-limit-requests")
+        limit_tokens = number("x-ratelimit-limit-tokens")
+        if limit_requests:
+            self.requests.set_limit(limit_requests)
+        if limit_tokens:
+            self.token_bucket.set_limit(limit_tokens)
+
+        for bucket, remaining, reset_header in (
+            (self.requests, number("x-ratelimit-remaining-requests"), "x-ratelimit-reset-requests"),
+            (self.token_bucket, number("x-ratelimit-remaining-tokens"), "x-ratelimit-reset-tokens"),
+        ):
+            if remaining is None:
+                continue
+            bucket.set_remaining(remaining)
+            if remaining <= 0:
+                # Budget épuisé côté serveur : attendre sa remise à niveau
+                reset_in = parse_reset(headers.get(reset_header))
+                if reset_in:
+                    self.blocked_until = max(self.blocked_until, time.monotonic() + reset_in)
+
+        self.last_headers = {
+            name: headers[name] for name in headers.keys() if name.lower().startswith("x-ratelimit-")
+        }
+
+    def throttle(self, retry_after: Optional[float]):
+        """Suspend tous les appels après un 429, pendant `retry_after` secondes."""
+        self.throttled += 1
+        if retry_after:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+    def stats(self) -> dict:
+        """Budget courant et temps d'attente récents."""
+        self.requests.refill()
+        self.token_bucket.refill()
+        waits = sorted(self.waits)
+
+        def pct(fraction):
+            if not waits:
+                return 0.0
+            return round(waits[min(len(waits) - 1, int(fraction * len(waits)))], 3)
+
+        return {
+            "requests_per_minute": self.requests.capacity,
+            "requests_available": round(self.requests.tokens, 1),
+            "tokens_per_minute": self.token_bucket.capacity,
+            "tokens_available": round(self.token_bucket.tokens),
+            "tokens_estimate_per_call": round(self.tokens_estimate),
+            "blocked_for_s": round(max(0.0, self.blocked_until - time.monotonic()), 3),
+            "waiting": self.waiting,
+            "calls": self.total_calls,
+            "throttled": self.throttled,
+            "wait_s": {
+                "p50": pct(0.5),
+                "p95": pct(0.95),
+                "max": round(waits[-1], 3) if waits else 0.0,
+            },
+            "last_headers": self.last_headers,
+        }
+
+
+# Ordonnanceur partagé par tout le processus
+scheduler = RateScheduler()
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Choix des paramètres d'une recherche selon un objectif de latence.
+
+Chaque recherche enregistre sa combinaison de paramètres (modèle, effort de
+raisonnement, verbosité, search_context_size) avec sa durée d'appel, ses
+tokens et la taille du rapport. Quand une requête fixe une latence cible
+(`max_latency_s`, ou `mode=fast`), la combinaison la moins chère dont le p90
+historique respecte la cible est choisie. Sans historique suffisant, les
+combinaisons les plus rapides a priori sont essayées d'abord.
+
+Seules les ROUTING_WINDOW dernières exécutions de chaque combinaison sont
+conservées, et les statistiques sont gardées en mémoire quelques secondes
+(ROUTING_STATS_TTL_S) : le choix ne relit pas la table à chaque requête.
+
+Usage : python routing.py stats
+"""
+
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import db
+
+# Configuration
+ROUTING_MODELS = [m.strip() for m in os.getenv("ROUTING_MODELS", "gpt-5-mini,gpt-5").split(",") if m.strip()]
+ROUTING_EFFORTS = ("low", "medium", "high")
+ROUTING_CONTEXT_SIZES = ("low", "medium", "high")
+ROUTING_WINDOW = int(os.getenv("ROUTING_WINDOW", "50"))
+ROUTING_MIN_SAMPLES = int(os.getenv("ROUTING_MIN_SAMPLES", "3"))
+ROUTING_PERCENTILE = 0.9
+ROUTING_STATS_TTL_S = float(os.getenv("ROUTING_STATS_TTL_S", "5"))
+FAST_MODE_LATENCY_S = float(os.getenv("FAST_MODE_LATENCY_S", "30"))
+
+# Réglages fixes de chaque mode (le reste est choisi par le routage)
+MODE_FAST = "fast"
+MODE_DEEP = "deep"
+MODE_PRESETS = {
+    MODE_FAST: {"verbosity": "low"},
+    MODE_DEEP: {"reasoning_effort": "high", "search_context_size": "high", "verbosity": "high"},
+}
+
+# Prix publics en dollars par million de tokens (entrée, sortie)
+MODEL_PRICES = {
+    "gpt-5": (1.25, 10.0),
+    "gpt-5-mini": (0.25, 2.0),
+    "gpt-5-nano": (0.05, 0.40),
+}
+UNKNOWN_MODEL_PRICE = (2.0, 16.0)
+
+# Estimations a priori, avant tout historique
+PRIOR_INPUT_TOKENS = 60000
+PRIOR_OUTPUT_TOKENS = 6000
+EFFORT_FACTOR = {"minimal": 0.4, "low": 0.6, "medium": 1.0, "high": 1.8}
+CONTEXT_FACTOR = {"low": 0.6, "medium": 1.0, "high": 1.5}
+MODEL_SPEED_FACTOR = {"gpt-5-nano": 0.5, "gpt-5-mini": 0.7, "gpt-5": 1.0}
+
+CONFIG_KEYS = ("model", "reasoning_effort", "verbosity", "search_context_size")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS routing_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    model TEXT NOT NULL,
+    reasoning_effort TEXT NOT NULL,
+    verbosity TEXT NOT NULL,
+    search_context_size TEXT NOT NULL,
+    status TEXT NOT NULL,
+    latency_s REAL NOT NULL,
+    input_tokens INTEGER,
+    output_tokens INTEGER,
+    output_chars INTEGER,
+    recorded_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_routing_runs_config
+    ON routing_runs (model, reasoning_effort, verbosity, search_context_size, id DESC);
+"""
+db.register_schema(SCHEMA)
+
+# Dernières statistiques calculées : (expiration monotonic, fenêtre, statistiques)
+_stats_cache: Optional[Tuple[float, int, Dict[Tuple[str, ...], dict]]] = None
+
+
+def record(config: dict, latency_s: float, usage: Optional[dict] = None, output_chars: int = 0, status: str = "completed"):
+    """
+    Enregistre une exécution ; une recherche expirée compte avec sa durée atteinte.
+
+    Les exécutions de la combinaison au-delà des ROUTING_WINDOW dernières
+    sont supprimées dans la même transaction.
+    """
+    global _stats_cache
+    usage = usage or {}
+    key = [config[k] for k in CONFIG_KEYS]
+    with db.transaction() as conn:
+        conn.execute(
+            "INSERT INTO routing_runs (model, reasoning_effort, verbosity, search_context_size, status, "
+            "latency_s, input_tokens, output_tokens, output_chars, recorded_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            key + [
+                status, latency_s, usage.get("input_tokens"), usage.get("output_tokens"), output_chars, time.time()
+            ]
+        )
+        same_config = "model = ? AND reasoning_effort = ? AND verbosity = ? AND search_context_size = ?"
+        conn.execute(
+            f"DELETE FROM routing_runs WHERE {same_config} AND id <= ("
+            f"SELECT id FROM routing_runs WHERE {same_config} ORDER BY id DESC LIMIT 1 OFFSET ?)",
+            key + key + [ROUTING_WINDOW]
+        )
+    _stats_cache = None
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _key(config: dict) -> Tuple[str, ...]:
+    return tuple(config[k] for k in CONFIG_KEYS)
+
+
+def stats(window: int = ROUTING_WINDOW) -> Dict[Tuple[str, ...], dict]:
+    """Statistiques des `window` dernières exécutions de chaque combinaison (en cache ROUTING_STATS_TTL_S)."""
+    global _stats_cache
+    if _stats_cache is not None and _stats_cache[0] > time.monotonic() and _stats_cache[1] == window:
+        return _stats_cache[2]
+    result = _compute_stats(window)
+    _stats_cache = (time.monotonic() + ROUTING_STATS_TTL_S, window, result)
+    return result
+
+
+def _compute_stats(window: int) -> Dict[Tuple[str, ...], dict]:
+    rows = db.get_connection().execute(
+        "SELECT * FROM (SELECT *, ROW_NUMBER() OVER ("
+        "PARTITION BY model, reasoning_effort, verbosity, search_context_size ORDER BY id DESC) AS rank "
+        "FROM routing_runs) WHERE rank <= ?",
+        (window,)
+    ).fetchall()
+
+    grouped: Dict[Tuple[str, ...], List] = {}
+    for row in rows:
+        grouped.setdefault(_key(row), []).append(row)
+
+    result = {}
+    for key, runs in grouped.items():
+        latencies = [r["latency_s"] for r in runs]
+        completed = [r for r in runs if r["status"] == "completed"]
+
+        def mean(column):
+            values = [r[column] for r in completed if r[column] is not None]
+            return sum(values) / len(values) if values else None
+
+        result[key] = {
+            **dict(zip(CONFIG_KEYS, key)),
+            "samples": len(runs),
+            "timed_out": sum(1 for r in runs if r["status"] != "completed"),
+            "latency_p50_s": round(_percentile(latencies, 0.5), 3),
+            "latency_p90_s": round(_percentile(latencies, ROUTING_PERCENTILE), 3),
+            "input_tokens_avg": mean("input_tokens"),
+            "output_tokens_avg": mean("output_tokens"),
+            "output_chars_avg": mean("output_chars"),
+        }
+    return result
+
+
+def estimated_cost(config: dict, observed: Optional[dict] = None) -> float:
+    """Coût estimé d'une recherche en dollars, d'après l'historique ou a priori."""
+    price_in, price_out = MODEL_PRICES.get(config["model"], UNKNOWN_MODEL_PRICE)
+    if observed and observed.get("input_tokens_avg") is not None:
+        input_tokens = observed["input_tokens_avg"]
+        output_tokens = observed["output_tokens_avg"] or 0
+    else:
+        input_tokens = PRIOR_INPUT_TOKENS * CONTEXT_FACTOR.get(config["search_context_size"], 1.0)
+        output_tokens = PRIOR_OUTPUT_TOKENS * EFFORT_FACTOR.get(config["reasoning_effort"], 1.0)
+    return (input_tokens * price_in + output_tokens * price_out) / 1_000_000
+
+
+def _prior_slowness(config: dict) -> float:
+    return (
+        MODEL_SPEED_FACTOR.get(config["model"], 1.0)
+        * EFFORT_FACTOR.get(config["reasoning_effort"], 1.0)
+        * CONTEXT_FACTOR.get(config["search_context_size"], 1.0)
+    )
+
+
+def candidates(verbosity: str, fixed: Optional[dict] = None) -> List[dict]:
+    """Combinaisons envisageables, en respectant les paramètres imposés par la requête."""
+    fixed = fixed or {}
+    models = [fixed["model"]] if fixed.get("model") else ROUTING_MODELS
+    efforts = [fixed["reasoning_effort"]] if fixed.get("reasoning_effort") else ROUTING_EFFORTS
+    contexts = [fixed["search_context_size"]] if fixed.get("search_context_size") else ROUTING_CONTEXT_SIZES
+    return [
+        {"model": m, "reasoning_effort": e, "verbosity": verbosity, "search_context_size": c}
+        for m in models for e in efforts for c in contexts
+    ]
+
+
+def choose(max_latency_s: float, verbosity: str, fixed: Optional[dict] = None) -> Tuple[dict, dict]:
+    """
+    Combinaison la moins chère dont le p90 historique tient en `max_latency_s`.
+
+    Retourne (paramètres, décision). À défaut, la combinaison la plus rapide
+    a priori parmi celles encore peu mesurées est essayée (exploration), tant
+    qu'elle s'annonce plus rapide que celles déjà mesurées ; sinon la plus
+    rapide mesurée est retenue (meilleur effort).
+    """
+    history = stats()
+    options = []
+    for config in candidates(verbosity, fixed):
+        observed = history.get(_key(config))
+        options.append((config, observed, estimated_cost(config, observed)))
+
+    measured = [o for o in options if o[1] and o[1]["samples"] >= ROUTING_MIN_SAMPLES]
+    qualified = [o for o in measured if o[1]["latency_p90_s"] <= max_latency_s]
+    if qualified:
+        config, observed, cost = min(qualified, key=lambda o: o[2])
+        reason = "historique"
+    else:
+        # N'explorer que ce qui est a priori plus rapide que les combinaisons déjà trop lentes
+        fastest_measured = min((_prior_slowness(o[0]) for o in measured), default=float("inf"))
+        unexplored = [o for o in options if o not in measured and _prior_slowness(o[0]) < fastest_measured]
+        if unexplored:
+            config, observed, cost = min(unexplored, key=lambda o: (_prior_slowness(o[0]), o[2]))
+            reason = "exploration"
+        else:
+            config, observed, cost = min(measured, key=lambda o: o[1]["latency_p90_s"])
+            reason = "meilleur effort"
+
+    decision = {
+        "max_latency_s": max_latency_s,
+        "reason": reason,
+        "expected_p90_s": observed["latency_p90_s"] if observed else None,
+        "samples": observed["samples"] if observed else 0,
+        "estimated_cost_usd": round(cost, 5),
+        "config": config,
+    }
+    return config, decision
+
+
+def resolve(
+    defaults: dict,
+    overrides: dict,
+    mode: Optional[str] = None,
+    max_latency_s: Optional[float] = None
+) -> Tuple[dict, Optional[dict]]:
+    """
+    Paramètres d'une recherche : valeurs de la requête, puis mode, puis routage.
+
+    `defaults` et `overrides` contiennent les clés de CONFIG_KEYS (valeurs
+    None dans `overrides` pour les paramètres non imposés). Sans mode ni
+    latence cible, ce sont les valeurs par défaut qui s'appliquent.
+    Retourne (paramètres, décision de routage ou None).
+    """
+    fixed = {k: v for k, v in overrides.items() if v}
+    preset = MODE_PRESETS.get(mode, {})
+    if mode == MODE_FAST and max_latency_s is None:
+        max_latency_s = FAST_MODE_LATENCY_S
+
+    if max_latency_s is None:
+        config = {k: fixed.get(k) or preset.get(k) or defaults[k] for k in CONFIG_KEYS}
+        return config, ({"mode": mode, "config": config} if mode else None)
+
+    verbosity = fixed.get("verbosity") or preset.get("verbosity") or defaults["verbosity"]
+    # Le mode fixe ses réglages ; la requête garde le dernier mot
+    config, decision = choose(max_latency_s, verbosity, {**preset, **fixed})
+    return config, {"mode": mode, **decision}
+
+
+def table() -> List[dict]:
+    """Statistiques de toutes les combinaisons mesurées, avec leur coût estimé."""
+    rows = []
+    for observed in stats().values():
+        rows.append({**observed, "estimated_cost_usd": round(estimated_cost(observed, observed), 5)})
+    return sorted(rows, key=lambda r: (r["latency_p90_s"], r["estimated_cost_usd"]))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "stats":
+        print("Usage : python routing.py stats", file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(table(), ensure_ascii=False, indent=2))
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Recherche plein texte dans les recherches stockées (SQLite FTS5).
+
+L'index inversé couvre le sujet et le texte du rapport. Il est mis à jour à
+chaque écriture et suppression, et peut être reconstruit depuis outputs/.
+Les résultats sont classés par pertinence (bm25, le sujet pesant plus que le
+texte) avec un extrait surligné.
+
+Usage : python search_index.py rebuild [dossier_outputs]
+"""
+
+import json
+import re
+import sqlite3
+import sys
+from pathlib import Path
+from typing import List, Tuple
+
+import db
+import segments
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_docs (
+    doc_id INTEGER PRIMARY KEY,
+    research_id TEXT NOT NULL UNIQUE
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(
+    subject,
+    content,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+db.register_schema(SCHEMA)
+
+MAX_PAGE_SIZE = 100
+
+# Poids bm25 des colonnes (subject, content)
+SUBJECT_WEIGHT = 5.0
+CONTENT_WEIGHT = 1.0
+
+SNIPPET_TOKENS = 24
+HIGHLIGHT = ("<mark>", "</mark>")
+
+_TERM = re.compile(r"\w+\*?")
+_HEADER_END = "=" * 80
+
+
+def strip_header(text: str) -> str:
+    """Retire l'en-tête ajouté par storage.write_research (date, sujet, séparateur)."""
+    if text.startswith("--- Résultat généré") and _HEADER_END in text:
+        return text.split(_HEADER_END, 1)[1].lstrip("\n")
+    return text
+
+
+def build_query(q: str) -> str:
+    """
+    Convertit une saisie libre en requête FTS5 sûre : tous les mots doivent
+    apparaître, un mot terminé par * est un préfixe.
+    """
+    terms = []
+    for term in _TERM.findall(q or ""):
+        prefix = term.endswith("*")
+        word = term.rstrip("*")
+        if word:
+            terms.append(f'"{word}"' + ("*" if prefix else ""))
+    if not terms:
+        raise ValueError("Requête de recherche vide")
+    return " AND ".join(terms)
+
+
+def _delete(conn, research_id: str):
+    row = conn.execute("SELECT doc_id FROM search_docs WHERE research_id = ?", (research_id,)).fetchone()
+    if row is not None:
+        conn.execute("DELETE FROM search_fts WHERE rowid = ?", (row["doc_id"],))
+        conn.execute("DELETE FROM search_docs WHERE doc_id = ?", (row["doc_id"],))
+
+
+def _insert(conn, research_id: str, subject: str, content: str):
+    doc_id = conn.execute("INSERT INTO search_docs (research_id) VALUES (?)", (research_id,)).lastrowid
+    conn.execute(
+        "INSERT INTO search_fts (rowid, subject, content) VALUES (?, ?, ?)",
+        (doc_id, subject or "", content or "")
+    )
+
+
+def index(research_id: str, subject: str, output_text: str):
+    """Ajoute ou remplace une recherche dans l'index."""
+    with db.transaction() as conn:
+        _delete(conn, research_id)
+        _insert(conn, research_id, subject, output_text)
+
+
+def remove(research_id: str):
+    with db.transaction() as conn:
+        _delete(conn, research_id)
+
+
+def search(q: str, limit: int = 20, offset: int = 0) -> Tuple[List[dict], int]:
+    """
+    Recherches correspondant à `q`, les plus pertinentes d'abord.
+
+    Retourne (résultats, nombre total de correspondances).
+    """
+    query = build_query(q)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    conn = db.get_connection()
+    try:
+        total = conn.execute(
+            "SELECT COUNT(*) FROM search_fts WHERE search_fts MATCH ?", (query,)
+        ).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT d.research_id, r.created_at, r.model, "
+            f"highlight(search_fts, 0, ?, ?) AS subject, "
+            f"snippet(search_fts, 1, ?, ?, '…', {SNIPPET_TOKENS}) AS snippet, "
+            f"bm25(search_fts, {SUBJECT_WEIGHT}, {CONTENT_WEIGHT}) AS rank "
+            f"FROM search_fts "
+            f"JOIN search_docs d ON d.doc_id = search_fts.rowid "
+            f"LEFT JOIN researches r ON r.research_id = d.research_id "
+            f"WHERE search_fts MATCH ? ORDER BY rank LIMIT ? OFFSET ?",
+            (*HIGHLIGHT, *HIGHLIGHT, query, limit, offset)
+        ).fetchall()
+    except sqlite3.OperationalError as e:
+        raise ValueError(f"Requête de recherche invalide : {e}")
+
+    results = []
+    for row in rows:
+        entry = dict(row)
+        entry["score"] = round(-entry.pop("rank"), 4)
+        results.append(entry)
+    return results, total
+
+
+def is_empty() -> bool:
+    return db.get_connection().execute("SELECT 1 FROM search_docs LIMIT 1").fetchone() is None
+
+
+def rebuild(output_dir: Path, merge: bool = False) -> int:
+    """
+    Reconstruit entièrement l'index depuis les fichiers de `output_dir` et les segments.
+
+    Avec `merge`, rien n'est supprimé : seules les recherches absentes de
+    l'index sont ajoutées. Retourne le nombre de recherches indexées.
+    """
+    documents = []
+    for metadata_file in Path(output_dir).glob("*_metadata.json"):
+        try:
+            with open(metadata_file, "r", encoding="utf-8") as f:
+                metadata = json.load(f)
+            research_id = metadata.get("research_id")
+            if not research_id:
+                continue
+            output_file = Path(output_dir) / f"{research_id}_output.txt"
+            with open(output_file, "r", encoding="utf-8") as f:
+                content = strip_header(f.read())
+        except (OSError, ValueError):
+            continue
+        documents.append((research_id, metadata.get("subject"), content))
+
+    # Recherches déplacées dans les segments compactés
+    loose = {document[0] for document in documents}
+    for research_id, contents in segments.iter_packed(("metadata", "output")):
+        if research_id in loose or "output" not in contents:
+            continue
+        metadata = json.loads(contents["metadata"].decode("utf-8"))
+        documents.append((research_id, metadata.get("subject"), strip_header(contents["output"].decode("utf-8"))))
+
+    added = 0
+    with db.transaction() as conn:
+        if not merge:
+            conn.execute("DELETE FROM search_fts")
+            conn.execute("DELETE FROM search_docs")
+        for document in documents:
+            if merge and conn.execute(
+                "SELECT 1 FROM search_docs WHERE research_id = ?", (document[0],)
+            ).fetchone() is not None:
+                continue
+            _insert(conn, *document)
+            added += 1
+        # Fusionner les segments de l'index pour des requêtes plus rapides
+        conn.execute("INSERT INTO search_fts (search_fts) VALUES ('optimize')")
+    return added
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        print("Usage : python search_index.py rebuild [dossier_outputs]", file=sys.stderr)
+        sys.exit(1)
+    directory = Path(sys.argv[2]) if len(sys.argv) > 2 else Path("outputs")
+    total = rebuild(directory)
+    print(f"[OK] Index de recherche reconstruit : {total} recherches indexées dans '{db.DB_PATH}'")
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Segments compactés : stockage des recherches anciennes dans des fichiers
+d'archive en ajout seul.
+
+Au lieu de trois petits fichiers par recherche dans outputs/, les artefacts
+(métadonnées, rapport, réponse brute compressée) sont ajoutés à la suite
+dans outputs/segments/seg-NNNNNN.pack. Un index SQLite donne, pour chaque
+recherche et chaque artefact, le segment, la position et la longueur : une
+lecture par identifiant est un seek + read.
+
+Chaque enregistrement est précédé d'un en-tête (MAGIC, longueur, JSON
+{research_id, kind, length}) pour rester identifiable dans le fichier. Les
+artefacts supprimés ne sont retirés que de l'index ; la place est récupérée
+en recopiant les artefacts vivants d'un segment peu rempli vers le segment
+actif, puis en supprimant l'ancien fichier (voir compaction.py).
+
+Un seul processus écrit à la fois dans les segments (verrou de compaction) ;
+les lectures sont possibles à tout moment.
+"""
+
+import json
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import db
+
+# Configuration
+SEGMENT_DIR = Path(os.getenv("SEGMENT_DIR", os.path.join(os.getenv("OUTPUT_DIR", "outputs"), "segments")))
+SEGMENT_MAX_BYTES = int(os.getenv("SEGMENT_MAX_BYTES", str(64 * 1024 * 1024)))
+
+MAGIC = b"AINS"
+KINDS = ("metadata", "output", "raw")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    name TEXT PRIMARY KEY,
+    size INTEGER NOT NULL DEFAULT 0,
+    live_bytes INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS segment_entries (
+    research_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    segment TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    record_size INTEGER NOT NULL,
+    packed_at REAL NOT NULL,
+    PRIMARY KEY (research_id, kind)
+);
+CREATE INDEX IF NOT EXISTS idx_segment_entries_segment ON segment_entries (segment);
+"""
+db.register_schema(SCHEMA)
+
+
+def configure(path):
+    """Change le dossier des segments (tests, benchmarks)."""
+    global SEGMENT_DIR
+    SEGMENT_DIR = Path(path)
+
+
+def _record(research_id: str, kind: str, payload: bytes) -> Tuple[bytes, int]:
+    """Enregistrement sérialisé et position du contenu dans l'enregistrement."""
+    header = json.dumps(
+        {"research_id": research_id, "kind": kind, "length": len(payload)}, separators=(",", ":")
+    ).encode("utf-8")
+    prefix = MAGIC + struct.pack(">I", len(header)) + header
+    return prefix + payload, len(prefix)
+
+
+def _active_segment(conn) -> Tuple[str, int]:
+    """Segment ouvert à l'écriture (le dernier, s'il n'est pas plein)."""
+    row = conn.execute("SELECT name, size FROM segments ORDER BY name DESC LIMIT 1").fetchone()
+    if row is not None and row["size"] < SEGMENT_MAX_BYTES:
+        return row["name"], row["size"]
+    number = int(row["name"][4:10]) + 1 if row is not None else 1
+    name = f"seg-{number:06d}.pack"
+    conn.execute("INSERT INTO segments (name, size, live_bytes, created_at) VALUES (?, 0, 0, ?)", (name, time.time()))
+    return name, 0
+
+
+def active_segment() -> Optional[str]:
+    row = db.get_connection().execute("SELECT name FROM segments ORDER BY name DESC LIMIT 1").fetchone()
+    return row["name"] if row else None
+
+
+def write(items: Iterable[Tuple[str, str, bytes]], moved_from: Optional[str] = None) -> int:
+    """
+    Ajoute des artefacts (research_id, kind, contenu) au segment actif.
+
+    Les données sont écrites et synchronisées sur disque avant la mise à
+    jour de l'index, en une seule transaction : un lecteur voit soit
+    l'ancienne position, soit la nouvelle. Un artefact déjà indexé est
+    remplacé (l'ancien enregistrement devient de la place perdue).
+
+    Avec `moved_from` (recopie d'un segment), seuls les artefacts encore
+    indexés dans ce segment sont déplacés : une recherche supprimée pendant
+    la copie n'est pas recréée. Retourne le nombre d'octets écrits. À
+    n'appeler que sous le verrou de compaction.
+    """
+    SEGMENT_DIR.mkdir(parents=True, exist_ok=True)
+    conn = db.get_connection()
+    with db.transaction():
+        name, size = _active_segment(conn)
+
+    entries, written = [], 0
+    handle = open(SEGMENT_DIR / name, "ab")
+    try:
+        handle.seek(0, os.SEEK_END)
+        size = handle.tell()
+        for research_id, kind, payload in items:
+            if size >= SEGMENT_MAX_BYTES:
+                # Segment plein : le clore et passer au suivant
+                handle.flush()
+                os.fsync(handle.fileno())
+                handle.close()
+                with db.transaction():
+                    conn.execute("UPDATE segments SET size = ? WHERE name = ?", (size, name))
+                    name, _ = _active_segment(conn)
+                handle = open(SEGMENT_DIR / name, "ab")
+                size = 0
+            record, payload_offset = _record(research_id, kind, payload)
+            handle.write(record)
+            entries.append((research_id, kind, name, size + payload_offset, len(payload), len(record)))
+            size += len(record)
+            written += len(record)
+        handle.flush()
+        os.fsync(handle.fileno())
+    finally:
+        handle.close()
+
+    now = time.time()
+    with db.transaction():
+        conn.execute("UPDATE segments SET size = ? WHERE name = ?", (size, name))
+        for research_id, kind, segment, offset, length, record_size in entries:
+            previous = conn.execute(
+                "SELECT segment, record_size FROM segment_entries WHERE research_id = ? AND kind = ?",
+                (research_id, kind)
+            ).fetchone()
+            if moved_from is not None and (previous is None or previous["segment"] != moved_from):
+                # Supprimé (ou déplacé) depuis la lecture : la copie reste de la place perdue
+                continue
+            if previous is not None:
+                conn.execute(
+                    "UPDATE segments SET live_bytes = live_bytes - ? WHERE name = ?",
+                    (previous["record_size"], previous["segment"])
+                )
+            conn.execute(
+                "INSERT OR REPLACE INTO segment_entries "
+                "(research_id, kind, segment, offset, length, record_size, packed_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (research_id, kind, segment, offset, length, record_size, now)
+            )
+            conn.execute(
+                "UPDATE segments SET live_bytes = live_bytes + ? WHERE name = ?", (record_size, segment)
+            )
+    return written
+
+
+def entries(research_id: str) -> Dict[str, dict]:
+    """Position de chaque artefact d'une recherche compactée ({} si elle ne l'est pas)."""
+    rows = db.get_connection().execute(
+        "SELECT * FROM segment_entries WHERE research_id = ?", (research_id,)
+    ).fetchall()
+    return {row["kind"]: dict(row) for row in rows}
+
+
+def is_packed(research_id: str) -> bool:
+    return db.get_connection().execute(
+        "SELECT 1 FROM segment_entries WHERE research_id = ? AND kind = 'metadata'", (research_id,)
+    ).fetchone() is not None
+
+
+def read(research_id: str, kind: str) -> Optional[bytes]:
+    """Contenu d'un artefact compacté, ou None."""
+    for _ in range(2):
+        row = db.get_connection().execute(
+            "SELECT segment, offset, length FROM segment_entries WHERE research_id = ? AND kind = ?",
+            (research_id, kind)
+        ).fetchone()
+        if row is None:
+            return None
+        try:
+            with open(SEGMENT_DIR / row["segment"], "rb") as f:
+                f.seek(row["offset"])
+                return f.read(row["length"])
+        except FileNotFoundError:
+            # Segment recopié et supprimé entre-temps : relire la nouvelle position
+            continue
+    return None
+
+
+def remove(research_id: str) -> bool:
+    """Retire une recherche de l'index ; la place est récupérée par `reclaim`."""
+    with db.transaction() as conn:
+        rows = conn.execute(
+            "SELECT segment, record_size FROM segment_entries WHERE research_id = ?", (research_id,)
+        ).fetchall()
+        for row in rows:
+            conn.execute(
+                "UPDATE segments SET live_bytes = live_bytes - ? WHERE name = ?",
+                (row["record_size"], row["segment"])
+            )
+        conn.execute("DELETE FROM segment_entries WHERE research_id = ?", (research_id,))
+    return bool(rows)
+
+
+def iter_packed(kinds: Tuple[str, ...] = KINDS) -> Iterator[Tuple[str, Dict[str, bytes]]]:
+    """Parcourt les recherches compactées : (research_id, {kind: contenu})."""
+    research_ids = [row[0] for row in db.get_connection().execute(
+        "SELECT research_id FROM segment_entries WHERE kind = 'metadata'"
+    ).fetchall()]
+    for research_id in research_ids:
+        contents = {}
+        for kind in kinds:
+            data = read(research_id, kind)
+            if data is not None:
+                contents[kind] = data
+        if "metadata" in contents or "metadata" not in kinds:
+            yield research_id, contents
+
+
+def reclaim(min_live_ratio: float) -> Tuple[int, int]:
+    """
+    Recopie les artefacts vivants des segments trop peu remplis puis supprime
+    ces segments. Retourne (segments supprimés, octets récupérés).
+    À n'appeler que sous le verrou de compaction.
+    """
+    active = active_segment()
+    candidates = db.get_connection().execute(
+        "SELECT name, size, live_bytes FROM segments WHERE name != ? AND (size = 0 OR live_bytes < ? * size)",
+        (active, min_live_ratio)
+    ).fetchall()
+
+    removed = reclaimed = 0
+    for segment in candidates:
+        live = db.get_connection().execute(
+            "SELECT research_id, kind FROM segment_entries WHERE segment = ?", (segment["name"],)
+        ).fetchall()
+        items = []
+        for row in live:
+            data = read(row["research_id"], row["kind"])
+            if data is not None:
+                items.append((row["research_id"], row["kind"], data))
+        if items:
+            write(items, moved_from=segment["name"])
+
+        with db.transaction() as conn:
+            if conn.execute(
+                "SELECT 1 FROM segment_entries WHERE segment = ? LIMIT 1", (segment["name"],)
+            ).fetchone() is not None:
+                continue
+            conn.execute("DELETE FROM segments WHERE name = ?", (segment["name"],))
+        try:
+            os.unlink(SEGMENT_DIR / segment["name"])
+        except FileNotFoundError:
+            pass
+        removed += 1
+        reclaimed += segment["size"] - segment["live_bytes"]
+    return removed, reclaimed
+
+
+def stats() -> dict:
+    """Taille des segments, part vivante et nombre de recherches compactées."""
+    conn = db.get_connection()
+    totals = conn.execute(
+        "SELECT COUNT(*) AS segments, COALESCE(SUM(size), 0) AS size, COALESCE(SUM(live_bytes), 0) AS live "
+        "FROM segments"
+    ).fetchone()
+    packed = conn.execute("SELECT COUNT(*) FROM segment_entries WHERE kind = 'metadata'").fetchone()[0]
+    return {
+        "directory": str(SEGMENT_DIR),
+        "segments": totals["segments"],
+        "bytes": totals["size"],
+        "live_bytes": totals["live"],
+        "dead_bytes": totals["size"] - totals["live"],
+        "researches": packed,
+        "max_segment_bytes": SEGMENT_MAX_BYTES,
+    }
+
+
+def list_segments() -> List[dict]:
+    rows = db.get_connection().execute("SELECT * FROM segments ORDER BY name").fetchall()
+    return [dict(row) for row in rows]
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Index des sources consultées et citées par les recherches.
+
+Chaque réponse contient des annotations url_citation (sources citées dans le
+rapport) et les résultats des appels web_search (sources récupérées). Ils sont
+extraits à l'écriture dans une table normalisée et dédupliquée, ce qui permet
+de savoir quelles recherches ont cité une URL ou un domaine sans relire les
+réponses brutes.
+
+Usage : python sources.py rebuild [dossier_outputs]
+"""
+
+import gzip
+import json
+import sys
+from pathlib import Path
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import db
+import segments
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    research_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    title TEXT,
+    cited INTEGER NOT NULL DEFAULT 0,
+    retrieved INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (research_id, url)
+);
+CREATE INDEX IF NOT EXISTS idx_sources_domain ON sources (domain, cited);
+CREATE INDEX IF NOT EXISTS idx_sources_url ON sources (url);
+"""
+db.register_schema(SCHEMA)
+
+COLUMNS = ("research_id", "url", "domain", "title", "cited", "retrieved")
+
+MAX_PAGE_SIZE = 500
+
+
+def normalize_url(url: str) -> str:
+    """URL canonique : hôte en minuscules, sans fragment ni paramètres de suivi utm_*."""
+    parts = urlsplit(url.strip())
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not k.startswith("utm_")]
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, urlencode(query), ""))
+
+
+def domain_of(url: str) -> str:
+    host = urlsplit(url).hostname or ""
+    return host[4:] if host.startswith("www.") else host
+
+
+def extract_sources(raw: dict) -> List[dict]:
+    """Sources dédupliquées d'une réponse brute, marquées citées et/ou récupérées."""
+    found = {}
+
+    def add(url, title=None, cited=False, retrieved=False):
+        if not url:
+            return
+        url = normalize_url(url)
+        entry = found.setdefault(url, {
+            "url": url,
+            "domain": domain_of(url),
+            "title": None,
+            "cited": 0,
+            "retrieved": 0,
+        })
+        entry["title"] = entry["title"] or title
+        entry["cited"] |= int(cited)
+        entry["retrieved"] |= int(retrieved)
+
+    for item in (raw or {}).get("output") or []:
+        if item.get("type") == "web_search_call":
+            action = item.get("action") or {}
+            for source in action.get("sources") or []:
+                add(source.get("url"), retrieved=True)
+            # open_page / find_in_page : page consultée directement
+            add(action.get("url"), retrieved=True)
+        for content in item.get("content") or []:
+            for annotation in content.get("annotations") or []:
+                if annotation.get("type") == "url_citation":
+                    add(annotation.get("url"), title=annotation.get("title"), cited=True)
+
+    return list(found.values())
+
+
+def index(research_id: str, raw: Optional[dict]) -> int:
+    """(Ré)indexe les sources d'une recherche ; retourne le nombre de sources."""
+    entries = extract_sources(raw)
+    with db.transaction() as conn:
+        conn.execute("DELETE FROM sources WHERE research_id = ?", (research_id,))
+        conn.executemany(
+            f"INSERT INTO sources ({', '.join(COLUMNS)}) VALUES ({', '.join('?' for _ in COLUMNS)})",
+            [[research_id] + [e[c] for c in COLUMNS[1:]] for e in entries]
+        )
+    return len(entries)
+
+
+def remove(research_id: str):
+    with db.transaction() as conn:
+        conn.execute("DELETE FROM sources WHERE research_id = ?", (research_id,))
+
+
+def for_research(research_id: str, cited_only: bool = False) -> List[dict]:
+    """Sources d'une recherche, les citées en premier."""
+    where = "research_id = ?" + (" AND cited = 1" if cited_only else "")
+    rows = db.get_connection().execute(
+        f"SELECT url, domain, title, cited, retrieved FROM sources WHERE {where} "
+        f"ORDER BY cited DESC, domain, url",
+        (research_id,)
+    ).fetchall()
+    return [_to_dict(r) for r in rows]
+
+
+def _to_dict(row) -> dict:
+    entry = dict(row)
+    entry["cited"] = bool(entry["cited"])
+    entry["retrieved"] = bool(entry["retrieved"])
+    return entry
+
+
+def _filters(
+    domain: Optional[str] = None,
+    url: Optional[str] = None,
+    cited_only: bool = False
+) -> Tuple[List[str], list]:
+    clauses, params = [], []
+    if domain:
+        # Le domaine inclut ses sous-domaines : "europa.eu" trouve "digital-strategy.ec.europa.eu"
+        domain = domain.lower().removeprefix("www.")
+        clauses.append("(s.domain = ? OR s.domain LIKE ? ESCAPE '\\')")
+        escaped = domain.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        params.extend([domain, f"%.{escaped}"])
+    if url:
+        clauses.append("s.url = ?")
+        params.append(normalize_url(url))
+    if cited_only:
+        clauses.append("s.cited = 1")
+    return clauses, params
+
+
+def count(**filters) -> int:
+    clauses, params = _filters(**filters)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return db.get_connection().execute(
+        f"SELECT COUNT(*) FROM sources s {where}", params
+    ).fetchone()[0]
+
+
+def search(limit: int = 50, offset: int = 0, **filters) -> List[dict]:
+    """Occurrences de sources avec la recherche correspondante, les plus récentes d'abord."""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    clauses, params = _filters(**filters)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = db.get_connection().execute(
+        f"SELECT s.research_id, r.subject, r.created_at, s.url, s.domain, s.title, s.cited, s.retrieved "
+        f"FROM sources s LEFT JOIN researches r ON r.research_id = s.research_id {where} "
+        f"ORDER BY r.created_at DESC, s.research_id DESC, s.url LIMIT ? OFFSET ?",
+        params + [limit, offset]
+    ).fetchall()
+    return [_to_dict(r) for r in rows]
+
+
+def top_domains(limit: int = 50, cited_only: bool = False) -> List[dict]:
+    """Domaines les plus fréquents, avec le nombre de recherches qui les citent."""
+    where = "WHERE cited = 1" if cited_only else ""
+    rows = db.get_connection().execute(
+        f"SELECT domain, COUNT(DISTINCT research_id) AS researches, "
+        f"SUM(cited) AS citations, COUNT(*) AS urls "
+        f"FROM sources {where} GROUP BY domain ORDER BY researches DESC, citations DESC LIMIT ?",
+        (max(1, min(limit, MAX_PAGE_SIZE)),)
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def is_empty() -> bool:
+    return db.get_connection().execute("SELECT 1 FROM sources LIMIT 1").fetchone() is None
+
+
+def _load_raw(metadata_file: Path, metadata: dict) -> Optional[dict]:
+    raw_file = metadata_file.with_name(f"{metadata['research_id']}_raw.json.gz")
+    try:
+        with gzip.open(raw_file, "rb") as f:
+            return json.loads(f.read().decode("utf-8"))
+    except FileNotFoundError:
+        return metadata.get("output_raw")
+
+
+def rebuild(output_dir: Path, merge: bool = False) -> Tuple[int, int]:
+    """
+    Réindexe toutes les recherches de `output_dir` et des segments ; retourne (recherches, sources).
+
+    Avec `merge`, rien n'est supprimé et les sources déjà indexées sont gardées.
+    """
+    researches = total = 0
+    rows, loose = [], set()
+    for metadata_file in Path(output_dir).glob("*_metadata.json"):
+        try:
+            with open(metadata_file, "r", encoding="utf-8") as f:
+                metadata = json.load(f)
+            if not metadata.get("research_id"):
+                continue
+            raw = _load_raw(metadata_file, metadata)
+        except (OSError, ValueError):
+            continue
+        entries = extract_sources(raw)
+        rows.extend([metadata["research_id"]] + [e[c] for c in COLUMNS[1:]] for e in entries)
+        loose.add(metadata["research_id"])
+        researches += 1
+        total += len(entries)
+
+    # Recherches déplacées dans les segments compactés
+    for research_id, contents in segments.iter_packed(("metadata", "raw")):
+        if research_id in loose:
+            continue
+        try:
+            if "raw" in contents:
+                raw = json.loads(gzip.decompress(contents["raw"]).decode("utf-8"))
+            else:
+                raw = json.loads(contents["metadata"].decode("utf-8")).get("output_raw")
+        except (OSError, ValueError):
+            continue
+        entries = extract_sources(raw)
+        rows.extend([research_id] + [e[c] for c in COLUMNS[1:]] for e in entries)
+        researches += 1
+        total += len(entries)
+
+    with db.transaction() as conn:
+        if not merge:
+            conn.execute("DELETE FROM sources")
+        conn.executemany(
+            f"INSERT OR {'IGNORE' if merge else 'REPLACE'} INTO sources ({', '.join(COLUMNS)}) "
+            f"VALUES ({', '.join('?' for _ in COLUMNS)})",
+            rows
+        )
+    return researches, total
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        print("Usage : python sources.py rebuild [dossier_outputs]", file=sys.stderr)
+        sys.exit(1)
+    directory = Path(sys.argv[2]) if len(sys.argv) > 2 else Path("outputs")
+    researches, total = rebuild(directory)
+    print(f"[OK] Index des sources reconstruit : {total} sources pour {researches} recherches dans '{db.DB_PATH}'")
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Stockage des artefacts de recherche dans outputs/.
+
+Pour chaque recherche :
+- {id}_output.txt      : le texte du rapport
+- {id}_metadata.json   : le résumé (sujet, modèle, dates, usage...), petit et rapide à lire
+- {id}_raw.json.gz     : la réponse brute de l'API, compressée, chargée seulement à la demande
+
+Chaque fichier est écrit dans un fichier temporaire du même dossier puis
+renommé (os.replace, atomique) : plusieurs processus (uvicorn --workers,
+répliques sur un même volume) ne lisent jamais un fichier à moitié écrit.
+Les métadonnées sont écrites en dernier et supprimées en premier, ce qui
+fait d'elles le marqueur d'existence d'une recherche complète.
+
+Les anciennes métadonnées (avant la séparation) contiennent la réponse brute
+dans `output_raw` ; elles restent lisibles et se convertissent avec
+migrate_outputs.py.
+
+Les recherches anciennes peuvent être déplacées dans des segments compactés
+(segments.py, compaction.py) : les lectures par identifiant passent alors
+par l'index des segments, de façon transparente pour les appelants.
+"""
+
+import gzip
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+import segments
+
+# Configuration
+OUTPUT_DIR = Path(os.getenv("OUTPUT_DIR", "outputs"))
+RAW_COMPRESSION_LEVEL = int(os.getenv("RAW_COMPRESSION_LEVEL", "6"))
+
+# Version du format des métadonnées
+STORAGE_VERSION = 2
+
+
+def output_path(research_id: str) -> Path:
+    return OUTPUT_DIR / f"{research_id}_output.txt"
+
+
+def metadata_path(research_id: str) -> Path:
+    return OUTPUT_DIR / f"{research_id}_metadata.json"
+
+
+def raw_path(research_id: str) -> Path:
+    return OUTPUT_DIR / f"{research_id}_raw.json.gz"
+
+
+def atomic_write(path: Path, data: bytes):
+    """Remplace `path` par `data` en une seule opération visible (fichier temporaire + os.replace)."""
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        raise
+
+
+def _write_json(path: Path, data: dict):
+    atomic_write(path, json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+def _write_raw(path: Path, raw: dict):
+    payload = json.dumps(raw, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    atomic_write(path, gzip.compress(payload, compresslevel=RAW_COMPRESSION_LEVEL))
+
+
+def write_research(
+    research_id: str,
+    output_text: str,
+    metadata: dict,
+    raw: Optional[dict] = None
+) -> dict:
+    """
+    Écrit les artefacts d'une recherche et retourne leurs chemins.
+
+    `metadata` doit contenir au moins `subject` et `created_at` ; les chemins
+    des fichiers y sont ajoutés.
+    """
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    output_file = output_path(research_id)
+    metadata_file = metadata_path(research_id)
+    raw_file = raw_path(research_id)
+
+    header = (
+        f"--- Résultat généré le {metadata['created_at']} (UTC) ---\n\n"
+        f"Sujet: {metadata['subject']}\n\n"
+        + "=" * 80 + "\n\n"
+    )
+    atomic_write(output_file, (header + output_text).encode("utf-8"))
+
+    if raw is not None:
+        _write_raw(raw_file, raw)
+
+    metadata = dict(
+        metadata,
+        research_id=research_id,
+        storage_version=STORAGE_VERSION,
+        output_file=str(output_file),
+        raw_file=str(raw_file) if raw is not None else None
+    )
+    _write_json(metadata_file, metadata)
+
+    return {
+        "output_file": str(output_file),
+        "metadata_file": str(metadata_file),
+        "raw_file": metadata["raw_file"],
+        "metadata": metadata
+    }
+
+
+def exists(research_id: str) -> bool:
+    return metadata_path(research_id).exists() or segments.is_packed(research_id)
+
+
+def is_packed(research_id: str) -> bool:
+    """Vrai si la recherche n'a plus de fichiers propres et vit dans un segment."""
+    return not metadata_path(research_id).exists() and segments.is_packed(research_id)
+
+
+def read_metadata(research_id: str, include_raw: bool = False) -> Optional[dict]:
+    """
+    Lit le résumé d'une recherche (None si elle n'existe pas).
+
+    La réponse brute n'est ajoutée (`output_raw`) que si `include_raw` est vrai,
+    y compris pour les anciennes métadonnées qui la contiennent déjà.
+    """
+    try:
+        with open(metadata_path(research_id), "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+    except FileNotFoundError:
+        packed = segments.read(research_id, "metadata")
+        if packed is None:
+            return None
+        metadata = json.loads(packed.decode("utf-8"))
+
+    legacy_raw = metadata.pop("output_raw", None)
+    if include_raw:
+        metadata["output_raw"] = legacy_raw if legacy_raw is not None else read_raw(research_id)
+    return metadata
+
+
+def read_output(research_id: str) -> Optional[str]:
+    try:
+        with open(output_path(research_id), "r", encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        packed = segments.read(research_id, "output")
+        return packed.decode("utf-8") if packed is not None else None
+
+
+def read_output_bytes(research_id: str) -> Optional[bytes]:
+    """Texte du rapport tel que stocké (fichier ou segment), sans décodage."""
+    try:
+        return output_path(research_id).read_bytes()
+    except FileNotFoundError:
+        return segments.read(research_id, "output")
+
+
+def read_raw(research_id: str) -> Optional[dict]:
+    """Charge la réponse brute compressée (ou inline pour l'ancien format)."""
+    try:
+        with gzip.open(raw_path(research_id), "rb") as f:
+            return json.loads(f.read().decode("utf-8"))
+    except FileNotFoundError:
+        pass
+
+    packed = segments.read(research_id, "raw")
+    if packed is not None:
+        return json.loads(gzip.decompress(packed).decode("utf-8"))
+
+    try:
+        with open(metadata_path(research_id), "r", encoding="utf-8") as f:
+            return json.load(f).get("output_raw")
+    except FileNotFoundError:
+        packed = segments.read(research_id, "metadata")
+        return json.loads(packed.decode("utf-8")).get("output_raw") if packed is not None else None
+
+
+def delete(research_id: str) -> bool:
+    """Supprime les artefacts d'une recherche ; retourne False si elle n'existait pas."""
+    found = False
+    # Métadonnées d'abord : la recherche disparaît d'un coup pour les autres lecteurs
+    for path in (metadata_path(research_id), output_path(research_id), raw_path(research_id)):
+        try:
+            path.unlink()
+            found = True
+        except FileNotFoundError:
+            pass
+    if segments.remove(research_id):
+        found = True
+    return found
+
+
+def size(research_id: str) -> int:
+    """Octets occupés par une recherche (fichiers propres ou enregistrements de segment)."""
+    total = 0
+    for path in (metadata_path(research_id), output_path(research_id), raw_path(research_id)):
+        try:
+            total += path.stat().st_size
+        except FileNotFoundError:
+            pass
+    return total + sum(e["record_size"] for e in segments.entries(research_id).values())
+
+
+def loose_ids() -> Iterator[str]:
+    """Identifiants des recherches stockées en fichiers propres dans OUTPUT_DIR."""
+    for metadata_file in OUTPUT_DIR.glob("*_metadata.json"):
+        yield metadata_file.name[: -len("_metadata.json")]
+
+
+def pack(research_ids: List[str]) -> List[str]:
+    """
+    Déplace des recherches de leurs fichiers propres vers le segment actif.
+
+    Les artefacts sont copiés tels quels (la réponse brute reste compressée),
+    indexés, puis les fichiers sont supprimés : à tout instant la recherche
+    est lisible par l'un ou l'autre chemin. Une recherche supprimée pendant
+    la copie est retirée du segment. Retourne les identifiants déplacés.
+    À n'appeler que sous le verrou de compaction.
+    """
+    items, candidates = [], []
+    for research_id in research_ids:
+        try:
+            metadata = metadata_path(research_id).read_bytes()
+        except FileNotFoundError:
+            continue
+        items.append((research_id, "metadata", metadata))
+        for kind, path in (("output", output_path(research_id)), ("raw", raw_path(research_id))):
+            try:
+                items.append((research_id, kind, path.read_bytes()))
+            except FileNotFoundError:
+                pass
+        candidates.append(research_id)
+    if not items:
+        return []
+
+    segments.write(items)
+
+    packed = []
+    for research_id in candidates:
+        if not metadata_path(research_id).exists():
+            # Supprimée entre la copie et l'indexation
+            segments.remove(research_id)
+            continue
+        for path in (metadata_path(research_id), output_path(research_id), raw_path(research_id)):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+        packed.append(research_id)
+    return packed
+
+
+def migrate_metadata_file(metadata_file: Path) -> Optional[Tuple[int, int]]:
+    """
+    Convertit un fichier de métadonnées de l'ancien format.
+
+    Retourne (octets avant, octets après) en comptant le blob compressé,
+    ou None si le fichier est déjà au nouveau format.
+    """
+    with open(metadata_file, "r", encoding="utf-8") as f:
+        metadata = json.load(f)
+    if "output_raw" not in metadata:
+        return None
+
+    research_id = metadata.get("research_id") or metadata_file.name[: -len("_metadata.json")]
+    before = metadata_file.stat().st_size
+    raw = metadata.pop("output_raw")
+
+    raw_file = metadata_file.with_name(f"{research_id}_raw.json.gz")
+    if raw is not None:
+        _write_raw(raw_file, raw)
+        metadata.setdefault("response_id", raw.get("id"))
+        metadata.setdefault("usage", raw.get("usage"))
+    metadata["storage_version"] = STORAGE_VERSION
+    metadata["raw_file"] = str(raw_file) if raw is not None else None
+    _write_json(metadata_file, metadata)
+
+    after = metadata_file.stat().st_size + (raw_file.stat().st_size if raw is not None else 0)
+    return before, after
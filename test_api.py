@@ -41,6 +41,29 @@ def test_create_research():
         print(f"Erreur: {response.text}\n")
         return None
 
+def test_job_status(research_id, poll_interval=5):
+    """Test du suivi d'une recherche via /jobs jusqu'à sa fin"""
+    if not research_id:
+        print("⚠️  Pas de research_id, skip du test\n")
+        return False
+    
+    print(f"⏳ Test de /jobs/{research_id}...")
+    while True:
+        response = requests.get(f"{API_URL}/jobs/{research_id}")
+        if response.status_code != 200:
+            print(f"Erreur: {response.text}\n")
+            return False
+        
+        job = response.json()
+        print(f"  Statut: {job.get('status')} (attente: {job.get('queue_wait_s')}s, durée: {job.get('duration_s')}s)")
+        if job.get("status") == "completed":
+            print()
+            return True
+        if job.get("status") == "failed":
+            print(f"Erreur: {job.get('error')}\n")
+            return False
+        time.sleep(poll_interval)
+
 def test_get_results(research_id):
     """Test de récupération des résultats"""
     if not research_id:
@@ -113,8 +136,8 @@ def main():
         if choice.lower() == 'o':
             research_id = test_create_research()
             
-            # Test 5: Récupérer les résultats
-            if research_id:
+            # Test 5: Suivre la recherche puis récupérer les résultats
+            if test_job_status(research_id):
                 test_get_results(research_id)
         
         print("✅ Tests terminés !")
@@ -0,0 +1,1804 @@
+#!/usr/bin/env python3
+"""
+Tests unitaires des modules internes (file d'attente des recherches, client
+OpenAI, catalogue, stockage, cache de résultats, mode batch, cadencement des
+appels, compaction du contexte, index des sources, recherche plein texte,
+métriques, cache HTTP, recherche en éventail, routage par latence, segments et
+rétention, export, webhooks, diffusion en direct, détection des redites) et de
+l'API en mémoire (TestClient), sans serveur ni clé API : l'API OpenAI est
+simulée par un transport httpx.
+
+Chaque test travaille dans un dossier temporaire (base SQLite, outputs/ et
+segments propres).
+
+Usage : python test_modules.py   (ou python -m unittest test_modules)
+"""
+
+import argparse
+import asyncio
+import contextlib
+import csv
+import io
+import json
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import mock
+
+import httpx
+from fastapi.testclient import TestClient
+from openai import AsyncOpenAI, BadRequestError, InternalServerError
+
+import api
+import catalog
+import compaction
+import context_compaction
+import db
+import dedup
+import export
+import fanout
+import http_cache
+import jobs
+import live
+import main
+import metrics
+import openai_client
+import rate_limiter
+import routing
+import search_index
+import segments
+import sources
+import storage
+import webhooks
+from cache import ResultCache, request_key
+from search_index import build_query
+
+
+def _iso(days_ago: float = 0) -> str:
+    return (datetime.utcnow() - timedelta(days=days_ago)).isoformat() + "Z"
+
+
+async def _noop_runner(research_id, on_event, subject):
+    return {}
+
+
+def fake_response(text: str, response_id: str = "resp_1") -> dict:
+    """Réponse de l'API Responses : une recherche web puis le rapport, avec une citation."""
+    return {
+        "id": response_id,
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": "gpt-5",
+        "status": "completed",
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+        "output": [
+            {"type": "web_search_call", "id": "ws_1", "status": "completed",
+             "action": {"type": "search", "query": "veille",
+                        "sources": [{"type": "url", "url": "https://example.com/consultee"}]}},
+            {"type": "message", "id": "msg_1", "role": "assistant", "status": "completed",
+             "content": [{"type": "output_text", "text": text, "annotations": [
+                 {"type": "url_citation", "url": "https://example.com/citee", "title": "Exemple",
+                  "start_index": 0, "end_index": len(text)}
+             ]}]}
+        ],
+        "usage": {"input_tokens": 120, "input_tokens_details": {"cached_tokens": 20},
+                  "output_tokens": 80, "output_tokens_details": {"reasoning_tokens": 30},
+                  "total_tokens": 200}
+    }
+
+
+def sse_body(response: dict, chunks) -> str:
+    """Flux SSE de l'API Responses : création, deltas de texte (`chunks`) puis réponse complète."""
+    events = [{"type": "response.created", "response": dict(response, status="in_progress", output=[])}]
+    events += [
+        {"type": "response.output_text.delta", "item_id": "msg_1", "output_index": 1,
+         "content_index": 0, "delta": chunk, "logprobs": []}
+        for chunk in chunks
+    ]
+    events.append({"type": "response.completed", "response": response})
+    return "".join(
+        f"event: {event['type']}\ndata: {json.dumps(dict(event, sequence_number=n))}\n\n"
+        for n, event in enumerate(events)
+    )
+
+
+def parse_sse(body: str) -> list:
+    """(événement, données) de chaque message d'un flux SSE, commentaires de keep-alive exclus."""
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if "event" in fields:
+            events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+class TempStoreTestCase(unittest.TestCase):
+    """Base SQLite, outputs/ et segments dans un dossier temporaire."""
+
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp(prefix="ai-news-test-"))
+        self._db_path = db.DB_PATH
+        self._output_dir = storage.OUTPUT_DIR
+        self._segment_dir = segments.SEGMENT_DIR
+        db.configure(self.directory / "catalog.db")
+        storage.OUTPUT_DIR = self.directory
+        segments.configure(self.directory / "segments")
+
+    def tearDown(self):
+        db.close()
+        db.configure(self._db_path)
+        storage.OUTPUT_DIR = self._output_dir
+        segments.configure(self._segment_dir)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def add_research(self, research_id: str, text: str = "Rapport", days_ago: float = 0,
+                     model: str = "gpt-5") -> dict:
+        """Écrit une recherche et l'ajoute au catalogue."""
+        metadata = {"subject": f"Sujet {research_id}", "created_at": _iso(days_ago), "model": model}
+        paths = storage.write_research(research_id, text, metadata, raw={"id": f"resp_{research_id}"})
+        catalog.upsert(catalog.entry_from_files(
+            paths["metadata"], Path(paths["output_file"]), Path(paths["metadata_file"])
+        ))
+        return paths
+
+
+class JobQueueTest(TempStoreTestCase):
+
+    async def start_queue(self, runner, **options) -> jobs.JobQueue:
+        queue = jobs.JobQueue(runner=runner, poll_interval=0.05, **{"workers": 1, **options})
+        await queue.start()
+        return queue
+
+    def test_submit_and_complete(self):
+        async def runner(research_id, on_event, subject):
+            return {"output_file": f"{research_id}.txt", "subject": subject}
+
+        async def scenario():
+            queue = await self.start_queue(runner)
+            try:
+                job = await queue.submit("j1", {"subject": "IA"})
+                self.assertEqual(job.status, jobs.STATUS_QUEUED)
+                self.assertTrue(await job.wait(5))
+                self.assertIs(await queue.get("j1"), job)
+            finally:
+                await queue.stop()
+            self.assertEqual(job.status, jobs.STATUS_COMPLETED)
+            described = job.to_dict()
+            self.assertEqual(described["output_file"], "j1.txt")
+            self.assertEqual(described["subject"], "IA")
+            self.assertIsNotNone(described["duration_s"])
+
+            # Relu de la base par une autre file (autre processus)
+            stored = await jobs.JobQueue(runner=runner).get("j1")
+            self.assertEqual(stored.status, jobs.STATUS_COMPLETED)
+            self.assertEqual(stored.result, {"output_file": "j1.txt"})
+
+        asyncio.run(scenario())
+
+    def test_failure_is_recorded(self):
+        async def runner(research_id, on_event, subject):
+            raise ValueError("quota dépassé")
+
+        async def scenario():
+            queue = await self.start_queue(runner)
+            try:
+                job = await queue.submit("j1", {"subject": "IA"})
+                self.assertTrue(await job.wait(5))
+            finally:
+                await queue.stop()
+            self.assertEqual(job.status, jobs.STATUS_FAILED)
+            self.assertEqual(job.error, "quota dépassé")
+
+        asyncio.run(scenario())
+
+    def test_concurrency_is_bounded(self):
+        running = {"now": 0, "max": 0}
+
+        async def runner(research_id, on_event, subject):
+            running["now"] += 1
+            running["max"] = max(running["max"], running["now"])
+            await asyncio.sleep(0.05)
+            running["now"] -= 1
+            return {}
+
+        async def scenario():
+            queue = await self.start_queue(runner, workers=2)
+            try:
+                submitted = [await queue.submit(f"j{i}", {"subject": "IA"}) for i in range(6)]
+                for job in submitted:
+                    self.assertTrue(await job.wait(5))
+            finally:
+                await queue.stop()
+            self.assertTrue(all(job.status == jobs.STATUS_COMPLETED for job in submitted))
+            self.assertEqual(running["max"], 2)
+
+        asyncio.run(scenario())
+
+    def test_full_queue_is_refused(self):
+        async def runner(research_id, on_event, subject):
+            await asyncio.sleep(30)
+            return {}
+
+        async def scenario():
+            queue = await self.start_queue(runner, max_queue=1)
+            try:
+                running = await queue.submit("j1", {"subject": "a"})
+                while running.status != jobs.STATUS_RUNNING:
+                    await asyncio.sleep(0.01)
+                await queue.submit("j2", {"subject": "b"})
+                with self.assertRaises(jobs.QueueFullError):
+                    await queue.submit("j3", {"subject": "c"})
+                self.assertIsNone(await queue.get("j3"))
+            finally:
+                await queue.stop()
+            # Arrêt du processus : le job interrompu est rendu à la file
+            self.assertEqual((await jobs.JobQueue(runner=runner).get("j1")).status, jobs.STATUS_QUEUED)
+
+        asyncio.run(scenario())
+
+    def test_history_is_pruned(self):
+        async def scenario():
+            queue = await self.start_queue(_noop_runner, history_size=2, prune_interval=0.05)
+            try:
+                for i in range(3):
+                    self.assertTrue(await (await queue.submit(f"j{i}", {"subject": "IA"})).wait(5))
+                await asyncio.sleep(0.3)
+                self.assertEqual(list(queue.jobs), ["j1", "j2"])
+            finally:
+                await queue.stop()
+            other = jobs.JobQueue(runner=_noop_runner)
+            self.assertIsNone(await other.get("j0"))
+            self.assertIsNotNone(await other.get("j2"))
+
+        asyncio.run(scenario())
+
+    def test_cancel_running_and_queued(self):
+        async def runner(research_id, on_event, subject):
+            await asyncio.sleep(30)
+            return {}
+
+        async def scenario():
+            queue = await self.start_queue(runner)
+            try:
+                running = await queue.submit("running", {"subject": "a"})
+                queued = await queue.submit("queued", {"subject": "b"})
+                while running.status != jobs.STATUS_RUNNING:
+                    await asyncio.sleep(0.01)
+
+                await queue.cancel("queued")
+                self.assertEqual(queued.status, jobs.STATUS_CANCELLED)
+                self.assertIsNone(queued.started_at)
+
+                await queue.cancel("running")
+                self.assertTrue(await running.wait(5))
+                self.assertEqual(running.status, jobs.STATUS_CANCELLED)
+                self.assertIsNone(await queue.cancel("inconnu"))
+            finally:
+                await queue.stop()
+
+        asyncio.run(scenario())
+
+    def test_cancel_from_another_process(self):
+        async def runner(research_id, on_event, subject):
+            await asyncio.sleep(30)
+            return {}
+
+        async def scenario():
+            queue = await self.start_queue(runner, lease_s=0.3)
+            try:
+                job = await queue.submit("j1", {"subject": "a"})
+                while job.status != jobs.STATUS_RUNNING:
+                    await asyncio.sleep(0.01)
+                # Transmise par la base, appliquée au renouvellement du bail
+                await jobs.JobQueue(runner=runner).cancel("j1")
+                self.assertTrue(await job.wait(5))
+            finally:
+                await queue.stop()
+            self.assertEqual(job.status, jobs.STATUS_CANCELLED)
+
+        asyncio.run(scenario())
+
+    def test_deadline(self):
+        async def runner(research_id, on_event, subject):
+            await asyncio.sleep(30)
+            return {}
+
+        async def scenario():
+            queue = await self.start_queue(runner)
+            try:
+                job = await queue.submit("slow", {"subject": "a"}, deadline_s=0.2)
+                self.assertTrue(await job.wait(5))
+            finally:
+                await queue.stop()
+            self.assertEqual(job.status, jobs.STATUS_TIMED_OUT)
+            self.assertEqual(job.error, "Échéance de 0.2s dépassée")
+            self.assertIsNotNone(job.to_dict()["deadline_at"])
+
+        asyncio.run(scenario())
+
+
+class CreateResponseTest(unittest.TestCase):
+
+    def call(self, statuses, **kwargs):
+        """
+        `create_response` face à un serveur qui répond successivement `statuses`
+        (200 : réponse complète). Retourne (réponse ou exception, nombre d'appels).
+        """
+        calls = []
+
+        def handler(request):
+            status = statuses[len(calls)]
+            calls.append(request)
+            if status == 200:
+                return httpx.Response(200, json=fake_response("Rapport"))
+            return httpx.Response(status, json={"error": {"message": "indisponible"}},
+                                  headers={"retry-after-ms": "1"})
+
+        async def scenario():
+            client = AsyncOpenAI(api_key="sk-test", max_retries=0,
+                                 http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+            try:
+                return await openai_client.create_response(client=client, model="gpt-5", input="IA", **kwargs)
+            except Exception as e:
+                return e
+            finally:
+                await client.close()
+
+        with mock.patch.object(openai_client, "OPENAI_BACKOFF_BASE", 0.001), \
+                mock.patch.object(openai_client.logger, "warning") as warning:
+            result = asyncio.run(scenario())
+        self.retries_logged = warning.call_count
+        return result, len(calls)
+
+    def test_transient_errors_are_retried(self):
+        response, calls = self.call([503, 429, 200])
+        self.assertEqual(calls, 3)
+        self.assertEqual(self.retries_logged, 2)
+        self.assertEqual(openai_client.extract_output_text(response), "Rapport")
+
+    def test_client_error_is_not_retried(self):
+        error, calls = self.call([400, 200])
+        self.assertIsInstance(error, BadRequestError)
+        self.assertEqual(calls, 1)
+
+    def test_retries_are_bounded(self):
+        error, calls = self.call([500, 500, 200], max_retries=1)
+        self.assertIsInstance(error, InternalServerError)
+        self.assertEqual(calls, 2)
+
+    def test_retry_after_is_a_floor(self):
+        with mock.patch.object(openai_client, "OPENAI_BACKOFF_BASE", 0.001):
+            self.assertGreaterEqual(openai_client.backoff_delay(0, retry_after=0.5), 0.5)
+            self.assertLessEqual(openai_client.backoff_delay(3), 0.008)
+
+
+class JobEventsTest(unittest.TestCase):
+
+    def test_subscribe_replays_then_follows(self):
+        async def scenario():
+            job = jobs.Job("j", {"subject": "IA"})
+            job.publish("delta", {"text": "Bon"})
+            received = []
+
+            async def follow(start):
+                async for entry in job.subscribe(start=start, heartbeat=5):
+                    received.append(entry)
+
+            follower = asyncio.create_task(follow(1))
+            await asyncio.sleep(0)
+            job.publish("delta", {"text": "jour"})
+            job.status = jobs.STATUS_COMPLETED
+            job.publish(jobs.STATUS_COMPLETED, {"status": jobs.STATUS_COMPLETED})
+            await asyncio.wait_for(follower, 5)
+            # Reprise après l'événement 0 (Last-Event-ID)
+            self.assertEqual([entry[:2] for entry in received], [(1, "delta"), (2, jobs.STATUS_COMPLETED)])
+
+        asyncio.run(scenario())
+
+    def test_heartbeat_while_idle(self):
+        async def scenario():
+            job = jobs.Job("j", {"subject": "IA"})
+            stream = job.subscribe(heartbeat=0.01)
+            self.assertIsNone(await stream.__anext__())
+            await stream.aclose()
+
+        asyncio.run(scenario())
+
+    def test_finished_job_forgets_deltas(self):
+        async def scenario():
+            job = jobs.Job("j", {"subject": "IA"})
+            job.publish("status", {"status": jobs.STATUS_RUNNING})
+            for _ in range(100):
+                job.publish("delta", {"text": "x"})
+            job.status = jobs.STATUS_COMPLETED
+            job.publish(jobs.STATUS_COMPLETED, {"status": jobs.STATUS_COMPLETED})
+            self.assertTrue(job.trimmed)
+            self.assertEqual([(n, e) for n, e, _ in job.events], [(0, "status"), (101, jobs.STATUS_COMPLETED)])
+            # Les numéros sont conservés pour la reprise
+            replayed = [entry async for entry in job.subscribe(start=50)]
+            self.assertEqual([entry[0] for entry in replayed], [101])
+
+        asyncio.run(scenario())
+
+    def test_deltas_kept_while_subscribed(self):
+        async def scenario():
+            job = jobs.Job("j", {"subject": "IA"})
+            job.publish("delta", {"text": "x"})
+            stream = job.subscribe(heartbeat=5)
+            self.assertEqual((await stream.__anext__())[1], "delta")
+            job.status = jobs.STATUS_COMPLETED
+            job.publish(jobs.STATUS_COMPLETED, {})
+            self.assertFalse(job.trimmed)
+            self.assertEqual((await stream.__anext__())[1], jobs.STATUS_COMPLETED)
+            await stream.aclose()
+            self.assertTrue(job.trimmed)
+
+        asyncio.run(scenario())
+
+
+class ApiTestCase(TempStoreTestCase):
+    """
+    Application complète (TestClient) écrivant dans un dossier temporaire.
+
+    L'API OpenAI est simulée : chaque appel est enregistré dans `calls` et
+    reçoit `respond(body)` après `delay` secondes, par défaut le rapport
+    `report` (en flux SSE si l'appel est en streaming). Les tests démarrent
+    une fois la préparation en tâche de fond terminée.
+    """
+
+    REPORT = (
+        "## Modèles\n"
+        "- OpenAI publie un nouveau modèle de raisonnement plus rapide pour les développeurs.\n"
+        "- Les régulateurs européens précisent le calendrier d'application de l'AI Act."
+    )
+
+    def setUp(self):
+        super().setUp()
+        self.calls = []
+        self.report = self.REPORT
+        self.delay = 0
+        self._patches = [
+            mock.patch.object(api, "OUTPUT_DIR", self.directory),
+            mock.patch.object(api, "API_KEY", "sk-test"),
+            mock.patch.object(api, "result_cache", ResultCache()),
+            mock.patch.object(api, "startup_report", {
+                "lifespan_s": None, "warmup": {"status": "pending", "steps": {}}
+            }),
+        ]
+        for patch in self._patches:
+            patch.start()
+        api.job_queue.jobs.clear()
+        openai_client.set_client(AsyncOpenAI(
+            api_key="sk-test", max_retries=0,
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(self._handle))
+        ))
+        self.seed()
+        self.client = TestClient(api.app)
+        self.client.__enter__()
+        self.wait_warmup()
+
+    def tearDown(self):
+        self.client.__exit__(None, None, None)
+        for patch in reversed(self._patches):
+            patch.stop()
+        super().tearDown()
+
+    def seed(self):
+        """Prépare outputs/ avant le démarrage de l'application (rien par défaut)."""
+
+    def wait_warmup(self, timeout: float = 5):
+        """Attend la fin de la préparation en tâche de fond (index, client OpenAI)."""
+        deadline = time.monotonic() + timeout
+        while api.startup_report["warmup"]["status"] in ("pending", "running"):
+            if time.monotonic() > deadline:
+                raise AssertionError("Préparation du démarrage toujours en cours")
+            time.sleep(0.01)
+
+    async def _handle(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        self.calls.append(body)
+        await asyncio.sleep(self.delay)
+        return await self.respond(body)
+
+    async def respond(self, body: dict) -> httpx.Response:
+        response = fake_response(self.report, f"resp_{len(self.calls)}")
+        if body.get("stream"):
+            chunks = [self.report[i:i + 40] for i in range(0, len(self.report), 40)]
+            return httpx.Response(200, text=sse_body(response, chunks), headers={"content-type": "text/event-stream"})
+        return httpx.Response(200, json=response)
+
+    def wait(self, research_id: str, timeout: float = 5) -> dict:
+        """État final d'une recherche (GET /jobs/{id}), une fois terminée."""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.client.get(f"/jobs/{research_id}").json()
+            if job["status"] not in (jobs.STATUS_QUEUED, jobs.STATUS_RUNNING):
+                return job
+            if time.monotonic() > deadline:
+                raise AssertionError(f"Recherche {research_id} toujours {job['status']}")
+            time.sleep(0.02)
+
+    def research(self, **body) -> str:
+        """Lance une recherche et attend sa fin ; retourne son identifiant."""
+        response = self.client.post("/research", json={"subject": "IA générative", **body})
+        self.assertEqual(response.status_code, 202, response.text)
+        research_id = response.json()["research_id"]
+        self.assertEqual(self.wait(research_id)["status"], jobs.STATUS_COMPLETED)
+        return research_id
+
+
+class StreamApiTest(ApiTestCase):
+
+    def test_stream_relays_deltas_then_completes(self):
+        with self.client.stream("POST", "/research", json={"subject": "IA", "stream": True}) as response:
+            self.assertEqual(response.headers["content-type"], "text/event-stream; charset=utf-8")
+            events = parse_sse("".join(response.iter_text()))
+        names = [name for name, _ in events]
+        self.assertEqual(names[0], "status")
+        self.assertEqual(names[-2:], ["citations", jobs.STATUS_COMPLETED])
+        self.assertIn("response", names)
+        self.assertEqual("".join(data["text"] for name, data in events if name == "delta"), self.report)
+        self.assertEqual(events[-2][1]["citations"], [{"url": "https://example.com/citee", "title": "Exemple"}])
+        self.assertTrue(events[-1][1]["output_file"].endswith("_output.txt"))
+
+    def test_finished_research_is_replayed(self):
+        research_id = self.research()
+        events = parse_sse(self.client.get(f"/research/{research_id}/stream").text)
+        self.assertEqual([name for name, _ in events], ["delta", "citations", jobs.STATUS_COMPLETED])
+        self.assertIn(self.report, events[0][1]["text"])
+
+        # Sortie de l'historique : rejouée depuis les fichiers
+        api.job_queue.jobs.clear()
+        events = parse_sse(self.client.get(f"/research/{research_id}/stream").text)
+        self.assertIn(self.report, events[0][1]["text"])
+        self.assertEqual(self.client.get("/research/inconnue/stream").status_code, 404)
+
+
+class CancelApiTest(ApiTestCase):
+
+    def submit(self, **body) -> str:
+        response = self.client.post("/research", json={"subject": "IA générative", **body})
+        self.assertEqual(response.status_code, 202, response.text)
+        return response.json()["research_id"]
+
+    def test_cancel_running_research(self):
+        self.delay = 30
+        research_id = self.submit()
+        deadline = time.monotonic() + 5
+        while not self.calls and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        response = self.client.post(f"/jobs/{research_id}/cancel")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], jobs.STATUS_CANCELLED)
+        self.assertFalse(storage.exists(research_id))
+        self.assertEqual(self.client.post(f"/jobs/{research_id}/cancel").status_code, 409)
+        self.assertEqual(self.client.post("/jobs/inconnue/cancel").status_code, 404)
+
+    def test_deadline_times_out(self):
+        self.delay = 30
+        job = self.wait(self.submit(deadline_s=0.2))
+        self.assertEqual(job["status"], jobs.STATUS_TIMED_OUT)
+        self.assertEqual(self.client.post("/research", json={"subject": "IA", "deadline_s": 0}).status_code, 422)
+
+
+class FollowupApiTest(ApiTestCase):
+
+    def followup(self, research_id: str, **body) -> str:
+        response = self.client.post(f"/research/{research_id}/followup", json=body)
+        self.assertEqual(response.status_code, 202, response.text)
+        followup_id = response.json()["research_id"]
+        self.assertEqual(self.wait(followup_id)["status"], jobs.STATUS_COMPLETED)
+        return followup_id
+
+    def test_followup_is_chained(self):
+        parent_id = self.research()
+        parent = storage.read_metadata(parent_id)
+        child_id = self.followup(parent_id)
+
+        body = self.calls[-1]
+        self.assertEqual(body["previous_response_id"], parent["response_id"])
+        # Seul le nouveau tour est envoyé
+        self.assertEqual([message["role"] for message in body["input"]], ["user"])
+        turn = json.loads(body["input"][0]["content"][0]["text"])
+        self.assertEqual((turn["Subject"], turn["Since"]), ("IA générative", parent["created_at"]))
+
+        child = storage.read_metadata(child_id)
+        self.assertTrue(child["chained"])
+        self.assertEqual(child["lineage"], {"parent_id": parent_id, "root_id": parent_id, "depth": 1})
+
+        grandchild = storage.read_metadata(self.followup(child_id))
+        self.assertEqual(grandchild["lineage"], {"parent_id": child_id, "root_id": parent_id, "depth": 2})
+        self.assertEqual(self.client.post("/research/inconnue/followup").status_code, 404)
+
+    def test_expired_response_falls_back(self):
+        parent_id = self.research()
+        respond = self.respond
+
+        async def forget_previous(body):
+            if body.get("previous_response_id"):
+                return httpx.Response(400, json={"error": {
+                    "message": "Previous response not found", "type": "invalid_request_error",
+                    "param": "previous_response_id", "code": "previous_response_not_found",
+                }})
+            return await respond(body)
+
+        self.respond = forget_previous
+        child = storage.read_metadata(self.followup(parent_id))
+        self.assertFalse(child["chained"])
+        self.assertNotIn("previous_response_id", self.calls[-1])
+        # Recherche complète avec le rapport parent en réponse précédente
+        subject = json.loads(self.calls[-1]["input"][-1]["content"][0]["text"])
+        self.assertIn(self.report, subject["PreviousResponses"][0])
+
+
+class FanoutTest(unittest.TestCase):
+
+    def test_merge_demotes_headings_and_dedups_sources(self):
+        branches = [
+            {"subtopic": subtopic, "output_text": f"# Titre\n## Détail {subtopic}",
+             "raw": fake_response("…", f"resp_{subtopic}")}
+            for subtopic in ("Modèles", "Régulation")
+        ]
+        report, citations = fanout.merge_branches("IA", branches)
+        self.assertTrue(report.startswith("# IA\n\n## Modèles\n\n## Titre\n### Détail Modèles"))
+        self.assertEqual(citations, [{"url": "https://example.com/citee", "title": "Exemple"}])
+        self.assertTrue(report.endswith("## Sources\n\n- [Exemple](https://example.com/citee)\n"))
+
+    def test_usage_is_summed(self):
+        usage = fake_response("…")["usage"]
+        total = fanout._sum_usage([usage, None, usage])
+        self.assertEqual(total["total_tokens"], 400)
+        self.assertEqual(total["input_tokens_details"], {"cached_tokens": 40})
+
+
+class FanoutApiTest(ApiTestCase):
+
+    SUBTOPICS = ["Modèles", "Régulation", "modèles"]
+
+    def setUp(self):
+        super().setUp()
+        self.failing = set()
+
+    async def respond(self, body: dict) -> httpx.Response:
+        if body["text"]["format"].get("name") == "plan_veille":
+            plan = json.dumps({"subtopics": self.SUBTOPICS}, ensure_ascii=False)
+            return httpx.Response(200, json=fake_response(plan, "resp_plan"))
+        focus = json.loads(body["input"][-1]["content"][0]["text"])["Focus"]
+        if focus in self.failing:
+            return httpx.Response(400, json={"error": {"message": "refusé", "type": "invalid_request_error"}})
+        self.report = f"Avancées : {focus}"
+        return await super().respond(body)
+
+    def test_branches_are_merged(self):
+        research_id = self.research(fanout=4)
+        # Plan puis une branche par sous-thème distinct
+        self.assertEqual(len(self.calls), 3)
+        self.assertFalse(self.calls[0].get("store"))
+
+        metadata = storage.read_metadata(research_id)
+        report = metadata["fanout"]
+        self.assertEqual(report["width"], 2)
+        self.assertEqual([b["subtopic"] for b in report["branches"]], self.SUBTOPICS[:2])
+        self.assertTrue(all(b["status"] == "completed" for b in report["branches"]))
+        self.assertEqual(metadata["usage"]["total_tokens"], 600)
+
+        text = storage.read_output(research_id)
+        self.assertIn("## Régulation\n\nAvancées : Régulation", text)
+        self.assertEqual(text.count("https://example.com/citee"), 1)
+        self.assertEqual(self.client.get(f"/results/{research_id}/sources").json()["total"], 2)
+        self.assertEqual(self.client.post("/research", json={"subject": "IA", "fanout": 1}).status_code, 422)
+
+    def test_failed_branch_is_left_out(self):
+        self.failing = {"Régulation"}
+        research_id = self.research(fanout=2)
+        statuses = [b["status"] for b in storage.read_metadata(research_id)["fanout"]["branches"]]
+        self.assertEqual(statuses, ["completed", "failed"])
+        self.assertNotIn("## Régulation", storage.read_output(research_id))
+
+        self.failing = {"Modèles", "Régulation"}
+        response = self.client.post("/research", json={"subject": "IA", "fanout": 2})
+        self.assertEqual(self.wait(response.json()["research_id"])["status"], jobs.STATUS_FAILED)
+
+
+class RoutingTest(TempStoreTestCase):
+
+    CONFIG = {"model": "gpt-5-mini", "reasoning_effort": "low", "verbosity": "low", "search_context_size": "low"}
+
+    def setUp(self):
+        super().setUp()
+        routing._stats_cache = None
+
+    def test_record_keeps_window(self):
+        window = routing.ROUTING_WINDOW
+        routing.ROUTING_WINDOW = 3
+        try:
+            for latency in range(10):
+                routing.record(self.CONFIG, float(latency))
+        finally:
+            routing.ROUTING_WINDOW = window
+        observed = routing.stats()[routing._key(self.CONFIG)]
+        self.assertEqual(observed["samples"], 3)
+        self.assertEqual(observed["latency_p50_s"], 8.0)
+
+    def test_cheapest_config_within_target(self):
+        fixed = {"reasoning_effort": "low", "search_context_size": "low"}
+        for model, latency in (("gpt-5-mini", 10.0), ("gpt-5", 5.0)):
+            for _ in range(routing.ROUTING_MIN_SAMPLES):
+                routing.record({**self.CONFIG, "model": model}, latency)
+
+        config, decision = routing.choose(20, "low", fixed)
+        self.assertEqual((config["model"], decision["reason"]), ("gpt-5-mini", "historique"))
+        config, decision = routing.choose(7, "low", fixed)
+        self.assertEqual((config["model"], decision["expected_p90_s"]), ("gpt-5", 5.0))
+        # Aucune combinaison assez rapide : la plus rapide mesurée
+        config, decision = routing.choose(1, "low", fixed)
+        self.assertEqual((config["model"], decision["reason"]), ("gpt-5", "meilleur effort"))
+
+    def test_unmeasured_configs_are_explored(self):
+        config, decision = routing.choose(30, "medium")
+        self.assertEqual(config, {"model": "gpt-5-mini", "reasoning_effort": "low", "verbosity": "medium",
+                                  "search_context_size": "low"})
+        self.assertEqual((decision["reason"], decision["samples"]), ("exploration", 0))
+
+    def test_deep_mode_with_latency_target_keeps_preset(self):
+        defaults = {"model": "gpt-5", "reasoning_effort": "medium", "verbosity": "medium",
+                    "search_context_size": "medium"}
+        overrides = dict.fromkeys(routing.CONFIG_KEYS)
+        config, decision = routing.resolve(defaults, overrides, mode=routing.MODE_DEEP, max_latency_s=60)
+        for key, value in routing.MODE_PRESETS[routing.MODE_DEEP].items():
+            self.assertEqual(config[key], value)
+        self.assertEqual(decision["mode"], routing.MODE_DEEP)
+
+        # Sans objectif : la requête, puis le mode, puis les valeurs par défaut
+        config, decision = routing.resolve(defaults, {**overrides, "model": "gpt-5-nano"})
+        self.assertEqual(config, {**defaults, "model": "gpt-5-nano"})
+        self.assertIsNone(decision)
+
+
+class RoutingApiTest(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        routing._stats_cache = None
+
+    def test_latency_target_selects_parameters(self):
+        research_id = self.research(max_latency_s=30, verbosity="low")
+        body = self.calls[-1]
+        self.assertEqual((body["model"], body["reasoning"]["effort"]), ("gpt-5-mini", "low"))
+        self.assertEqual(body["tools"][0]["search_context_size"], "low")
+
+        metadata = storage.read_metadata(research_id)
+        self.assertEqual(metadata["routing"]["reason"], "exploration")
+        self.assertEqual(metadata["search_context_size"], "low")
+
+        combinations = self.client.get("/routing/stats").json()["combinations"]
+        self.assertEqual([(c["model"], c["samples"]) for c in combinations], [("gpt-5-mini", 1)])
+
+
+class StartupApiTest(ApiTestCase):
+
+    def seed(self):
+        # Recherches stockées avant le premier démarrage : aucun index
+        for research_id in ("r1", "r2"):
+            metadata = {"research_id": research_id, "subject": f"Informatique quantique {research_id}",
+                        "created_at": _iso(), "model": "gpt-5"}
+            storage.write_research(research_id, "Percée en informatique quantique", metadata,
+                                   raw=fake_response("Percée", f"resp_{research_id}"))
+
+    def test_existing_researches_are_indexed_in_background(self):
+        warmup = self.client.get("/health").json()["startup"]["warmup"]
+        self.assertEqual(warmup["status"], "done")
+        self.assertEqual(list(warmup["steps"]), ["catalog", "sources", "search_index", "dedup", "openai_client"])
+
+        listing = self.client.get("/list").json()
+        self.assertEqual((listing["total"], listing["warming_up"]), (2, False))
+        self.assertEqual(self.client.get("/search", params={"q": "quantique"}).json()["total"], 2)
+        self.assertEqual(self.client.get("/results/r1/sources").json()["total"], 2)
+
+    def test_incomplete_indexes_are_flagged(self):
+        for research_id in ("r1", "r2"):
+            self.client.delete(f"/results/{research_id}")
+        api.startup_report["warmup"].update(status="running", indexing=["catalog", "search_index"])
+
+        response = self.client.get("/list")
+        self.assertTrue(response.json()["warming_up"])
+        self.assertEqual(response.headers["cache-control"], "no-store")
+        self.assertNotIn("etag", response.headers)
+        self.assertTrue(self.client.get("/search", params={"q": "quantique"}).json()["warming_up"])
+        response = self.client.get("/latest")
+        self.assertEqual((response.status_code, response.headers["retry-after"]), (503, "5"))
+
+        api.startup_report["warmup"].update(status="done", indexing=[])
+        self.assertEqual(self.client.get("/latest").status_code, 404)
+
+
+class WebhookSignatureTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        timestamp = str(int(time.time()))
+        body = b'{"event": "research.completed"}'
+        signature = webhooks.sign("secret", timestamp, body)
+        self.assertTrue(webhooks.verify_signature("secret", timestamp, body, signature))
+        self.assertFalse(webhooks.verify_signature("autre", timestamp, body, signature))
+        self.assertFalse(webhooks.verify_signature("secret", timestamp, body + b" ", signature))
+
+    def test_stale_timestamp(self):
+        timestamp = str(int(time.time()) - webhooks.SIGNATURE_TOLERANCE_S - 60)
+        body = b"{}"
+        signature = webhooks.sign("secret", timestamp, body)
+        self.assertFalse(webhooks.verify_signature("secret", timestamp, body, signature))
+
+    def test_invalid_timestamp(self):
+        self.assertFalse(webhooks.verify_signature("secret", "hier", b"{}", "sha256=0"))
+
+
+class WebhookURLTest(unittest.TestCase):
+
+    def test_private_addresses_are_refused(self):
+        for url in ("http://127.0.0.1/cb", "http://10.0.0.5/cb", "http://169.254.169.254/latest",
+                    "http://[::1]/cb", "http://[::ffff:192.168.1.1]/cb", "ftp://example.com/cb"):
+            with self.assertRaises(webhooks.WebhookURLError, msg=url):
+                webhooks.resolve_url(url)
+
+    def test_public_address_is_pinned(self):
+        self.assertEqual(webhooks.resolve_url("https://93.184.216.34/cb"), "93.184.216.34")
+
+
+class WebhookApiTest(ApiTestCase):
+    """Envois vers un destinataire simulé (hôte de WEBHOOK_ALLOWED_HOSTS, sans résolution DNS)."""
+
+    def setUp(self):
+        self.received = []
+        allowed = mock.patch.object(webhooks, "WEBHOOK_ALLOWED_HOSTS", {"hooks.test"})
+        allowed.start()
+        self.addCleanup(allowed.stop)
+        super().setUp()
+        webhooks.dispatcher._client = httpx.AsyncClient(transport=httpx.MockTransport(self._receive))
+
+    def _receive(self, request: httpx.Request) -> httpx.Response:
+        self.received.append(request)
+        return httpx.Response(204)
+
+    def wait_delivery(self, research_id: str, timeout: float = 5) -> dict:
+        deadline = time.monotonic() + timeout
+        while True:
+            response = self.client.get(f"/webhooks/{research_id}")
+            if response.status_code == 200:
+                delivery = response.json()["deliveries"][0]
+                if delivery["status"] not in (webhooks.STATUS_WAITING, webhooks.STATUS_PENDING,
+                                              webhooks.STATUS_DELIVERING):
+                    return delivery
+            if time.monotonic() > deadline:
+                raise AssertionError(f"Webhook de {research_id} toujours en attente")
+            time.sleep(0.02)
+
+    def test_signed_notification_on_completion(self):
+        research_id = self.research(callback_url="https://hooks.test/cb", callback_secret="s3cret")
+        delivery = self.wait_delivery(research_id)
+        self.assertEqual((delivery["status"], delivery["last_status_code"]), (webhooks.STATUS_DELIVERED, 204))
+        self.assertTrue(delivery["signed"])
+        self.assertEqual(len(delivery["attempt_log"]), 1)
+
+        request = self.received[0]
+        self.assertEqual(str(request.url), "https://hooks.test/cb")
+        self.assertTrue(webhooks.verify_signature(
+            "s3cret", request.headers["x-webhook-timestamp"], request.content,
+            request.headers["x-webhook-signature"]
+        ))
+        payload = json.loads(request.content)
+        self.assertEqual((payload["event"], payload["research_id"]), ("research.completed", research_id))
+        self.assertEqual(payload["usage"]["total_tokens"], 200)
+
+    def test_refused_and_unknown(self):
+        response = self.client.post("/research", json={"subject": "IA", "callback_url": "http://127.0.0.1/cb"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("callback_url refusée", response.json()["detail"])
+        self.assertEqual(self.client.get("/webhooks/inconnue").status_code, 404)
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def test_parse_reset(self):
+        self.assertEqual(rate_limiter.parse_reset("6m0s"), 360)
+        self.assertEqual(rate_limiter.parse_reset("1.5s"), 1.5)
+        self.assertAlmostEqual(rate_limiter.parse_reset("20ms"), 0.02)
+        self.assertEqual(rate_limiter.parse_reset("2"), 2)
+        self.assertIsNone(rate_limiter.parse_reset("bientôt"))
+        self.assertIsNone(rate_limiter.parse_reset(None))
+
+    def test_waits_for_token_budget(self):
+        async def scenario():
+            # 6000 tokens/minute = 100 tokens/s : le second appel attend ~0,1 s
+            scheduler = rate_limiter.RateScheduler(rpm=600, tpm=6000, tokens_estimate=10)
+            first = await scheduler.acquire(6000)
+            second = await scheduler.acquire(10)
+            return first, second, scheduler
+
+        first, second, scheduler = asyncio.run(scenario())
+        self.assertLess(first.waited, 0.05)
+        self.assertGreater(second.waited, 0.05)
+        self.assertEqual(scheduler.total_calls, 2)
+
+    def test_headers_block_until_reset(self):
+        async def scenario():
+            scheduler = rate_limiter.RateScheduler(rpm=600, tpm=60000)
+            scheduler.record_headers({
+                "x-ratelimit-limit-requests": "600",
+                "x-ratelimit-remaining-requests": "0",
+                "x-ratelimit-reset-requests": "150ms",
+            })
+            return await scheduler.acquire(1), scheduler
+
+        reservation, scheduler = asyncio.run(scenario())
+        self.assertGreater(reservation.waited, 0.1)
+        self.assertEqual(scheduler.last_headers["x-ratelimit-reset-requests"], "150ms")
+
+    def test_throttle_after_429(self):
+        async def scenario():
+            scheduler = rate_limiter.RateScheduler(rpm=600, tpm=60000)
+            scheduler.throttle(0.15)
+            return await scheduler.acquire(1), scheduler
+
+        reservation, scheduler = asyncio.run(scenario())
+        self.assertGreater(reservation.waited, 0.1)
+        self.assertEqual(scheduler.throttled, 1)
+
+    def test_usage_corrects_estimate(self):
+        async def scenario():
+            scheduler = rate_limiter.RateScheduler(rpm=600, tpm=60000, tokens_estimate=1000)
+            reservation = await scheduler.acquire()
+            scheduler.record_usage(reservation, {"total_tokens": 3000})
+            return reservation, scheduler
+
+        reservation, scheduler = asyncio.run(scenario())
+        self.assertEqual(reservation.tokens, 3000)
+        self.assertAlmostEqual(scheduler.token_bucket.tokens, 57000, delta=10)
+        self.assertAlmostEqual(scheduler.tokens_estimate, 1400)
+
+
+class CatalogTest(TempStoreTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # De la plus ancienne à la plus récente
+        for research_id, days_ago, model in (("a", 3, "gpt-5"), ("b", 2, "gpt-5-mini"), ("c", 1, "gpt-5")):
+            self.add_research(research_id, days_ago=days_ago, model=model)
+
+    def test_cursor_pagination(self):
+        first, cursor = catalog.list_entries(limit=2)
+        self.assertEqual([e["research_id"] for e in first], ["c", "b"])
+        rest, end = catalog.list_entries(limit=2, cursor=cursor)
+        self.assertEqual([e["research_id"] for e in rest], ["a"])
+        self.assertIsNone(end)
+        with self.assertRaises(ValueError):
+            catalog.list_entries(cursor="invalide")
+
+    def test_filters(self):
+        self.assertEqual(catalog.count(model="gpt-5"), 2)
+        self.assertEqual([e["research_id"] for e in catalog.list_entries(subject="sujet B")[0]], ["b"])
+        self.assertEqual([e["research_id"] for e in catalog.list_entries(since=_iso(1.5))[0]], ["c"])
+        # Jokers LIKE pris littéralement
+        self.assertEqual(catalog.count(subject="%"), 0)
+
+    def test_rebuild_from_files(self):
+        catalog.remove("b")
+        self.assertIsNone(catalog.get("b"))
+        self.assertEqual(catalog.rebuild(self.directory), 3)
+        self.assertEqual(catalog.get("b")["model"], "gpt-5-mini")
+        self.assertEqual(catalog.get_latest()["research_id"], "c")
+
+
+class CatalogApiTest(ApiTestCase):
+
+    def test_list_and_latest(self):
+        for research_id, days_ago, model in (("a", 3, "gpt-5"), ("b", 2, "gpt-5-mini"), ("c", 1, "gpt-5")):
+            self.add_research(research_id, text=f"Rapport {research_id}", days_ago=days_ago, model=model)
+
+        page = self.client.get("/list", params={"limit": 2}).json()
+        self.assertEqual(page["total"], 3)
+        self.assertEqual([r["research_id"] for r in page["researches"]], ["c", "b"])
+        page = self.client.get("/list", params={"limit": 2, "cursor": page["next_cursor"]}).json()
+        self.assertEqual([r["research_id"] for r in page["researches"]], ["a"])
+        self.assertIsNone(page["next_cursor"])
+        page = self.client.get("/list", params={"model": "gpt-5-mini"}).json()
+        self.assertEqual((page["total"], page["researches"][0]["subject"]), (1, "Sujet b"))
+        self.assertEqual(self.client.get("/list", params={"cursor": "invalide"}).status_code, 400)
+
+        latest = self.client.get("/latest").json()
+        self.assertEqual(latest["research_id"], "c")
+        self.assertTrue(latest["output_text"].endswith("Rapport c"))
+
+    def test_deleted_research_leaves_list(self):
+        for research_id, days_ago in (("a", 3), ("b", 2), ("c", 1)):
+            self.add_research(research_id, days_ago=days_ago)
+        self.assertEqual(self.client.delete("/results/c").status_code, 200)
+        # Fichiers supprimés hors de l'API : entrée orpheline écartée
+        storage.metadata_path("b").unlink()
+
+        self.assertEqual(self.client.get("/latest").json()["research_id"], "a")
+        self.assertEqual(self.client.get("/list").json()["total"], 1)
+
+    def test_completed_research_is_listed(self):
+        self.assertEqual(self.client.get("/latest").status_code, 404)
+        research_id = self.research()
+        listed = self.client.get("/list").json()["researches"]
+        self.assertEqual([(r["research_id"], r["subject"]) for r in listed], [(research_id, "IA générative")])
+
+
+class StorageTest(TempStoreTestCase):
+
+    def test_raw_response_is_stored_apart(self):
+        paths = self.add_research("a", text="Contenu")
+        with open(paths["metadata_file"], "r", encoding="utf-8") as f:
+            self.assertNotIn("output_raw", json.load(f))
+        self.assertTrue(storage.raw_path("a").exists())
+
+        self.assertNotIn("output_raw", storage.read_metadata("a"))
+        self.assertEqual(storage.read_metadata("a", include_raw=True)["output_raw"], {"id": "resp_a"})
+        self.assertTrue(storage.read_output("a").endswith("Contenu"))
+
+        self.assertTrue(storage.delete("a"))
+        self.assertFalse(storage.delete("a"))
+        self.assertIsNone(storage.read_metadata("a"))
+
+    def test_legacy_metadata_is_read_then_migrated(self):
+        raw = {"id": "resp_old", "usage": {"total_tokens": 10}, "output": []}
+        metadata_file = storage.metadata_path("old")
+        metadata_file.write_text(json.dumps({
+            "research_id": "old", "subject": "Ancien", "created_at": _iso(), "output_raw": raw
+        }), encoding="utf-8")
+        self.assertEqual(storage.read_raw("old"), raw)
+        self.assertNotIn("output_raw", storage.read_metadata("old"))
+
+        self.assertIsNotNone(storage.migrate_metadata_file(metadata_file))
+        self.assertIsNone(storage.migrate_metadata_file(metadata_file))
+        self.assertEqual(storage.read_raw("old"), raw)
+        self.assertEqual(storage.read_metadata("old")["response_id"], "resp_old")
+        self.assertEqual(storage.read_metadata("old", include_raw=True)["output_raw"], raw)
+
+
+class SegmentsTest(TempStoreTestCase):
+
+    def test_pack_read_reclaim_read(self):
+        for research_id in ("a", "b", "c"):
+            self.add_research(research_id, text=f"Contenu {research_id}")
+        originals = {research_id: storage.read_output(research_id) for research_id in ("b", "c")}
+
+        # Un enregistrement par segment : chaque recherche finit dans le sien
+        max_bytes = segments.SEGMENT_MAX_BYTES
+        segments.SEGMENT_MAX_BYTES = 1
+        try:
+            self.assertEqual(storage.pack(["a", "b", "c"]), ["a", "b", "c"])
+        finally:
+            segments.SEGMENT_MAX_BYTES = max_bytes
+
+        self.assertFalse(storage.metadata_path("b").exists())
+        self.assertTrue(storage.is_packed("b"))
+        self.assertEqual(storage.read_output("b"), originals["b"])
+        self.assertEqual(storage.read_raw("b"), {"id": "resp_b"})
+        self.assertEqual(storage.read_metadata("b")["subject"], "Sujet b")
+
+        self.assertTrue(storage.delete("a"))
+        removed, reclaimed = segments.reclaim(0.5)
+        self.assertGreaterEqual(removed, 1)
+        self.assertGreater(reclaimed, 0)
+
+        self.assertIsNone(storage.read_output("a"))
+        for research_id, text in originals.items():
+            self.assertEqual(storage.read_output(research_id), text)
+        self.assertEqual(segments.stats()["dead_bytes"], 0)
+
+    def test_delete_during_reclaim_is_not_undone(self):
+        for research_id in ("a", "b"):
+            self.add_research(research_id, text=f"Contenu {research_id}")
+        storage.pack(["a", "b"])
+        # Segment suivant pour que le premier ne soit plus le segment actif
+        max_bytes = segments.SEGMENT_MAX_BYTES
+        segments.SEGMENT_MAX_BYTES = 1
+        try:
+            self.add_research("c")
+            original = storage.read_output("c")
+            storage.pack(["c"])
+        finally:
+            segments.SEGMENT_MAX_BYTES = max_bytes
+        storage.delete("a")
+
+        write = segments.write
+
+        def delete_then_write(items, **kwargs):
+            # Suppression concurrente entre la lecture des artefacts et leur recopie
+            storage.delete("b")
+            return write(items, **kwargs)
+
+        with mock.patch.object(segments, "write", delete_then_write):
+            removed, _ = segments.reclaim(0.9)
+        self.assertEqual(removed, 1)
+        self.assertFalse(storage.exists("b"))
+        self.assertFalse(storage.is_packed("b"))
+        self.assertIsNone(storage.read_output("b"))
+        self.assertEqual(storage.read_output("c"), original)
+
+
+class SelectExpiredTest(TempStoreTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # De la plus ancienne à la plus récente
+        for research_id, days_ago in (("old", 40), ("mid", 20), ("new", 1)):
+            self.add_research(research_id, text="x" * 1000, days_ago=days_ago)
+
+    def test_max_age_days(self):
+        self.assertEqual(compaction.select_expired({"max_age_days": 30}), ["old"])
+
+    def test_max_count(self):
+        self.assertEqual(compaction.select_expired({"max_count": 1}), ["old", "mid"])
+
+    def test_max_bytes(self):
+        budget = storage.size("new") + storage.size("mid")
+        self.assertEqual(compaction.select_expired({"max_bytes": budget}), ["old"])
+
+    def test_combined_policies(self):
+        self.assertEqual(compaction.select_expired({"max_age_days": 30, "max_count": 2}), ["old"])
+        self.assertEqual(compaction.select_expired({"max_age_days": 30, "max_count": 1}), ["old", "mid"])
+
+    def test_no_policy(self):
+        self.assertEqual(compaction.select_expired({}), [])
+
+
+class StorageApiTest(ApiTestCase):
+
+    def test_compaction_keeps_results_readable(self):
+        self.add_research("expired", days_ago=40)
+        self.add_research("old", text="Ancien rapport", days_ago=10)
+        self.add_research("recent")
+
+        with mock.patch.object(compaction, "RETENTION_MAX_AGE_DAYS", 30):
+            report = self.client.post("/storage/compact", params={"dry_run": True}).json()
+            self.assertEqual((report["deleted"], report["packed"]), (["expired"], 1))
+            self.assertTrue(storage.exists("expired"))
+
+            report = self.client.post("/storage/compact").json()
+        self.assertEqual((report["deleted"], report["packed"]), (["expired"], 1))
+        self.assertEqual(self.client.get("/results/expired").status_code, 404)
+
+        # Recherche compactée : servie depuis son segment
+        self.assertTrue(storage.is_packed("old"))
+        result = self.client.get("/results/old").json()
+        self.assertTrue(result["output_text"].endswith("Ancien rapport"))
+        text = self.client.get("/results/old", params={"format": "text"})
+        self.assertTrue(text.text.endswith("Ancien rapport"))
+
+        stats = self.client.get("/storage/stats").json()
+        self.assertEqual((stats["researches"], stats["loose"]["researches"]), (2, 1))
+        self.assertEqual(stats["last_compaction"]["deleted"], ["expired"])
+
+
+class ResultsApiTest(ApiTestCase):
+
+    def test_raw_response_on_request(self):
+        research_id = self.research()
+        result = self.client.get(f"/results/{research_id}").json()
+        self.assertNotIn("output_raw", result)
+        self.assertTrue(result["output_text"].endswith(self.report))
+
+        result = self.client.get(f"/results/{research_id}", params={"include": "raw"}).json()
+        self.assertEqual(result["output_raw"]["output"][-1]["content"][0]["text"], self.report)
+        text = self.client.get(f"/results/{research_id}", params={"format": "text"})
+        self.assertTrue(text.text.endswith(self.report))
+        self.assertEqual(self.client.get("/results/inconnue").status_code, 404)
+
+
+class CompactionTest(unittest.TestCase):
+
+    PREVIOUS = [
+        f"## Édition {n}\n"
+        f"- OpenAI publie GPT-{n} le 1{n} mars 2025 : https://example.com/article-{n}?utm_source=veille\n"
+        f"- Mistral AI lève des fonds ({n}00 M€) selon https://example.org/levee-{n}\n"
+        + "Détails de l'analyse et du contexte du marché. " * 60
+        for n in range(1, 6)
+    ]
+
+    def test_under_budget_is_unchanged(self):
+        context, report = context_compaction.compact_previous_responses(["Rapport court"], budget=100)
+        self.assertEqual(context, ["Rapport court"])
+        self.assertFalse(report["compacted"])
+        self.assertEqual(report["saved_tokens"], 0)
+
+    def test_digest_fits_budget(self):
+        context, report = context_compaction.compact_previous_responses(self.PREVIOUS, budget=400)
+        self.assertTrue(report["compacted"])
+        self.assertLessEqual(report["compacted_tokens"], 400)
+        self.assertEqual(report["saved_tokens"], report["original_tokens"] - report["compacted_tokens"])
+        self.assertIn("Édition 1", context["Topics"])
+        # Paramètres de suivi retirés des URLs citées
+        self.assertIn("https://example.com/article-1", context["CitedURLs"])
+        self.assertIn("Mistral AI", context["Entities"])
+
+    def test_digest_collects_urls_and_dates(self):
+        digest = context_compaction.extract_digest(self.PREVIOUS)
+        self.assertEqual(len(digest["CitedURLs"]), 10)
+        self.assertIn("11 mars 2025", digest["Dates"])
+
+
+class CompactionApiTest(ApiTestCase):
+
+    def test_previous_responses_are_compacted(self):
+        research_id = self.research(previous_responses=CompactionTest.PREVIOUS)
+        subject = json.loads(self.calls[-1]["input"][-1]["content"][0]["text"])
+        self.assertIn("CitedURLs", subject["PreviousResponses"])
+
+        metadata = self.client.get(f"/results/{research_id}").json()
+        self.assertTrue(metadata["context_compaction"]["compacted"])
+        self.assertEqual(metadata["previous_responses"], CompactionTest.PREVIOUS)
+
+
+class SourcesTest(TempStoreTestCase):
+
+    RAW = {"output": [
+        {"type": "web_search_call", "action": {"type": "search", "sources": [
+            {"type": "url", "url": "https://www.Example.com/a?utm_source=x&id=1"},
+            {"type": "url", "url": "https://news.europa.eu/b#section"},
+        ]}},
+        {"type": "message", "content": [{"type": "output_text", "text": "…", "annotations": [
+            {"type": "url_citation", "url": "https://www.example.com/a?id=1", "title": "A"},
+        ]}]},
+    ]}
+
+    def test_cited_and_retrieved_are_merged(self):
+        self.add_research("r1")
+        self.assertEqual(sources.index("r1", self.RAW), 2)
+        entries = sources.for_research("r1")
+        self.assertEqual(entries[0], {
+            "url": "https://www.example.com/a?id=1", "domain": "example.com", "title": "A",
+            "cited": True, "retrieved": True,
+        })
+        self.assertEqual(entries[1]["url"], "https://news.europa.eu/b")
+        self.assertFalse(entries[1]["cited"])
+        self.assertEqual(len(sources.for_research("r1", cited_only=True)), 1)
+
+    def test_search_by_domain_and_top_domains(self):
+        self.add_research("r1", days_ago=1)
+        self.add_research("r2")
+        sources.index("r1", self.RAW)
+        sources.index("r2", {"output": self.RAW["output"][:1]})
+
+        # Le domaine inclut ses sous-domaines
+        self.assertEqual(sources.count(domain="europa.eu"), 2)
+        self.assertEqual([e["research_id"] for e in sources.search(domain="europa.eu")], ["r2", "r1"])
+        self.assertEqual(sources.count(url="https://example.com/a?id=1&utm_medium=y", cited_only=True), 0)
+        self.assertEqual(sources.count(url="https://www.example.com/a?id=1", cited_only=True), 1)
+        self.assertEqual(sources.count(domain="exampl_"), 0)
+
+        top = sources.top_domains()
+        self.assertEqual(top[0]["researches"], 2)
+        self.assertEqual(sources.top_domains(cited_only=True)[0]["domain"], "example.com")
+
+        sources.remove("r1")
+        self.assertEqual(sources.count(), 2)
+
+
+class SourcesApiTest(ApiTestCase):
+
+    def test_sources_endpoints(self):
+        research_id = self.research()
+        result = self.client.get(f"/results/{research_id}/sources").json()
+        self.assertEqual((result["total"], result["cited"], result["retrieved"]), (2, 1, 1))
+        self.assertEqual(result["sources"][0]["url"], "https://example.com/citee")
+
+        listing = self.client.get("/sources", params={"url": "https://example.com/consultee"}).json()
+        self.assertEqual([e["research_id"] for e in listing["sources"]], [research_id])
+        domains = self.client.get("/sources/domains").json()["domains"]
+        self.assertEqual(domains[0]["domain"], "example.com")
+        self.assertEqual(self.client.get("/results/inconnue/sources").status_code, 404)
+
+        self.client.delete(f"/results/{research_id}")
+        self.assertEqual(self.client.get("/sources").json()["total"], 0)
+
+
+class SearchIndexTest(TempStoreTestCase):
+
+    def test_subject_ranks_higher_and_accents_are_ignored(self):
+        self.add_research("r1", days_ago=1)
+        self.add_research("r2")
+        search_index.index("r1", "Régulation européenne", "Le texte évoque aussi les modèles ouverts.")
+        search_index.index("r2", "Modèles ouverts", "Publication de poids sous licence libre, régulation à venir.")
+
+        results, total = search_index.search("regulation")
+        self.assertEqual(total, 2)
+        self.assertEqual([r["research_id"] for r in results], ["r1", "r2"])
+        self.assertEqual(results[0]["subject"], "<mark>Régulation</mark> européenne")
+        self.assertIn("<mark>régulation</mark>", results[1]["snippet"])
+        self.assertEqual(search_index.search("modele* ouverts")[0][0]["research_id"], "r2")
+        self.assertEqual(search_index.search("licence libre")[1], 1)
+
+        search_index.remove("r2")
+        self.assertEqual(search_index.search("licence")[1], 0)
+
+    def test_query_syntax_is_neutralized(self):
+        self.assertEqual(build_query('IA" OR NEAR(x'), '"IA" AND "OR" AND "NEAR" AND "x"')
+        self.assertEqual(build_query("quant*"), '"quant"*')
+        with self.assertRaises(ValueError):
+            build_query("()*")
+
+    def test_rebuild_strips_header(self):
+        self.add_research("r1", text="Percée en informatique quantique")
+        self.assertEqual(search_index.rebuild(storage.OUTPUT_DIR), 1)
+        self.assertEqual(search_index.search("quantique")[1], 1)
+        self.assertEqual(search_index.search("genere")[1], 0)
+
+
+class SearchApiTest(ApiTestCase):
+
+    def test_search_endpoint(self):
+        research_id = self.research()
+        result = self.client.get("/search", params={"q": "generative"}).json()
+        self.assertEqual(result["total"], 1)
+        self.assertEqual(result["results"][0]["research_id"], research_id)
+        self.assertEqual(self.client.get("/search", params={"q": "*"}).status_code, 400)
+
+        self.client.delete(f"/results/{research_id}")
+        self.assertEqual(self.client.get("/search", params={"q": "generative"}).json()["total"], 0)
+
+
+class MetricsTest(unittest.TestCase):
+
+    def test_histogram_exposition(self):
+        histogram = metrics.Histogram("test_seconds", "Durées de test", ("stage",), buckets=(0.1, 1))
+        self.addCleanup(metrics._registry.remove, histogram)
+        for value in (0.05, 0.5, 2):
+            histogram.observe(value, stage='a"b')
+
+        text = histogram.render()
+        self.assertIn("# TYPE test_seconds histogram", text)
+        self.assertIn('test_seconds_bucket{stage="a\\"b",le="0.1"} 1', text)
+        self.assertIn('test_seconds_bucket{stage="a\\"b",le="1.0"} 2', text)
+        self.assertIn('test_seconds_bucket{stage="a\\"b",le="+Inf"} 3', text)
+        self.assertIn('test_seconds_count{stage="a\\"b"} 3', text)
+        self.assertEqual(histogram.summary()['a"b'], {"p50": 0.5, "p95": 2, "count": 3})
+
+    def test_gauge_callback(self):
+        gauge = metrics.Gauge("test_depth", "Profondeur de test", callback=lambda: 7)
+        self.addCleanup(metrics._registry.remove, gauge)
+        self.assertIn("test_depth 7", metrics.render())
+
+
+class MetricsApiTest(ApiTestCase):
+
+    def stage_count(self, stage: str) -> int:
+        series = metrics.research_stage_seconds.series.get((stage,))
+        return series["count"] if series else 0
+
+    def test_research_is_measured(self):
+        writes, indexings = self.stage_count("storage_write"), self.stage_count("indexing")
+        cached = metrics.openai_tokens_total.values.get(("cached_input",), 0)
+
+        self.research()
+        self.assertEqual(self.stage_count("storage_write"), writes + 1)
+        self.assertEqual(self.stage_count("indexing"), indexings + 1)
+        self.assertEqual(metrics.openai_tokens_total.values[("cached_input",)], cached + 20)
+
+        response = self.client.get("/metrics")
+        self.assertTrue(response.headers["content-type"].startswith("text/plain"))
+        self.assertIn('research_stage_seconds_count{stage="openai_call"}', response.text)
+        self.assertIn('openai_tokens_total{type="reasoning"}', response.text)
+        # Étiquette = modèle de route, pas l'URL avec l'identifiant
+        self.assertIn('route="/jobs/{research_id}"', response.text)
+
+        latency = self.client.get("/health").json()["latency_s"]
+        self.assertIn("storage_write", latency["research"])
+
+
+class HttpCacheTest(unittest.TestCase):
+
+    def test_etag_comparison_ignores_coding(self):
+        self.assertTrue(http_cache._etag_matches('W/"abc-gzip", "def"', '"abc"'))
+        self.assertTrue(http_cache._etag_matches("*", '"abc"'))
+        self.assertFalse(http_cache._etag_matches('"abcd"', '"abc"'))
+
+    def test_encoding_negotiation(self):
+        self.assertEqual(http_cache._choose_encoding("deflate, gzip;q=0.5"), "gzip")
+        self.assertIsNone(http_cache._choose_encoding("gzip;q=0, identity"))
+        expected = "br" if http_cache.brotli is not None else "gzip"
+        self.assertEqual(http_cache._choose_encoding("br, gzip"), expected)
+
+
+class HttpCacheApiTest(ApiTestCase):
+
+    TEXT = "Rapport détaillé. " * 200
+
+    def setUp(self):
+        super().setUp()
+        self.add_research("r1", text=self.TEXT)
+
+    def test_results_revalidation(self):
+        response = self.client.get("/results/r1", headers={"accept-encoding": "identity"})
+        etag = response.headers["etag"]
+        self.assertIn("max-age=", response.headers["cache-control"])
+        self.assertIn("last-modified", response.headers)
+
+        response = self.client.get("/results/r1", headers={"if-none-match": etag})
+        self.assertEqual((response.status_code, response.content), (304, b""))
+        self.assertEqual(self.client.get("/results/r1", params={"include": "raw"},
+                                         headers={"if-none-match": etag}).status_code, 200)
+
+        # Nouvelle écriture : nouvel ETag
+        time.sleep(0.01)
+        self.add_research("r1", text="Rapport révisé")
+        self.assertEqual(self.client.get("/results/r1", headers={"if-none-match": etag}).status_code, 200)
+
+    def test_compressed_representation(self):
+        response = self.client.get("/results/r1", headers={"accept-encoding": "gzip"})
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertEqual(response.headers["vary"], "Accept-Encoding")
+        etag = response.headers["etag"]
+        self.assertTrue(etag.endswith('-gzip"'))
+        self.assertTrue(response.json()["output_text"].endswith(self.TEXT))
+
+        response = self.client.get("/results/r1", headers={"accept-encoding": "gzip", "if-none-match": etag})
+        self.assertEqual((response.status_code, response.headers["etag"]), (304, etag))
+
+    def test_text_ranges(self):
+        url = "/results/r1?format=text"
+        full = self.client.get(url, headers={"accept-encoding": "identity"})
+        etag = full.headers["etag"]
+        self.assertEqual(full.headers["accept-ranges"], "bytes")
+
+        response = self.client.get(url, headers={"range": "bytes=10-19"})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, full.content[10:20])
+        self.assertEqual(response.headers["content-range"], f"bytes 10-19/{len(full.content)}")
+        self.assertEqual(self.client.get(url, headers={"range": "bytes=10-19", "if-range": etag}).status_code, 206)
+        # Copie périmée : fichier complet
+        self.assertEqual(self.client.get(url, headers={"range": "bytes=10-19", "if-range": '"ancien"'}).status_code, 200)
+        self.assertEqual(self.client.get(url, headers={"range": f"bytes={len(full.content) + 10}-"}).status_code, 416)
+
+    def test_list_and_latest_etags(self):
+        response = self.client.get("/list")
+        self.assertEqual(response.headers["cache-control"], "no-cache")
+        etag = response.headers["etag"]
+        self.assertEqual(self.client.get("/list", headers={"if-none-match": etag}).status_code, 304)
+
+        latest = self.client.get("/latest").headers["etag"]
+        self.assertEqual(self.client.get("/latest", headers={"if-none-match": latest}).status_code, 304)
+
+        self.add_research("r2")
+        self.assertEqual(self.client.get("/list", headers={"if-none-match": etag}).status_code, 200)
+        self.assertEqual(self.client.get("/latest", headers={"if-none-match": latest}).status_code, 200)
+
+
+class DedupTest(TempStoreTestCase):
+
+    FIRST = (
+        "- OpenAI publie un nouveau modèle de raisonnement plus rapide et moins cher pour les développeurs.\n"
+        "- Les régulateurs européens précisent le calendrier d'application de l'AI Act aux modèles généraux."
+    )
+    # Première puce reformulée à la marge, seconde entièrement nouvelle
+    SECOND = (
+        "- OpenAI publie un nouveau modèle de raisonnement plus rapide et bien moins cher pour les développeurs.\n"
+        "- Une startup française lève des fonds pour entraîner des modèles de langage spécialisés en santé."
+    )
+
+    def test_analyze_and_strip_near_duplicate(self):
+        first = dedup.analyze(self.FIRST, "r1", _iso(2))
+        self.assertEqual(dedup.summary(first)["duplicates"], 0)
+        dedup.index("r1", first)
+
+        second = dedup.analyze(self.SECOND, "r2", _iso(1))
+        duplicates = [item["duplicate_of"] for item in second["items"]]
+        self.assertIsNotNone(duplicates[0])
+        self.assertEqual(duplicates[0]["research_id"], "r1")
+        self.assertGreaterEqual(duplicates[0]["similarity"], dedup.DEDUP_THRESHOLD)
+        self.assertIsNone(duplicates[1])
+        self.assertEqual(dedup.summary(second)["score"], 0.5)
+
+        stripped = dedup.strip(self.SECOND, second)
+        self.assertNotIn("OpenAI", stripped)
+        self.assertIn("startup française", stripped)
+
+    def test_earlier_research_is_not_a_duplicate(self):
+        dedup.index("r2", dedup.analyze(self.SECOND, "r2", _iso(1)))
+        # Une recherche plus ancienne ne peut pas répéter une plus récente
+        earlier = dedup.analyze(self.FIRST, "r1", _iso(2))
+        self.assertEqual(dedup.summary(earlier)["duplicates"], 0)
+
+    def test_crowded_buckets_are_skipped(self):
+        dedup.index("r1", dedup.analyze(self.FIRST, "r1", _iso(2)))
+        max_rows = dedup.DEDUP_MAX_BUCKET_ROWS
+        dedup.DEDUP_MAX_BUCKET_ROWS = 0
+        try:
+            second = dedup.analyze(self.SECOND, "r2", _iso(1))
+        finally:
+            dedup.DEDUP_MAX_BUCKET_ROWS = max_rows
+        self.assertEqual(dedup.summary(second)["duplicates"], 0)
+
+    def test_rebuild_is_incremental(self):
+        self.add_research("r1", text=self.FIRST, days_ago=2)
+        self.assertEqual(dedup.rebuild(), (1, 2))
+        self.add_research("r2", text=self.SECOND, days_ago=1)
+        self.assertEqual(dedup.rebuild(), (1, 2))
+        self.assertEqual(dedup.rebuild(), (0, 0))
+        report = dedup.report("r2")
+        self.assertEqual(report["duplicates"], 1)
+        self.assertEqual(report["repeated"][0]["duplicate_of"]["research_id"], "r1")
+
+
+class DedupApiTest(ApiTestCase):
+
+    def test_repeated_paragraph_is_flagged_and_stripped(self):
+        self.report = DedupTest.FIRST
+        first_id = self.research(subject="Modèles de raisonnement")
+        self.assertEqual(storage.read_metadata(first_id)["novelty"]["score"], 1.0)
+
+        self.report = DedupTest.SECOND
+        second_id = self.research(subject="Actualité IA", strip_duplicates=True)
+        novelty = self.client.get(f"/results/{second_id}/novelty").json()
+        self.assertEqual((novelty["score"], novelty["duplicates"], novelty["stripped"]), (0.5, 1, 1))
+        self.assertEqual(novelty["repeated"][0]["duplicate_of"]["research_id"], first_id)
+
+        output_text = self.client.get(f"/results/{second_id}").json()["output_text"]
+        self.assertNotIn("OpenAI", output_text)
+        self.assertIn("startup française", output_text)
+        self.assertEqual(self.client.get("/results/inconnue/novelty").status_code, 404)
+
+
+class ExportTest(TempStoreTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.add_research("a", text='Texte, avec "guillemets"\nsur deux lignes', days_ago=2, model="gpt-5-mini")
+        self.add_research("b", days_ago=1)
+        self.add_research("c")
+
+    def test_ndjson_pages_and_projection(self):
+        lines = b"".join(export.stream("ndjson")).decode("utf-8").splitlines()
+        records = [json.loads(line) for line in lines]
+        self.assertEqual([r["research_id"] for r in records], ["c", "b", "a"])
+        self.assertNotIn("output_raw", records[0])
+        self.assertTrue(records[2]["output_text"].endswith("sur deux lignes"))
+
+        # Pages d'une recherche : le curseur parcourt tout le catalogue
+        records = list(export.iter_records(["research_id", "output_raw"], page_size=1))
+        self.assertEqual(records[0], {"research_id": "c", "output_raw": {"id": "resp_c"}})
+        self.assertEqual(len(records), 3)
+        self.assertEqual(export.parse_fields(" research_id, ,subject,research_id"), ["research_id", "subject"])
+
+    def test_csv_round_trip(self):
+        body = b"".join(export.stream("csv", ["research_id", "model", "output_text"], model="gpt-5-mini"))
+        rows = list(csv.reader(io.StringIO(body.decode("utf-8"))))
+        self.assertEqual(rows[0], ["research_id", "model", "output_text"])
+        self.assertEqual(rows[1][:2], ["a", "gpt-5-mini"])
+        self.assertTrue(rows[1][2].endswith('Texte, avec "guillemets"\nsur deux lignes'))
+        self.assertEqual(len(rows), 2)
+
+    def test_write_to_file(self):
+        path = self.directory / "export" / "veille.csv"
+        self.assertEqual(export.write(path, "csv", since=_iso(1.5)), 2)
+        rows = list(csv.reader(io.StringIO(path.read_text(encoding="utf-8"))))
+        self.assertEqual(rows[0], export.DEFAULT_CSV_FIELDS)
+        self.assertEqual([row[0] for row in rows[1:]], ["c", "b"])
+        # Pas de fichier temporaire laissé à côté
+        self.assertEqual([p.name for p in path.parent.iterdir()], ["veille.csv"])
+
+
+class ExportApiTest(ApiTestCase):
+
+    def test_export_endpoint(self):
+        research_id = self.research()
+        response = self.client.get("/export", params={"fields": "research_id,subject"})
+        self.assertEqual(response.headers["content-type"], "application/x-ndjson")
+        self.assertIn("attachment", response.headers["content-disposition"])
+        self.assertEqual(json.loads(response.text), {"research_id": research_id, "subject": "IA générative"})
+
+        response = self.client.get("/export", params={"format": "csv", "subject": "aucun"})
+        self.assertEqual(response.text.splitlines(), [",".join(export.DEFAULT_CSV_FIELDS)])
+        self.assertEqual(self.client.get("/export", params={"format": "xml"}).status_code, 422)
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    def test_request_key_normalizes_subject(self):
+        key = request_key("IA  Générative ", [], "gpt-5", "medium", "medium")
+        self.assertEqual(key, request_key("ia générative", [], "gpt-5", "medium", "medium"))
+        self.assertNotEqual(key, request_key("ia générative", [], "gpt-5-mini", "medium", "medium"))
+        self.assertNotEqual(key, request_key("ia générative", ["Rapport"], "gpt-5", "medium", "medium"))
+
+    def test_only_successes_are_cached(self):
+        cache = ResultCache()
+        cache.start("k", "r1")
+        self.assertEqual(cache.inflight("k"), "r1")
+        cache.finish("r1", success=False)
+        self.assertIsNone(cache.inflight("k"))
+        self.assertIsNone(cache.lookup("k"))
+
+        cache.start("k", "r2")
+        cache.finish("r2", success=True)
+        self.assertEqual(cache.lookup("k"), "r2")
+        cache.invalidate("r2")
+        self.assertIsNone(cache.lookup("k"))
+
+    def test_expiry_and_size_bound(self):
+        cache = ResultCache(ttl=0.05, max_size=1)
+        for key, research_id in (("a", "r1"), ("b", "r2")):
+            cache.start(key, research_id)
+            cache.finish(research_id, success=True)
+        # Le plus ancien est évincé au-delà de max_size
+        self.assertIsNone(cache.lookup("a"))
+        self.assertEqual(cache.lookup("b"), "r2")
+        time.sleep(0.06)
+        self.assertIsNone(cache.lookup("b"))
+
+
+class CacheApiTest(ApiTestCase):
+
+    def test_identical_requests_share_one_run(self):
+        self.delay = 0.3
+        first = self.client.post("/research", json={"subject": "IA  Générative"}).json()
+        second = self.client.post("/research", json={"subject": "ia générative"}).json()
+        self.assertEqual(second["research_id"], first["research_id"])
+        self.assertEqual(second["message"], "Recherche identique déjà en cours, résultat partagé")
+        self.assertEqual(self.wait(first["research_id"])["status"], jobs.STATUS_COMPLETED)
+
+        cached = self.client.post("/research", json={"subject": "IA générative"})
+        self.assertEqual(cached.status_code, 200)
+        self.assertEqual((cached.json()["research_id"], cached.json()["status"]),
+                         (first["research_id"], jobs.STATUS_COMPLETED))
+        self.assertEqual(len(self.calls), 1)
+
+        bypassed = self.client.post("/research", json={"subject": "IA générative", "cache": "bypass"})
+        self.assertEqual(bypassed.status_code, 202)
+        self.assertNotEqual(bypassed.json()["research_id"], first["research_id"])
+        stats = self.client.get("/cache/stats").json()
+        self.assertEqual((stats["hits"], stats["coalesced"], stats["misses"], stats["bypassed"]), (1, 1, 1, 1))
+
+    def test_deleted_result_is_not_served(self):
+        research_id = self.research()
+        self.client.delete(f"/results/{research_id}")
+        response = self.client.post("/research", json={"subject": "IA générative"})
+        self.assertEqual(response.status_code, 202)
+        self.assertNotEqual(response.json()["research_id"], research_id)
+
+    def test_failed_research_is_not_cached(self):
+        async def refuse(body):
+            return httpx.Response(400, json={"error": {"message": "requête invalide"}})
+
+        self.respond = refuse
+        failed = self.client.post("/research", json={"subject": "IA"}).json()["research_id"]
+        self.assertEqual(self.wait(failed)["status"], jobs.STATUS_FAILED)
+        retried = self.client.post("/research", json={"subject": "IA"})
+        self.assertEqual(retried.status_code, 202)
+        self.assertNotEqual(retried.json()["research_id"], failed)
+
+
+class BatchTest(unittest.TestCase):
+
+    SUBJECTS = ("Informatique quantique", "Robotique agricole")
+
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp(prefix="ai-news-test-"))
+        self.batch = self.directory / "sujets.jsonl"
+        lines = [{"id": "a", "Subject": self.SUBJECTS[0]}, {"id": "b", "Subject": self.SUBJECTS[1]},
+                 {"id": "a", "Subject": self.SUBJECTS[0]}]
+        self.batch.write_text("".join(json.dumps(line) + "\n" for line in lines), encoding="utf-8")
+        self.output_dir = self.directory / "veille"
+        self.requested = []
+        self.failing = set()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def run_batch(self) -> int:
+        """Exécute `main.py --batch` ; retourne son code de sortie."""
+        def handler(request):
+            content = request.content.decode("utf-8")
+            subject = next(s for s in self.SUBJECTS if s in content)
+            self.requested.append(subject)
+            if subject in self.failing:
+                return httpx.Response(400, json={"error": {"message": "refusé"}})
+            return httpx.Response(200, json=fake_response(f"Rapport {subject}"))
+
+        openai_client.set_client(AsyncOpenAI(
+            api_key="sk-test", max_retries=0,
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        ))
+        args = argparse.Namespace(batch=str(self.batch), parallel=2, output_dir=str(self.output_dir), checkpoint=None)
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            try:
+                main.batch_main(args)
+            except SystemExit as e:
+                return e.code
+        return 0
+
+    def test_resume_after_failure(self):
+        self.failing = {self.SUBJECTS[1]}
+        self.assertEqual(self.run_batch(), 1)
+        # Le doublon n'est traité qu'une fois
+        self.assertEqual(sorted(self.requested), list(self.SUBJECTS))
+        output = (self.output_dir / "a_output.txt").read_text(encoding="utf-8")
+        self.assertTrue(output.endswith(f"Rapport {self.SUBJECTS[0]}"))
+
+        # Relance : seul le sujet en échec est repris
+        self.failing, self.requested = set(), []
+        self.assertEqual(self.run_batch(), 0)
+        self.assertEqual(self.requested, [self.SUBJECTS[1]])
+        self.assertEqual(main.load_manifest(self.output_dir / main.MANIFEST_FILE), {"a", "b"})
+
+
+class LiveHubTest(TempStoreTestCase):
+
+    def test_emit_is_logged_and_dispatched(self):
+        async def scenario():
+            hub = live.LiveHub()
+            await hub.start()
+            try:
+                connection = hub.connect()
+                hub.emit(live.EVENT_CREATED, "r1", {"subject": "IA"})
+                # Émis depuis un thread (suites d'un job terminé)
+                await asyncio.to_thread(hub.emit, live.EVENT_DELETED, "r1")
+                first = await asyncio.wait_for(connection.queue.get(), 5)
+                second = await asyncio.wait_for(connection.queue.get(), 5)
+            finally:
+                await hub.stop()
+            self.assertEqual((first["event"], first["research_id"], first["subject"]), (live.EVENT_CREATED, "r1", "IA"))
+            self.assertEqual((second["seq"], second["event"]), (first["seq"] + 1, live.EVENT_DELETED))
+            self.assertEqual([m["seq"] for m in live.read_since(first["seq"] - 1)], [first["seq"], second["seq"]])
+
+        asyncio.run(scenario())
+
+    def test_pending_events_are_written_on_stop(self):
+        async def scenario():
+            hub = live.LiveHub()
+            await hub.start()
+            hub.emit(live.EVENT_STATUS, "r1", {"status": "running"})
+            await hub.stop()
+
+        asyncio.run(scenario())
+        self.assertEqual([m["event"] for m in live.read_since(0)], [live.EVENT_STATUS])
+
+    def test_slow_connection_gets_resync(self):
+        connection = live.Connection(max_size=2)
+        for seq in range(1, 4):
+            connection.offer({"seq": seq, "event": live.EVENT_STATUS})
+        self.assertEqual(connection.queue.qsize(), 1)
+        self.assertEqual(connection.queue.get_nowait(), {"seq": 3, "event": live.EVENT_RESYNC, "reason": "overflow"})
+        self.assertEqual(connection.dropped, 2)
+
+
+class LiveApiTest(ApiTestCase):
+
+    def receive_until(self, websocket, event: str) -> list:
+        messages = []
+        while not messages or messages[-1]["event"] != event:
+            messages.append(websocket.receive_json())
+        return messages
+
+    def test_list_changes_are_pushed_then_replayed(self):
+        with self.client.websocket_connect("/ws") as websocket:
+            hello = websocket.receive_json()
+            self.assertEqual(hello["event"], "hello")
+            research_id = self.research()
+            messages = self.receive_until(websocket, live.EVENT_COMPLETED)
+            self.client.delete(f"/results/{research_id}")
+            messages += self.receive_until(websocket, live.EVENT_DELETED)
+
+        self.assertEqual({m["research_id"] for m in messages}, {research_id})
+        self.assertEqual(sorted(m["event"] for m in messages),
+                         sorted([live.EVENT_CREATED, live.EVENT_STATUS, live.EVENT_COMPLETED, live.EVENT_DELETED]))
+        completed = next(m for m in messages if m["event"] == live.EVENT_COMPLETED)
+        self.assertEqual((completed["subject"], completed["model"]), ("IA générative", "gpt-5"))
+        self.assertEqual([m["seq"] for m in messages], list(range(hello["seq"] + 1, hello["seq"] + 5)))
+
+        # Reconnexion : événements manqués rejoués depuis le journal
+        with self.client.websocket_connect(f"/ws?since={hello['seq'] + 2}") as websocket:
+            self.assertEqual(websocket.receive_json()["event"], "hello")
+            replayed = [websocket.receive_json() for _ in range(2)]
+        self.assertEqual(replayed, messages[2:])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Récepteur de webhooks local, pour tester `callback_url`.
+
+Affiche chaque notification reçue et vérifie sa signature si un secret est
+fourni. `--fail N` répond 500 aux N premiers envois (test des nouvelles
+tentatives), `--delay S` simule un destinataire lent.
+
+Usage :
+    python webhook_receiver.py [--port 8765] [--secret SECRET] [--fail N] [--delay S]
+
+puis lancer une recherche avec
+    "callback_url": "http://localhost:8765/webhook", "callback_secret": "SECRET"
+"""
+
+import argparse
+import json
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from webhooks import verify_signature
+
+
+def make_handler(secret, fail, delay):
+    state = {"received": 0}
+
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            state["received"] += 1
+            number = state["received"]
+            if delay:
+                time.sleep(delay)
+
+            if secret is not None:
+                valid = verify_signature(
+                    secret,
+                    self.headers.get("X-Webhook-Timestamp"),
+                    body,
+                    self.headers.get("X-Webhook-Signature")
+                )
+                if not valid:
+                    print(f"[ERREUR] #{number} signature invalide", file=sys.stderr)
+                    self._reply(401)
+                    return
+
+            if number <= fail:
+                print(f"[INFO] #{number} échec simulé (500)")
+                self._reply(500)
+                return
+
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                self._reply(400)
+                return
+            print(f"[OK] #{number} {self.headers.get('X-Webhook-Event')} "
+                  f"(envoi {self.headers.get('X-Webhook-Id')}) : "
+                  + json.dumps(payload, ensure_ascii=False))
+            self._reply(204)
+
+        def _reply(self, status):
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    return WebhookHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Récepteur de webhooks local")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--secret", help="secret partagé (vérification de X-Webhook-Signature)")
+    parser.add_argument("--fail", type=int, default=0, help="nombre d'envois à refuser (500) avant d'accepter")
+    parser.add_argument("--delay", type=float, default=0, help="délai de réponse en secondes")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(args.secret, args.fail, args.delay))
+    print(f"[INFO] Écoute sur http://127.0.0.1:{args.port}/webhook (Ctrl+C pour arrêter)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
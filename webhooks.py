@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+"""
+Notifications de fin de recherche par webhook.
+
+Une requête peut fournir `callback_url` (et `callback_secret`) : à la fin de
+la recherche, un résumé compact (identifiant, statut, sujet, erreur, lien
+vers /results) est envoyé en POST à cette adresse, ce qui évite de
+surveiller /list ou /results.
+
+Les envois passent par une file dédiée (table `webhook_deliveries`) traitée
+par ses propres workers : un destinataire lent ou injoignable ne bloque
+jamais les workers de recherche. Chaque envoi est retenté avec un backoff
+exponentiel, au plus WEBHOOK_MAX_ATTEMPTS fois, et chaque tentative est
+journalisée (table `webhook_attempts`). Comme les jobs, les envois sont
+réclamés sous bail : plusieurs processus se partagent la file sans doublon.
+
+Adresses : pour éviter qu'un appelant fasse envoyer des requêtes vers le
+réseau interne (SSRF), `callback_url` est résolue à l'abonnement puis à
+chaque envoi, et refusée si l'une de ses adresses n'est pas publique
+(privée, boucle locale, link-local dont les métadonnées cloud, réservée,
+multicast). L'envoi se fait vers l'adresse vérifiée, pas vers une nouvelle
+résolution. Avec WEBHOOK_ALLOWED_HOSTS (liste séparée par des virgules),
+seuls ces hôtes sont acceptés, tels quels.
+
+Les envois terminés sont supprimés après WEBHOOK_RETENTION_DAYS jours ; un
+envoi resté en attente alors que sa recherche a quitté l'historique des
+jobs (ou est terminée depuis longtemps) est passé en échec.
+
+Signature : si un secret est connu (celui de la requête, sinon
+WEBHOOK_SECRET), l'en-tête `X-Webhook-Signature` vaut
+`sha256=<HMAC-SHA256(secret, "<timestamp>.<corps>")>`, avec le timestamp de
+`X-Webhook-Timestamp` ; voir `verify_signature`.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import random
+import socket
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import db
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "2"))
+WEBHOOK_TIMEOUT_S = float(os.getenv("WEBHOOK_TIMEOUT", "10"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "6"))
+WEBHOOK_BACKOFF_BASE_S = float(os.getenv("WEBHOOK_BACKOFF_BASE", "2"))
+WEBHOOK_BACKOFF_MAX_S = float(os.getenv("WEBHOOK_BACKOFF_MAX", "300"))
+WEBHOOK_POLL_INTERVAL_S = float(os.getenv("WEBHOOK_POLL_INTERVAL", "1"))
+WEBHOOK_ALLOWED_HOSTS = {
+    host.strip().lower() for host in os.getenv("WEBHOOK_ALLOWED_HOSTS", "").split(",") if host.strip()
+}
+WEBHOOK_RETENTION_DAYS = float(os.getenv("WEBHOOK_RETENTION_DAYS", "7"))
+WEBHOOK_PRUNE_INTERVAL_S = float(os.getenv("WEBHOOK_PRUNE_INTERVAL", "60"))
+# Délai après la fin d'une recherche au-delà duquel un envoi encore en attente est abandonné
+WEBHOOK_WAITING_GRACE_S = 300
+# Tolérance sur l'âge d'une signature côté destinataire
+SIGNATURE_TOLERANCE_S = 300
+
+# États d'un envoi
+STATUS_WAITING = "waiting"        # recherche pas encore terminée
+STATUS_PENDING = "pending"        # à envoyer (ou à retenter)
+STATUS_DELIVERING = "delivering"  # envoi en cours, sous bail
+STATUS_DELIVERED = "delivered"
+STATUS_FAILED = "failed"
+
+# Codes après lesquels une nouvelle tentative a du sens
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS webhook_deliveries (
+    delivery_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    research_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    secret TEXT,
+    status TEXT NOT NULL,
+    event TEXT,
+    payload TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL,
+    owner TEXT,
+    lease_until REAL,
+    last_status_code INTEGER,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    delivered_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_webhook_deliveries_research ON webhook_deliveries (research_id);
+CREATE INDEX IF NOT EXISTS idx_webhook_deliveries_due ON webhook_deliveries (status, next_attempt_at);
+
+CREATE TABLE IF NOT EXISTS webhook_attempts (
+    delivery_id INTEGER NOT NULL,
+    attempt INTEGER NOT NULL,
+    attempted_at REAL NOT NULL,
+    status_code INTEGER,
+    error TEXT,
+    duration_s REAL NOT NULL,
+    PRIMARY KEY (delivery_id, attempt)
+);
+"""
+db.register_schema(SCHEMA)
+
+
+class WebhookURLError(ValueError):
+    """Adresse de webhook refusée (schéma, hôte hors liste ou adresse non publique)."""
+
+
+def resolve_url(url: str) -> Optional[str]:
+    """
+    Vérifie qu'une adresse de webhook peut être contactée ; retourne l'adresse IP
+    vérifiée à utiliser pour l'envoi (None pour un hôte de WEBHOOK_ALLOWED_HOSTS).
+
+    Lève WebhookURLError si l'adresse est refusée, OSError si l'hôte ne se
+    résout pas. Résolution DNS bloquante : à appeler hors de la boucle d'événements.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise WebhookURLError(f"Adresse de webhook invalide : {url}")
+    host = parts.hostname.lower()
+    if WEBHOOK_ALLOWED_HOSTS:
+        if host not in WEBHOOK_ALLOWED_HOSTS:
+            raise WebhookURLError(f"Hôte de webhook non autorisé (WEBHOOK_ALLOWED_HOSTS) : {host}")
+        return None
+
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    addresses = sorted({info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)})
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split("%")[0])
+        if ip.version == 6 and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        if not ip.is_global or ip.is_multicast:
+            raise WebhookURLError(f"Adresse de webhook non publique refusée : {host} ({ip})")
+    return addresses[0]
+
+
+def sign(secret: str, timestamp: str, body: bytes) -> str:
+    """Valeur de l'en-tête X-Webhook-Signature."""
+    digest = hmac.new(secret.encode("utf-8"), timestamp.encode("ascii") + b"." + body, hashlib.sha256)
+    return f"sha256={digest.hexdigest()}"
+
+
+def verify_signature(
+    secret: str,
+    timestamp: str,
+    body: bytes,
+    signature: str,
+    tolerance_s: float = SIGNATURE_TOLERANCE_S
+) -> bool:
+    """Vérifie une signature reçue (comparaison à temps constant, timestamp récent)."""
+    try:
+        if abs(time.time() - int(timestamp)) > tolerance_s:
+            return False
+    except (TypeError, ValueError):
+        return False
+    return hmac.compare_digest(sign(secret, timestamp, body), signature or "")
+
+
+def build_payload(research_id: str, status: str, metadata: Optional[dict] = None, job=None) -> dict:
+    """Résumé compact d'une recherche terminée (sans le rapport ni la réponse brute)."""
+    metadata = metadata or {}
+    params = job.params if job is not None else {}
+    started_at = job.started_at if job is not None else None
+    finished_at = job.finished_at if job is not None else None
+    return {
+        "event": f"research.{status}",
+        "research_id": research_id,
+        "status": status,
+        "subject": metadata.get("subject") or params.get("subject"),
+        "model": metadata.get("model") or params.get("model"),
+        "created_at": metadata.get("created_at"),
+        "error": job.error if job is not None else None,
+        "duration_s": round(finished_at - started_at, 3) if started_at and finished_at else None,
+        "usage": metadata.get("usage"),
+        "results_url": f"/results/{research_id}",
+    }
+
+
+def subscribe(research_id: str, url: str, secret: Optional[str] = None) -> int:
+    """Enregistre un envoi en attente de la fin de `research_id` ; retourne son identifiant."""
+    with db.transaction() as conn:
+        cursor = conn.execute(
+            "INSERT INTO webhook_deliveries (research_id, url, secret, status, created_at) VALUES (?, ?, ?, ?, ?)",
+            (research_id, url, secret or WEBHOOK_SECRET, STATUS_WAITING, time.time())
+        )
+    return cursor.lastrowid
+
+
+def has_waiting(research_id: str) -> bool:
+    return db.get_connection().execute(
+        "SELECT 1 FROM webhook_deliveries WHERE research_id = ? AND status = ? LIMIT 1",
+        (research_id, STATUS_WAITING)
+    ).fetchone() is not None
+
+
+def notify(research_id: str, payload: dict) -> int:
+    """
+    Déclenche les envois en attente pour une recherche terminée.
+
+    Idempotent : seuls les envois encore en attente passent à l'état
+    `pending`, si bien que plusieurs processus peuvent l'appeler pour un
+    même job. Retourne le nombre d'envois déclenchés.
+    """
+    with db.transaction() as conn:
+        cursor = conn.execute(
+            "UPDATE webhook_deliveries SET status = ?, event = ?, payload = ?, next_attempt_at = ? "
+            "WHERE research_id = ? AND status = ?",
+            (STATUS_PENDING, payload["event"], json.dumps(payload, ensure_ascii=False),
+             time.time(), research_id, STATUS_WAITING)
+        )
+    if cursor.rowcount:
+        dispatcher.wake()
+    return cursor.rowcount
+
+
+def deliveries(research_id: str) -> List[dict]:
+    """Envois d'une recherche et leurs tentatives (sans le secret)."""
+    conn = db.get_connection()
+    rows = conn.execute(
+        "SELECT * FROM webhook_deliveries WHERE research_id = ? ORDER BY delivery_id", (research_id,)
+    ).fetchall()
+    result = []
+    for row in rows:
+        delivery = {k: row[k] for k in row.keys() if k not in ("secret", "payload", "owner", "lease_until")}
+        delivery["signed"] = bool(row["secret"])
+        delivery["attempt_log"] = [dict(a) for a in conn.execute(
+            "SELECT attempt, attempted_at, status_code, error, duration_s FROM webhook_attempts "
+            "WHERE delivery_id = ? ORDER BY attempt", (row["delivery_id"],)
+        ).fetchall()]
+        result.append(delivery)
+    return result
+
+
+def prune(retention_days: float = WEBHOOK_RETENTION_DAYS) -> Tuple[int, int]:
+    """
+    Passe en échec les envois en attente d'une recherche absente de
+    l'historique des jobs (ou terminée depuis WEBHOOK_WAITING_GRACE_S sans
+    notification), puis supprime les envois terminés créés il y a plus de
+    `retention_days` jours et leurs tentatives. Retourne (expirés, supprimés).
+    """
+    now = time.time()
+    with db.transaction() as conn:
+        expired = conn.execute(
+            "UPDATE webhook_deliveries SET status = ?, last_error = ? "
+            "WHERE status = ? AND created_at < ? AND NOT EXISTS ("
+            "SELECT 1 FROM jobs WHERE jobs.job_id = webhook_deliveries.research_id "
+            "AND (jobs.finished_at IS NULL OR jobs.finished_at >= ?))",
+            (STATUS_FAILED, "Recherche introuvable ou terminée sans notification",
+             STATUS_WAITING, now - WEBHOOK_WAITING_GRACE_S, now - WEBHOOK_WAITING_GRACE_S)
+        ).rowcount
+        deleted = 0
+        if retention_days > 0:
+            old = "SELECT delivery_id FROM webhook_deliveries WHERE status IN (?, ?) AND created_at < ?"
+            params = (STATUS_DELIVERED, STATUS_FAILED, now - retention_days * 86400)
+            conn.execute(f"DELETE FROM webhook_attempts WHERE delivery_id IN ({old})", params)
+            deleted = conn.execute(f"DELETE FROM webhook_deliveries WHERE delivery_id IN ({old})", params).rowcount
+    return expired, deleted
+
+
+def count_by_status() -> Dict[str, int]:
+    rows = db.get_connection().execute(
+        "SELECT status, COUNT(*) AS n FROM webhook_deliveries GROUP BY status"
+    ).fetchall()
+    return {row["status"]: row["n"] for row in rows}
+
+
+def backoff_delay(attempt: int) -> float:
+    """Délai avant la tentative suivant la `attempt`-ième (backoff exponentiel avec jitter)."""
+    ceiling = min(WEBHOOK_BACKOFF_MAX_S, WEBHOOK_BACKOFF_BASE_S * (2 ** (attempt - 1)))
+    return random.uniform(ceiling / 2, ceiling)
+
+
+class WebhookDispatcher:
+    """Workers d'envoi des webhooks, indépendants des workers de recherche."""
+
+    def __init__(self, workers: int = WEBHOOK_WORKERS, timeout_s: float = WEBHOOK_TIMEOUT_S):
+        self.workers = workers
+        self.timeout_s = timeout_s
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client = None
+        # Nombre d'envois par statut, relu périodiquement hors de la boucle
+        self._counts: Dict[str, int] = {}
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"webhook-worker-{i}")
+            for i in range(self.workers)
+        ]
+        self._tasks.append(asyncio.create_task(self._maintenance(), name="webhook-maintenance"))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Envois interrompus : rendus à la file
+        with db.transaction() as conn:
+            conn.execute(
+                "UPDATE webhook_deliveries SET status = ?, owner = NULL, lease_until = NULL "
+                "WHERE status = ? AND owner = ?",
+                (STATUS_PENDING, STATUS_DELIVERING, self.owner)
+            )
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def wake(self):
+        """Réveille les workers (appelable depuis n'importe quel thread)."""
+        if self._loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._set_wakeup()
+        else:
+            self._loop.call_soon_threadsafe(self._set_wakeup)
+
+    def _set_wakeup(self):
+        self._wakeup.set()
+        self._wakeup = asyncio.Event()
+
+    async def _maintenance(self):
+        """Relit les compteurs par statut et purge périodiquement les envois anciens."""
+        next_prune = time.monotonic()
+        while True:
+            try:
+                if time.monotonic() >= next_prune:
+                    expired, deleted = await asyncio.to_thread(prune)
+                    if expired or deleted:
+                        logger.info("Webhooks : %d envois en attente expirés, %d envois anciens supprimés",
+                                    expired, deleted)
+                    next_prune = time.monotonic() + WEBHOOK_PRUNE_INTERVAL_S
+                self._counts = await asyncio.to_thread(count_by_status)
+            except Exception as e:
+                logger.warning("Maintenance des webhooks échouée : %s", e)
+            await asyncio.sleep(WEBHOOK_POLL_INTERVAL_S)
+
+    def _claim(self) -> Optional[dict]:
+        """Réclame le prochain envoi dû (ou dont le bail a expiré) par une mise à jour atomique."""
+        now = time.time()
+        with db.transaction() as conn:
+            row = conn.execute(
+                "UPDATE webhook_deliveries SET status = ?, owner = ?, lease_until = ?, attempts = attempts + 1 "
+                "WHERE delivery_id = (SELECT delivery_id FROM webhook_deliveries "
+                "WHERE (status = ? AND next_attempt_at <= ?) OR (status = ? AND lease_until < ?) "
+                "ORDER BY next_attempt_at LIMIT 1) RETURNING *",
+                (STATUS_DELIVERING, self.owner, now + self.timeout_s * 2,
+                 STATUS_PENDING, now, STATUS_DELIVERING, now)
+            ).fetchone()
+        return dict(row) if row else None
+
+    async def _worker(self):
+        while True:
+            wakeup = self._wakeup
+            delivery = await asyncio.to_thread(self._claim)
+            if delivery is None:
+                try:
+                    await asyncio.wait_for(wakeup.wait(), WEBHOOK_POLL_INTERVAL_S)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._deliver(delivery)
+
+    async def _deliver(self, delivery: dict):
+        body = delivery["payload"].encode("utf-8")
+        timestamp = str(int(time.time()))
+        headers = {
+            "Content-Type": "application/json",
+            "User-Agent": "ai-news-paper-webhooks/1.0",
+            "X-Webhook-Id": str(delivery["delivery_id"]),
+            "X-Webhook-Event": delivery["event"],
+            "X-Webhook-Timestamp": timestamp,
+        }
+        if delivery["secret"]:
+            headers["X-Webhook-Signature"] = sign(delivery["secret"], timestamp, body)
+
+        # Import différé : httpx n'est chargé qu'au premier envoi
+        import httpx
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout_s, follow_redirects=False)
+
+        started = time.perf_counter()
+        status_code, error, refused = None, None, False
+        try:
+            # Adresse revérifiée à chaque envoi, puis contactée telle que vérifiée
+            address = await asyncio.to_thread(resolve_url, delivery["url"])
+            url, extensions = httpx.URL(delivery["url"]), {}
+            if address is not None:
+                headers["Host"] = url.netloc.decode("ascii")
+                if url.scheme == "https":
+                    extensions["sni_hostname"] = url.host
+                url = url.copy_with(host=address)
+            response = await self._client.post(url, content=body, headers=headers, extensions=extensions)
+            status_code = response.status_code
+            if not 200 <= status_code < 300:
+                error = f"HTTP {status_code}"
+        except WebhookURLError as e:
+            error, refused = str(e), True
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        duration = time.perf_counter() - started
+
+        attempt = delivery["attempts"]
+        retryable = not refused and (
+            status_code is None or status_code >= 500 or status_code in RETRYABLE_STATUS_CODES
+        )
+        now = time.time()
+        if error is None:
+            status, next_attempt_at = STATUS_DELIVERED, None
+        elif retryable and attempt < WEBHOOK_MAX_ATTEMPTS:
+            status, next_attempt_at = STATUS_PENDING, now + backoff_delay(attempt)
+        else:
+            status, next_attempt_at = STATUS_FAILED, None
+
+        await asyncio.to_thread(
+            self._record, delivery, attempt, now, status_code, error, duration, status, next_attempt_at
+        )
+
+        log = logger.info if status == STATUS_DELIVERED else logger.warning
+        log(
+            "Webhook %s (%s) tentative %d/%d vers %s : %s en %.2fs",
+            delivery["delivery_id"], delivery["research_id"], attempt, WEBHOOK_MAX_ATTEMPTS,
+            delivery["url"], error or f"HTTP {status_code}", duration
+        )
+
+    def _record(self, delivery: dict, attempt: int, now: float, status_code: Optional[int],
+                error: Optional[str], duration: float, status: str, next_attempt_at: Optional[float]):
+        """Journalise une tentative et met à jour l'envoi (s'il est toujours sous notre bail)."""
+        with db.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO webhook_attempts "
+                "(delivery_id, attempt, attempted_at, status_code, error, duration_s) VALUES (?, ?, ?, ?, ?, ?)",
+                (delivery["delivery_id"], attempt, now, status_code, error, round(duration, 3))
+            )
+            conn.execute(
+                "UPDATE webhook_deliveries SET status = ?, next_attempt_at = ?, owner = NULL, lease_until = NULL, "
+                "last_status_code = ?, last_error = ?, delivered_at = ? WHERE delivery_id = ? AND owner = ?",
+                (status, next_attempt_at, status_code, error, now if status == STATUS_DELIVERED else None,
+                 delivery["delivery_id"], self.owner)
+            )
+
+    def stats(self) -> dict:
+        """Envois par statut, relus toutes les WEBHOOK_POLL_INTERVAL secondes (aucun accès à la base ici)."""
+        return {"workers": self.workers, "deliveries": dict(self._counts)}
+
+
+# Instance partagée (workers démarrés dans le lifespan de l'API)
+dispatcher = WebhookDispatcher()